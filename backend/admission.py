@@ -0,0 +1,243 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+logger = getLogger(__name__)
+
+# Limits for OpenAI-backed endpoints - RPM/TPM should match the OpenAI account's rate limits
+OPENAI_MAX_CONCURRENT = int(os.getenv("OPENAI_MAX_CONCURRENT", "8"))
+OPENAI_MAX_CONCURRENT_PER_USER = int(os.getenv("OPENAI_MAX_CONCURRENT_PER_USER", "2"))
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "30000"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "50"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+
+# Lower values are admitted first - each endpoint sets its own, clients cannot choose
+INTERACTIVE = 0
+BULK = 1
+PRIORITIES = {"interactive": INTERACTIVE, "bulk": BULK}
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Rough token cost of a chat completion - about 4 characters per prompt token plus the completion budget"""
+    prompt_chars = sum(len(message.get("content", "")) for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+
+class TokenBucket:
+    """Budget of units per minute (requests or tokens) that refills continuously"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until the bucket holds amount units"""
+        self._refill()
+        # Requests bigger than the whole bucket only wait for a full one
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def adjust(self, amount: float):
+        """Add units back, or take them out when negative - the level may go into debt"""
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class AdmissionTicket:
+    """A granted admission, released when the request finishes"""
+    controller: "AdmissionController"
+    user_key: str
+    estimated_tokens: int
+
+    def record_usage(self, total_tokens: Optional[int]):
+        """Settle the token estimate against what the call actually used"""
+        if total_tokens is not None:
+            self.controller._tokens.adjust(self.estimated_tokens - total_tokens)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    sequence: int
+    user_key: str = field(compare=False)
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    """Global and per-user concurrency limits plus RPM/TPM token buckets, with a bounded priority wait queue"""
+
+    def __init__(
+        self,
+        max_concurrent: int = OPENAI_MAX_CONCURRENT,
+        max_per_user: int = OPENAI_MAX_CONCURRENT_PER_USER,
+        rpm: float = OPENAI_RPM,
+        tpm: float = OPENAI_TPM,
+        max_queue: int = ADMISSION_QUEUE_SIZE,
+        max_wait: float = ADMISSION_MAX_WAIT_SECONDS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._active = 0
+        self._active_per_user: Dict[str, int] = {}
+        self._waiters: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._retry_handle: Optional[asyncio.TimerHandle] = None
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.timed_out_total = 0
+
+    @asynccontextmanager
+    async def admit(self, user_key: str, estimated_tokens: int, priority: int = INTERACTIVE):
+        """Wait for a slot, raising 429 with Retry-After when the queue is full or the wait too long"""
+        ticket = await self._acquire(user_key, estimated_tokens, priority)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    async def _acquire(self, user_key: str, tokens: int, priority: int) -> AdmissionTicket:
+        if not self._waiters and self._can_start(user_key, tokens):
+            return self._grant(user_key, tokens)
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_total += 1
+            raise self._overloaded(tokens)
+
+        waiter = _Waiter(priority, next(self._sequence), user_key, tokens, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self._dispatch()
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return waiter.future.result()
+            self._waiters.remove(waiter)
+            self.timed_out_total += 1
+            raise self._overloaded(tokens)
+        except asyncio.CancelledError:
+            # The client went away - give back a slot granted in the meantime
+            if waiter.future.done():
+                self._release(waiter.future.result())
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _can_start(self, user_key: str, tokens: int) -> bool:
+        return (
+            self._active < self.max_concurrent
+            and self._active_per_user.get(user_key, 0) < self.max_per_user
+            and self._requests.wait_time(1) == 0
+            and self._tokens.wait_time(tokens) == 0
+        )
+
+    def _grant(self, user_key: str, tokens: int) -> AdmissionTicket:
+        self._active += 1
+        self._active_per_user[user_key] = self._active_per_user.get(user_key, 0) + 1
+        self._requests.adjust(-1)
+        self._tokens.adjust(-tokens)
+        self.admitted_total += 1
+        return AdmissionTicket(self, user_key, tokens)
+
+    def _release(self, ticket: AdmissionTicket):
+        self._active -= 1
+        remaining = self._active_per_user.get(ticket.user_key, 0) - 1
+        if remaining > 0:
+            self._active_per_user[ticket.user_key] = remaining
+        else:
+            self._active_per_user.pop(ticket.user_key, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit waiters in priority order while global, per-user and rate limits allow"""
+        if self._retry_handle is not None:
+            self._retry_handle.cancel()
+            self._retry_handle = None
+
+        for waiter in sorted(self._waiters):
+            if self._active >= self.max_concurrent:
+                break
+            if self._active_per_user.get(waiter.user_key, 0) >= self.max_per_user:
+                # A busy user only holds up their own requests
+                continue
+
+            wait = max(self._requests.wait_time(1), self._tokens.wait_time(waiter.tokens))
+            if wait > 0:
+                # Stop here so lower-priority requests cannot overtake while the buckets refill
+                self._retry_handle = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                break
+
+            self._waiters.remove(waiter)
+            waiter.future.set_result(self._grant(waiter.user_key, waiter.tokens))
+
+    def _overloaded(self, tokens: int) -> HTTPException:
+        retry_after = max(1, math.ceil(max(self._requests.wait_time(1), self._tokens.wait_time(tokens))))
+        logger.warning(f"Rejecting AI request: {self._active} active, {len(self._waiters)} queued")
+        return HTTPException(
+            status_code=429,
+            detail="Too many AI requests in progress. Please retry shortly.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        """Current queue depth, concurrency and rate-limit state"""
+        queued_by_priority = {
+            name: sum(1 for waiter in self._waiters if waiter.priority == priority)
+            for name, priority in PRIORITIES.items()
+        }
+        # Bring the buckets up to date before reporting their levels
+        self._requests.wait_time(0)
+        self._tokens.wait_time(0)
+
+        # Users are only counted - their keys are emails, and this endpoint is public
+        return {
+            "active": self._active,
+            "max_concurrent": self.max_concurrent,
+            "active_users": len(self._active_per_user),
+            "busiest_user_active": max(self._active_per_user.values(), default=0),
+            "max_per_user": self.max_per_user,
+            "queue_depth": len(self._waiters),
+            "queue_depth_by_priority": queued_by_priority,
+            "max_queue": self.max_queue,
+            "requests_available": round(self._requests.level, 1),
+            "tokens_available": round(self._tokens.level),
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "timed_out_total": self.timed_out_total,
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get the shared admission controller for OpenAI calls"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
@@ -0,0 +1,223 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from scores import GRADING_BOT, Votes
+
+# Folders whose analytics are kept in memory
+ANALYTICS_CACHE_SIZE = 64
+
+# Two-sided 95% Student t critical values for 1-30 degrees of freedom, normal approximation beyond
+T_CRITICAL_95 = np.array([
+    np.nan, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+])
+Z_CRITICAL_95 = 1.96
+
+
+@dataclass
+class VoteMatrix:
+    """Dense document x voter ratings, with a mask of which cells hold a rating"""
+    document_ids: List[str]
+    voters: List[str]
+    ratings: np.ndarray  # float64, 0 where missing
+    mask: np.ndarray  # bool
+
+
+def build_vote_matrix(votes: Votes, exclude: Tuple[str, ...] = (GRADING_BOT,)) -> VoteMatrix:
+    """Turn doc_id -> voter -> rating into a matrix - 0 ratings are comment-only and count as missing"""
+    document_ids = sorted(votes)
+    voters = sorted({voter for doc_votes in votes.values() for voter in doc_votes if voter not in exclude})
+    voter_index = {voter: index for index, voter in enumerate(voters)}
+
+    rows, columns, values = [], [], []
+    for row, document_id in enumerate(document_ids):
+        for voter, rating in votes[document_id].items():
+            if rating > 0 and voter in voter_index:
+                rows.append(row)
+                columns.append(voter_index[voter])
+                values.append(rating)
+
+    ratings = np.zeros((len(document_ids), len(voters)))
+    mask = np.zeros(ratings.shape, dtype=bool)
+    ratings[rows, columns] = values
+    mask[rows, columns] = True
+    return VoteMatrix(document_ids, voters, ratings, mask)
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Elementwise division with NaN wherever the denominator is zero"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    result = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
+
+def krippendorff_alpha_interval(ratings: np.ndarray, mask: np.ndarray) -> Optional[float]:
+    """Krippendorff's alpha with the interval metric, from per-document sums
+
+    Only documents rated by at least two voters are pairable. Squared differences over all
+    ordered pairs within a document reduce to 2 * (m * sum(x^2) - sum(x)^2).
+    """
+    counts = mask.sum(axis=1)
+    pairable = counts >= 2
+    if not pairable.any():
+        return None
+
+    m = counts[pairable].astype(float)
+    sums = ratings[pairable].sum(axis=1)
+    squares = (ratings[pairable] ** 2).sum(axis=1)
+
+    n = m.sum()
+    observed = (2 * (m * squares - sums ** 2) / (m - 1)).sum() / n
+    expected = 2 * (n * squares.sum() - sums.sum() ** 2) / (n * (n - 1))
+    if expected == 0:
+        return None
+    return float(1 - observed / expected)
+
+
+def icc_oneway(ratings: np.ndarray, mask: np.ndarray) -> Optional[float]:
+    """ICC(1) from a one-way random effects ANOVA, which allows documents to have different raters"""
+    counts = mask.sum(axis=1)
+    rated = counts > 0
+    n_i = counts[rated].astype(float)
+    a = len(n_i)
+    total = n_i.sum()
+    if a < 2 or total - a < 1:
+        return None
+
+    means = ratings[rated].sum(axis=1) / n_i
+    grand_mean = ratings[rated].sum() / total
+    ss_between = (n_i * (means - grand_mean) ** 2).sum()
+    ss_within = (((ratings[rated] - means[:, None]) ** 2) * mask[rated]).sum()
+
+    ms_between = ss_between / (a - 1)
+    ms_within = ss_within / (total - a)
+    # Effective raters per document for unbalanced designs
+    k0 = (total - (n_i ** 2).sum() / total) / (a - 1)
+    denominator = ms_between + (k0 - 1) * ms_within
+    if denominator == 0:
+        return None
+    return float((ms_between - ms_within) / denominator)
+
+
+def _rounded(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else round(float(value), 3) for value in values]
+
+
+def compute_analytics(votes: Votes) -> Dict[str, Any]:
+    """Reviewer-normalized scores, per-document confidence intervals and inter-rater agreement"""
+    matrix = build_vote_matrix(votes)
+    ratings, mask = matrix.ratings, matrix.mask
+
+    # Per-reviewer bias: z-score each rating against that reviewer's own mean and spread
+    voter_counts = mask.sum(axis=0)
+    voter_means = _safe_divide(ratings.sum(axis=0), voter_counts)
+    voter_centered = np.where(mask, ratings - np.nan_to_num(voter_means), 0.0)
+    voter_stds = np.sqrt(_safe_divide((voter_centered ** 2).sum(axis=0), voter_counts))
+    # A reviewer who always gives the same rating carries no relative information
+    z_scores = np.where(mask, np.nan_to_num(_safe_divide(voter_centered, voter_stds)), 0.0)
+
+    total = mask.sum()
+    grand_mean = ratings.sum() / total if total else np.nan
+    grand_std = np.sqrt((((ratings - grand_mean) ** 2) * mask).sum() / total) if total else np.nan
+
+    # Per-document raw mean with a t-based 95% confidence interval
+    counts = mask.sum(axis=1)
+    means = _safe_divide(ratings.sum(axis=1), counts)
+    centered = np.where(mask, ratings - np.nan_to_num(means)[:, None], 0.0)
+    sample_stds = np.sqrt(_safe_divide((centered ** 2).sum(axis=1), counts - 1))
+    degrees_of_freedom = counts - 1
+    t_critical = np.where(
+        degrees_of_freedom < len(T_CRITICAL_95),
+        T_CRITICAL_95[np.clip(degrees_of_freedom, 0, len(T_CRITICAL_95) - 1)],
+        Z_CRITICAL_95
+    )
+    margins = t_critical * _safe_divide(sample_stds, np.sqrt(counts))
+
+    # Normalized score: mean z-score, mapped back onto the rating scale for readability
+    mean_z = _safe_divide(z_scores.sum(axis=1), counts)
+    normalized = grand_mean + grand_std * mean_z
+
+    return {
+        "documents": {
+            document_id: {
+                "vote_count": int(count),
+                "average_rating": mean,
+                "ci_low": low,
+                "ci_high": high,
+                "z_score": z,
+                "normalized_rating": norm,
+            }
+            for document_id, count, mean, low, high, z, norm in zip(
+                matrix.document_ids,
+                counts,
+                _rounded(means),
+                _rounded(means - margins),
+                _rounded(means + margins),
+                _rounded(mean_z),
+                _rounded(normalized),
+            )
+        },
+        "reviewers": {
+            voter: {
+                "vote_count": int(count),
+                "average_rating": mean,
+                "std": std,
+                "bias": bias,
+            }
+            for voter, count, mean, std, bias in zip(
+                matrix.voters,
+                voter_counts,
+                _rounded(voter_means),
+                _rounded(voter_stds),
+                _rounded(voter_means - grand_mean),
+            )
+        },
+        "agreement": {
+            "krippendorff_alpha": krippendorff_alpha_interval(ratings, mask),
+            "icc1": icc_oneway(ratings, mask),
+        },
+        "overall": {
+            "vote_count": int(total),
+            "average_rating": _rounded(np.array([grand_mean]))[0],
+            "std": _rounded(np.array([grand_std]))[0],
+        },
+    }
+
+
+class AnalyticsCache:
+    """Analytics per folder, reused until the folder's scores.csv changes version"""
+
+    def __init__(self, max_entries: int = ANALYTICS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, folder_id: str, scores_version: str) -> Optional[Dict[str, Any]]:
+        """Get cached analytics if they were computed from this scores version"""
+        with self._lock:
+            entry = self._entries.get(folder_id)
+            if entry is None or entry[0] != scores_version:
+                return None
+            self._entries.move_to_end(folder_id)
+            return entry[1]
+
+    def put(self, folder_id: str, scores_version: str, analytics: Dict[str, Any]):
+        with self._lock:
+            self._entries[folder_id] = (scores_version, analytics)
+            self._entries.move_to_end(folder_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, folder_id: str):
+        with self._lock:
+            self._entries.pop(folder_id, None)
+
+
+analytics_cache = AnalyticsCache()
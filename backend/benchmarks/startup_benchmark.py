@@ -0,0 +1,90 @@
+"""Measure backend cold start: time to import main and time until /health first answers.
+
+Usage (from the backend directory):
+    python benchmarks/startup_benchmark.py [--runs 5]
+
+DATABASE_URL is passed through to the server. It defaults to a throwaway
+SQLite file so the benchmark runs without Postgres.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env: dict) -> float:
+    """Seconds spent importing main in a fresh interpreter"""
+    output = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, env=env, stderr=subprocess.DEVNULL
+    )
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def measure_first_healthy(env: dict, timeout: float = 60.0) -> float:
+    """Seconds from launching uvicorn until /health returns 200"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited before becoming healthy")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"/health did not answer within {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(name: str, samples: list):
+    print(
+        f"{name:<22} median {statistics.median(samples) * 1000:8.1f} ms"
+        f"   min {min(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ)
+        env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}")
+        env.setdefault("PDF_CACHE_DIR", os.path.join(tmp_dir, "pdf-cache"))
+
+        import_times = [measure_import(env) for _ in range(args.runs)]
+        healthy_times = [measure_first_healthy(env) for _ in range(args.runs)]
+
+    print(f"Startup benchmark ({args.runs} runs)")
+    summarize("import main", import_times)
+    summarize("first healthy /health", healthy_times)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Compare Google API calls over per-service httplib2 connections with the shared connection pool.
+
+Usage (from the backend directory):
+    python benchmarks/transport_benchmark.py [--requests 200] [--threads 8] [--latency-ms 0]
+
+Both transports call a local HTTPS server with a self-signed certificate (made with the
+openssl CLI), which counts TLS handshakes. The httplib2 run builds a fresh client per call,
+like building a Drive service per request; the pooled run sends every call through one
+PooledHttp session. --latency-ms adds a simulated round trip to each new connection's
+handshake, so results look more like calls to googleapis.com than to localhost.
+"""
+import argparse
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google_transport import PooledHttp, create_session, transport_metrics  # noqa: E402
+
+RESPONSE_BODY = json.dumps({"files": [{"id": f"file-{i}", "name": f"cv-{i}.pdf"} for i in range(20)]}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class CountingTLSServer(ThreadingHTTPServer):
+    """HTTPS server counting completed TLS handshakes"""
+    daemon_threads = True
+
+    def __init__(self, address, context: ssl.SSLContext, handshake_delay: float):
+        super().__init__(address, Handler)
+        self.context = context
+        self.handshake_delay = handshake_delay
+        self.handshakes = 0
+        self._lock = threading.Lock()
+
+    def finish_request(self, request, client_address):
+        if self.handshake_delay:
+            time.sleep(self.handshake_delay)
+        request = self.context.wrap_socket(request, server_side=True)
+        with self._lock:
+            self.handshakes += 1
+        super().finish_request(request, client_address)
+
+
+def make_certificate(directory: str) -> str:
+    """Self-signed certificate and key for 127.0.0.1, in one PEM file"""
+    path = os.path.join(directory, "localhost.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", path, "-out", path,
+        ],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    return path
+
+
+def run(call, requests: int, threads: int) -> list:
+    """Latency of each call, issued from a pool of threads"""
+    def timed(_):
+        started = time.perf_counter()
+        response, _content = call()
+        assert response.status == 200, response.status
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(timed, range(requests)))
+
+
+def summarize(name: str, latencies: list, elapsed: float, handshakes: int):
+    print(
+        f"{name:<20} {len(latencies) / elapsed:8.1f} req/s   p50 {statistics.median(latencies) * 1000:7.2f} ms"
+        f"   p95 {sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms   TLS handshakes {handshakes}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import httplib2
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        certificate = make_certificate(tmp_dir)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certificate)
+        server = CountingTLSServer(("127.0.0.1", 0), context, args.latency_ms / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"https://127.0.0.1:{server.server_address[1]}/drive/v3/files"
+
+        try:
+            print(f"Transport benchmark ({args.requests} requests, {args.threads} threads)")
+
+            def per_service_call():
+                # A new client per call, as when every request builds its own Drive service
+                return httplib2.Http(ca_certs=certificate, timeout=20).request(url, "GET")
+
+            server.handshakes = 0
+            started = time.perf_counter()
+            latencies = run(per_service_call, args.requests, args.threads)
+            summarize("httplib2 per service", latencies, time.perf_counter() - started, server.handshakes)
+
+            session = create_session(pool_size=args.threads)
+            session.verify = certificate
+            session.trust_env = False  # CA bundle and proxy variables would override the test certificate
+            pooled = PooledHttp(session=session)
+
+            server.handshakes = 0
+            started = time.perf_counter()
+            latencies = run(lambda: pooled.request(url, "GET"), args.requests, args.threads)
+            summarize("shared pool", latencies, time.perf_counter() - started, server.handshakes)
+            print(json.dumps(transport_metrics(session)["hosts"]))
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import zipfile
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+from fastapi import HTTPException
+
+from letters import LETTER_BUILDERS, candidate_name_from_document
+from scores import Comments, Votes, average_rating
+from streaming import StreamBuffer
+
+logger = getLogger(__name__)
+
+# Letters generated at once by a bulk job, on top of the shared OpenAI admission limits
+BULK_LETTER_CONCURRENCY = int(os.getenv("BULK_LETTER_CONCURRENCY", "4"))
+
+# How often a letter is retried after the OpenAI admission queue turns it away
+BULK_LETTER_MAX_ATTEMPTS = 5
+
+CSV_COLUMNS = ['document_id', 'document_name', 'candidate_name', 'average_rating', 'letter_type', 'subject', 'letter', 'error']
+
+
+@dataclass
+class LetterJob:
+    document_id: str
+    document_name: str
+    letter_type: str
+    average_rating: float
+    comments: List[str]
+
+
+def select_letter_jobs(documents: List[Dict[str, Any]], votes: Votes, comments: Comments, threshold: float, letter_type: str) -> List[LetterJob]:
+    """Pick rated documents and decide their letter - acceptance at or above the threshold, rejection below"""
+    jobs = []
+    for document in documents:
+        rating = average_rating(votes.get(document['id'], {}))
+        if rating is None:
+            continue
+
+        document_letter_type = "acceptance" if rating >= threshold else "rejection"
+        if letter_type != "auto" and letter_type != document_letter_type:
+            continue
+
+        jobs.append(LetterJob(
+            document_id=document['id'],
+            document_name=document['name'],
+            letter_type=document_letter_type,
+            average_rating=rating,
+            comments=list(comments.get(document['id'], {}).values())
+        ))
+    return jobs
+
+
+def _blank_result(job: LetterJob) -> Dict[str, Any]:
+    return {
+        'document_id': job.document_id,
+        'document_name': job.document_name,
+        'candidate_name': job.document_name,
+        'average_rating': job.average_rating,
+        'letter_type': job.letter_type,
+        'subject': '',
+        'letter': '',
+        'error': '',
+    }
+
+
+async def generate_letters(
+    jobs: List[LetterJob],
+    language: str,
+    company_name: str,
+    position: str,
+    complete: Callable[[List[Dict[str, str]]], Awaitable[str]],
+    concurrency: int = BULK_LETTER_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Generate letters with a pool of `concurrency` workers, yielding each result as soon as it is ready
+
+    Workers take the next job only once the previous result has room in a small buffer, so
+    neither pending letters nor finished ones pile up in memory while the client reads.
+    Every job yields a result - failures come back with their error filled in.
+    """
+    # Identical prompts share one completion for the whole job, whether it is still running or
+    # already done - only failed ones are asked again
+    completions: Dict[str, asyncio.Future] = {}
+
+    async def complete_once(messages: List[Dict[str, str]]) -> str:
+        key = hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).hexdigest()
+        completion = completions.get(key)
+        if completion is None or (completion.done() and (completion.cancelled() or completion.exception() is not None)):
+            completion = completions[key] = asyncio.ensure_future(complete_with_retry(messages))
+        return await asyncio.shield(completion)
+
+    async def complete_with_retry(messages: List[Dict[str, str]]) -> str:
+        for attempt in range(BULK_LETTER_MAX_ATTEMPTS):
+            try:
+                return await complete(messages)
+            except HTTPException as e:
+                # Admission control is full - wait as advised instead of failing the letter
+                if e.status_code != 429 or attempt == BULK_LETTER_MAX_ATTEMPTS - 1:
+                    raise
+                await asyncio.sleep(float((e.headers or {}).get('Retry-After', 1)))
+
+    async def run(job: LetterJob) -> Dict[str, Any]:
+        result = _blank_result(job)
+        try:
+            result['candidate_name'] = candidate_name_from_document(job.document_name)
+            result['average_rating'] = round(job.average_rating, 2)
+            messages, result['subject'] = LETTER_BUILDERS[job.letter_type](
+                result['candidate_name'], company_name, position, language, job.comments, job.average_rating
+            )
+            result['letter'] = await complete_once(messages)
+        except Exception as e:
+            logger.warning(f"Failed to generate {job.letter_type} letter for {job.document_id}: {e}")
+            result['error'] = getattr(e, 'detail', None) or str(e) or type(e).__name__
+        return result
+
+    pending_jobs = iter(jobs)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+
+    async def worker():
+        for job in pending_jobs:
+            try:
+                result = await run(job)
+            except Exception as e:
+                # run() reports its own failures - this only guards the consumer, which waits for one result per job
+                logger.exception(f"Letter worker failed on {job.document_id}")
+                result = {**_blank_result(job), 'error': str(e) or type(e).__name__}
+            await results.put(result)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(min(concurrency, len(jobs)))]
+    try:
+        for _ in range(len(jobs)):
+            yield await results.get()
+    finally:
+        # The client may have disconnected - stop generating letters nobody will receive
+        for task in workers:
+            task.cancel()
+        for completion in list(completions.values()):
+            completion.cancel()
+
+
+def letter_filename(result: Dict[str, Any]) -> str:
+    """Safe, unique file name for a letter inside the ZIP"""
+    name = re.sub(r'[^\w\- ]+', '', result['candidate_name']).strip().replace(' ', '_') or 'candidate'
+    return f"{result['letter_type']}/{name}_{result['document_id']}.txt"
+
+
+async def stream_zip(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Stream letters as a ZIP of text files, without holding the archive in memory"""
+    buffer = StreamBuffer()
+    failures = []
+    # The buffer cannot seek, so zipfile writes sizes in data descriptors after each entry
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        async for result in results:
+            if result['error']:
+                failures.append(result)
+                continue
+            archive.writestr(letter_filename(result), f"Subject: {result['subject']}\n\n{result['letter']}\n")
+            yield buffer.drain()
+
+        if failures:
+            archive.writestr('errors.csv', _csv_text(failures, ['document_id', 'document_name', 'letter_type', 'error']))
+    yield buffer.drain()
+
+
+async def stream_csv(results: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Stream letters as CSV rows"""
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    async for result in results:
+        writer.writerow(result)
+        yield output.getvalue().encode('utf-8')
+        output.seek(0)
+        output.truncate()
+
+
+def _csv_text(rows: List[Dict[str, Any]], columns: List[str]) -> str:
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(rows)
+    return output.getvalue()
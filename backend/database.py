@@ -1,19 +1,36 @@
 import json
 import os
+import threading
 from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
 
-from google.oauth2.credentials import Credentials
 from sqlalchemy import JSON, Column, DateTime, String, Text, create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
 # Database configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://cvvoting:cvvoting@db:5432/cvvoting")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The engine is created on first use, so importing this module never touches the database driver
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
+def get_engine() -> Engine:
+    """Get the database engine, creating it on first use"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(DATABASE_URL)
+            SessionLocal.configure(bind=_engine)
+    return _engine
+
 class UserSession(Base):
     __tablename__ = "user_sessions"
     
@@ -26,7 +43,7 @@ class UserSession(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     expires_at = Column(DateTime, nullable=True)
     
-    def set_credentials(self, credentials: Credentials):
+    def set_credentials(self, credentials: "Credentials"):
         """Store Google credentials as JSON"""
         creds_dict = {
             'token': credentials.token,
@@ -46,8 +63,10 @@ class UserSession(Base):
             # Default to 1 hour if no expiry
             self.expires_at = datetime.utcnow() + timedelta(hours=1)
     
-    def get_credentials(self) -> Credentials:
+    def get_credentials(self) -> "Credentials":
         """Retrieve Google credentials from JSON"""
+        from google.oauth2.credentials import Credentials
+
         creds_dict = json.loads(self.credentials_json)
         
         # Parse expiry back to datetime
@@ -74,11 +93,20 @@ class UserSession(Base):
 
 def create_tables():
     """Create database tables"""
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
+
+def warm_up_pool():
+    """Open a pooled connection ahead of the first request"""
+    with get_engine().connect():
+        pass
+
+def new_session():
+    """Open a database session for work outside a request"""
+    return SessionLocal(bind=get_engine())
 
 def get_db():
     """Get database session"""
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
@@ -88,7 +116,7 @@ def get_user_session(db, user_id: str) -> UserSession:
     """Get user session by user_id"""
     return db.query(UserSession).filter(UserSession.user_id == user_id).first()
 
-def create_or_update_user_session(db, user_id: str, name: str, email: str, picture: str, credentials: Credentials) -> UserSession:
+def create_or_update_user_session(db, user_id: str, name: str, email: str, picture: str, credentials: "Credentials") -> UserSession:
     """Create or update user session"""
     session = get_user_session(db, user_id)
     
@@ -114,6 +142,17 @@ def create_or_update_user_session(db, user_id: str, name: str, email: str, pictu
     db.refresh(session)
     return session
 
+def save_refreshed_credentials(user_id: str, credentials: "Credentials"):
+    """Store credentials refreshed outside a request, so later requests reuse the new token"""
+    db = new_session()
+    try:
+        session = get_user_session(db, user_id)
+        if session:
+            session.set_credentials(credentials)
+            db.commit()
+    finally:
+        db.close()
+
 def delete_user_session(db, user_id: str):
     """Delete user session"""
     session = get_user_session(db, user_id)
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from logging import getLogger
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import Base
+from pdf_cache import UNREADABLE_PDF_TEXT
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, String, tuple_
+
+logger = getLogger(__name__)
+
+# MinHash signature length, split into LSH bands of rows - 16 bands of 8 rows catch pairs
+# above roughly 0.7 Jaccard similarity with high probability
+MINHASH_PERMUTATIONS = 128
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+
+# Words per shingle, and the estimated similarity from which two CVs are flagged
+SHINGLE_SIZE = 5
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Fixed seed so signatures stored by earlier processes stay comparable
+MINHASH_SEED = 20240601
+MERSENNE_PRIME = (1 << 61) - 1
+
+class DocumentFingerprint(Base):
+    """Content fingerprints of a graded or indexed Drive document"""
+    __tablename__ = "document_fingerprints"
+
+    document_id = Column(String, primary_key=True)
+    md5_checksum = Column(String, nullable=True, index=True)
+    name = Column(String, nullable=True)
+    signature = Column(LargeBinary, nullable=True)  # MinHash as little-endian uint32, None for unreadable text
+    indexed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LshBucket(Base):
+    """One row per document and band, so candidate lookup is an indexed equality match"""
+    __tablename__ = "lsh_buckets"
+
+    band = Column(Integer, primary_key=True)
+    bucket = Column(String, primary_key=True)
+    document_id = Column(String, primary_key=True, index=True)
+
+class DocumentAccess(Base):
+    """Users who reached a document with their own Drive credentials - duplicates are only reported among these"""
+    __tablename__ = "document_access"
+
+    document_id = Column(String, primary_key=True)
+    user_id = Column(String, primary_key=True, index=True)
+    seen_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+@lru_cache(maxsize=1)
+def _permutations():
+    import numpy as np
+
+    rng = np.random.default_rng(MINHASH_SEED)
+    # a stays below 2^31 so a * hash + b fits in uint64 without wrapping
+    a = rng.integers(1, 1 << 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+    return a, b
+
+def text_shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Overlapping word n-grams of normalized text"""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def minhash_signature(text: str):
+    """MinHash signature of a text, or None when there is no usable text"""
+    import numpy as np
+
+    if not text or text == UNREADABLE_PDF_TEXT:
+        return None
+    shingles = text_shingles(text)
+    if not shingles:
+        return None
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+    a, b = _permutations()
+    # One row per permutation, minimum over all shingles
+    permuted = (a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME
+    return (permuted.min(axis=1) & 0xFFFFFFFF).astype("<u4")
+
+def lsh_buckets(signature) -> List[Tuple[int, str]]:
+    """(band, bucket) pairs - documents sharing any pair are near-duplicate candidates"""
+    return [
+        (band, hashlib.blake2b(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes(), digest_size=8).hexdigest())
+        for band in range(LSH_BANDS)
+    ]
+
+def estimated_similarity(signature, other) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return float((signature == other).mean())
+
+def _load_signature(data: Optional[bytes]):
+    import numpy as np
+
+    return np.frombuffer(data, dtype="<u4") if data else None
+
+def record_access(db, document_id: str, user_id: str):
+    """Note that a user reached a document through Drive, so it may show up in their duplicate lookups"""
+    access = db.get(DocumentAccess, (document_id, user_id))
+    if access:
+        access.seen_at = datetime.utcnow()
+    else:
+        db.add(DocumentAccess(document_id=document_id, user_id=user_id))
+    db.commit()
+
+def index_document(db, document_id: str, md5_checksum: Optional[str], text: str, name: Optional[str], user_id: str) -> DocumentFingerprint:
+    """Store a document's fingerprints, replacing what was indexed for an older version
+
+    The user is the one whose Drive the document was read from, recorded with record_access().
+    """
+    record_access(db, document_id, user_id)
+    fingerprint = db.get(DocumentFingerprint, document_id)
+    if fingerprint and fingerprint.md5_checksum == md5_checksum and md5_checksum:
+        return fingerprint
+
+    # Exact copies share the same text, so their signature can be reused as is
+    signature_bytes = None
+    copy = None
+    if md5_checksum:
+        copy = db.query(DocumentFingerprint).filter(
+            DocumentFingerprint.md5_checksum == md5_checksum,
+            DocumentFingerprint.document_id != document_id
+        ).first()
+    if copy:
+        signature_bytes = copy.signature
+    else:
+        signature = minhash_signature(text)
+        signature_bytes = signature.tobytes() if signature is not None else None
+
+    if fingerprint is None:
+        fingerprint = DocumentFingerprint(document_id=document_id)
+        db.add(fingerprint)
+    fingerprint.md5_checksum = md5_checksum
+    fingerprint.name = name
+    fingerprint.signature = signature_bytes
+
+    db.query(LshBucket).filter(LshBucket.document_id == document_id).delete()
+    if signature_bytes:
+        for band, bucket in lsh_buckets(_load_signature(signature_bytes)):
+            db.add(LshBucket(band=band, bucket=bucket, document_id=document_id))
+
+    db.commit()
+    return fingerprint
+
+def has_reusable_signature(db, md5_checksum: Optional[str]) -> bool:
+    """Check if index_document can index this revision without its text - it is indexed already, or an exact copy is"""
+    if not md5_checksum:
+        return False
+    return db.query(DocumentFingerprint.document_id).filter(DocumentFingerprint.md5_checksum == md5_checksum).first() is not None
+
+def find_duplicates(db, document_id: str, user_id: str, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """Exact copies and near-duplicates of an indexed document, or None if it is not indexed
+
+    Only documents the user has reached through their own Drive are returned - the index is
+    shared, but other users' files must not show up.
+    """
+    fingerprint = db.get(DocumentFingerprint, document_id)
+    if fingerprint is None:
+        return None
+
+    accessible = db.query(DocumentAccess.document_id).filter(DocumentAccess.user_id == user_id)
+
+    exact = []
+    if fingerprint.md5_checksum:
+        exact = [
+            {"document_id": copy.document_id, "name": copy.name}
+            for copy in db.query(DocumentFingerprint).filter(
+                DocumentFingerprint.md5_checksum == fingerprint.md5_checksum,
+                DocumentFingerprint.document_id != document_id,
+                DocumentFingerprint.document_id.in_(accessible)
+            )
+        ]
+
+    near = []
+    signature = _load_signature(fingerprint.signature)
+    if signature is not None:
+        exact_ids = {copy["document_id"] for copy in exact}
+        # Only documents sharing a bucket are compared, never the whole corpus
+        candidate_ids = {
+            row[0] for row in db.query(LshBucket.document_id).filter(
+                tuple_(LshBucket.band, LshBucket.bucket).in_(lsh_buckets(signature)),
+                LshBucket.document_id.in_(accessible)
+            )
+        }
+        candidate_ids -= exact_ids | {document_id}
+
+        if candidate_ids:
+            candidates = db.query(DocumentFingerprint).filter(DocumentFingerprint.document_id.in_(candidate_ids))
+            for candidate in candidates:
+                similarity = estimated_similarity(signature, _load_signature(candidate.signature))
+                if similarity >= threshold:
+                    near.append({"document_id": candidate.document_id, "name": candidate.name, "similarity": round(similarity, 3)})
+            near.sort(key=lambda item: item["similarity"], reverse=True)
+
+    return {"document_id": document_id, "exact": exact, "near": near}
@@ -0,0 +1,220 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from drive_client import batch_allowed, error_status, is_retryable_error, record_batched_response
+
+logger = getLogger(__name__)
+
+# Drive rejects batch requests with more than 100 sub-requests
+MAX_BATCH_SIZE = 100
+
+# How long a batcher waits for more requests before sending a batch
+BATCH_WINDOW_SECONDS = float(os.getenv("DRIVE_BATCH_WINDOW_MS", "10")) / 1000
+
+# How long Drive's answer that a user can open a folder is trusted, and how many answers are kept
+FOLDER_ACCESS_TTL_SECONDS = float(os.getenv("FOLDER_ACCESS_TTL_SECONDS", "300"))
+FOLDER_ACCESS_MAX_ENTRIES = 10000
+
+
+def execute_batch(service, requests: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Exception]]:
+    """Execute independent Drive requests as batch HTTP calls of up to 100 sub-requests"""
+    results: Dict[str, Any] = {}
+    errors: Dict[str, Exception] = {}
+
+    def callback(request_id, response, exception):
+        record_batched_response(requests[request_id], response, exception)
+        if exception is not None:
+            errors[request_id] = exception
+        else:
+            results[request_id] = response
+
+    # Requests to an endpoint whose circuit is open skip the batch, so execute() can serve them from cache
+    keys = [key for key, request in requests.items() if batch_allowed(request)]
+    unsent: List[str] = [key for key in requests if key not in keys]
+    for start in range(0, len(keys), MAX_BATCH_SIZE):
+        chunk = keys[start:start + MAX_BATCH_SIZE]
+        batch = service.new_batch_http_request(callback=callback)
+        for key in chunk:
+            batch.add(requests[key], request_id=key)
+        try:
+            batch.execute()
+        except Exception as e:
+            if not is_retryable_error(e):
+                raise
+            unsent.extend(key for key in chunk if key not in results and key not in errors)
+
+    # Transient failures are sent again one by one, through the Drive client's retries and fallbacks
+    for key in unsent + [key for key, error in list(errors.items()) if is_retryable_error(error)]:
+        try:
+            results[key] = requests[key].execute()
+            errors.pop(key, None)
+        except Exception as e:
+            errors[key] = e
+
+    return results, errors
+
+
+def get_folder_files(service, folder_id: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Look up a folder's PDF listing, scores.csv and queue.txt in a single batch"""
+    files = service.files()
+    requests = {
+        "documents": files.list(
+            q=f"'{folder_id}' in parents and mimeType='application/pdf' and name != 'scores.csv'",
+            fields="files(id,name,mimeType,webViewLink,webContentLink)"
+        ),
+        "scores": files.list(q=f"'{folder_id}' in parents and name='scores.csv'"),
+        "queue": files.list(q=f"'{folder_id}' in parents and name='queue.txt'"),
+    }
+
+    results, errors = execute_batch(service, requests)
+    if errors:
+        # Surface the first failure - callers treat the folder lookup as all or nothing
+        raise next(iter(errors.values()))
+
+    return {key: results[key].get('files', []) for key in requests}
+
+
+class DriveBatcher:
+    """Collects Drive requests issued close together and sends them as one batch
+
+    With no batch in flight, requests go out on the next event loop iteration - a lone request
+    does not wait, while requests issued together (e.g. by asyncio.gather) still share a batch.
+    While a batch is in flight, new requests are collected for up to the batching window.
+    """
+
+    def __init__(self, window: float = BATCH_WINDOW_SECONDS):
+        self.window = window
+        self._pending: List[Tuple[Any, Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def idle(self) -> bool:
+        """Nothing pending or in flight, so the batcher can be dropped without losing anything"""
+        return not self._pending and not self._tasks and self._flush_handle is None
+
+    async def submit(self, service, request) -> Any:
+        """Queue a request for the next batch and wait for its response"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((service, request, future))
+
+        if len(self._pending) >= MAX_BATCH_SIZE:
+            # A full batch is sent right away instead of waiting for the window
+            if self._flush_handle is not None:
+                self._flush_handle.cancel()
+            self._start_flush()
+        elif self._flush_handle is None:
+            if self._tasks:
+                self._flush_handle = loop.call_later(self.window, self._start_flush)
+            else:
+                self._flush_handle = loop.call_soon(self._start_flush)
+
+        return await future
+
+    def _start_flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._flush(pending))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, pending: List[Tuple[Any, Any, asyncio.Future]]):
+        # All requests belong to the same user, so any of their services can build the batch
+        service = pending[0][0]
+        requests = {str(index): request for index, (_, request, _) in enumerate(pending)}
+
+        try:
+            results, errors = await asyncio.to_thread(execute_batch, service, requests)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        logger.info(f"Executed Drive batch with {len(requests)} requests ({len(errors)} failed)")
+        for index, (_, _, future) in enumerate(pending):
+            if future.done():
+                continue
+            key = str(index)
+            if key in errors:
+                future.set_exception(errors[key])
+            else:
+                future.set_result(results.get(key))
+
+
+# One batcher per user, since a batch is sent with a single set of credentials
+_batchers: Dict[str, DriveBatcher] = {}
+
+
+def get_drive_batcher(user_id: str) -> DriveBatcher:
+    """Get the request batcher for a user, dropping other users' idle batchers"""
+    for idle_user in [key for key, batcher in _batchers.items() if key != user_id and batcher.idle]:
+        del _batchers[idle_user]
+
+    batcher = _batchers.get(user_id)
+    if batcher is None:
+        batcher = DriveBatcher()
+        _batchers[user_id] = batcher
+    return batcher
+
+
+class FolderAccess:
+    """Folders each user was recently seen to open in Drive
+
+    Data served from the database rather than Drive, like the review queue, is only handed out
+    after this check, since Drive no longer enforces access to it. Used from the event loop only.
+    """
+
+    def __init__(self, ttl: float = FOLDER_ACCESS_TTL_SECONDS, max_entries: int = FOLDER_ACCESS_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._expiry: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+
+    def allowed(self, user_id: str, folder_id: str) -> bool:
+        """Whether access was confirmed within the TTL"""
+        key = (user_id, folder_id)
+        expires = self._expiry.get(key)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._expiry[key]
+            return False
+        return True
+
+    def grant(self, user_id: str, folder_id: str):
+        key = (user_id, folder_id)
+        self._expiry[key] = time.monotonic() + self.ttl
+        self._expiry.move_to_end(key)
+        while len(self._expiry) > self.max_entries:
+            self._expiry.popitem(last=False)
+
+    def revoke(self, user_id: str, folder_id: str):
+        self._expiry.pop((user_id, folder_id), None)
+
+    async def check(self, user_id: str, service_factory: Callable[[], Any], folder_id: str) -> bool:
+        """Whether the user can open the folder, asking Drive through the user's batcher unless recently confirmed
+
+        Drive answers 404 (or 403) for folders the user cannot see; rate limits and other failures are raised.
+        """
+        if self.allowed(user_id, folder_id):
+            return True
+
+        service = service_factory()
+        try:
+            await get_drive_batcher(user_id).submit(service, service.files().get(fileId=folder_id, fields="id"))
+        except Exception as e:
+            if error_status(e) in (403, 404) and not is_retryable_error(e):
+                self.revoke(user_id, folder_id)
+                return False
+            raise
+        self.grant(user_id, folder_id)
+        return True
+
+
+folder_access = FolderAccess()
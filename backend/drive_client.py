@@ -0,0 +1,480 @@
+import concurrent.futures
+import copy
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from logging import getLogger
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from google_transport import PooledHttp
+
+logger = getLogger(__name__)
+
+# Retries with full-jitter exponential backoff
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", "4"))
+DRIVE_BACKOFF_BASE_SECONDS = float(os.getenv("DRIVE_BACKOFF_BASE_MS", "500")) / 1000
+DRIVE_BACKOFF_MAX_SECONDS = float(os.getenv("DRIVE_BACKOFF_MAX_MS", "8000")) / 1000
+
+# Socket timeouts per endpoint - media downloads get longer than metadata calls
+DRIVE_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("DRIVE_TIMEOUT_SECONDS", "20"))
+DRIVE_ENDPOINT_TIMEOUTS = {
+    "drive.files.list": 10.0,
+    "drive.files.get": 10.0,
+    "drive.files.get:media": 60.0,
+    "drive.files.create": 30.0,
+    "drive.files.update": 30.0,
+}
+
+# Consecutive retryable failures that open an endpoint's circuit, and how long it stays open
+DRIVE_BREAKER_FAILURES = int(os.getenv("DRIVE_BREAKER_FAILURES", "5"))
+DRIVE_BREAKER_RESET_SECONDS = float(os.getenv("DRIVE_BREAKER_RESET_SECONDS", "30"))
+
+# Reads that get a duplicate request when the first is slower than the delay, 0 disables hedging
+DRIVE_HEDGE_DELAY_SECONDS = float(os.getenv("DRIVE_HEDGE_DELAY_MS", "0")) / 1000
+DRIVE_HEDGED_ENDPOINTS = {"drive.files.list", "drive.files.get"}
+
+# Last good responses to GETs, served while Drive is failing
+DRIVE_STALE_CACHE_ENTRIES = int(os.getenv("DRIVE_STALE_CACHE_ENTRIES", "1000"))
+# Larger downloads such as CV PDFs are left to the PDF cache
+DRIVE_STALE_MAX_BYTES = 256 * 1024
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("userRateLimitExceeded", "rateLimitExceeded")
+# Quota of a single user - retried, but not a sign that Drive is down for everyone
+USER_RATE_LIMIT_REASON = "userRateLimitExceeded"
+
+# Requests that can be sent twice without side effects. Updates upload the whole file again, so a
+# repeat leaves the same content; creates are only retried after checking the first one did not land
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+IDEMPOTENT_ENDPOINTS = {"drive.files.update"}
+
+# Latencies kept per endpoint for percentiles
+LATENCY_WINDOW = 200
+
+
+class DriveUnavailableError(Exception):
+    """Drive is failing and there is no cached response to fall back on"""
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """HTTP status of a googleapiclient HttpError, without importing googleapiclient"""
+    resp = getattr(error, "resp", None)
+    status = getattr(resp, "status", None)
+    return int(status) if status is not None else None
+
+
+def _error_content(error: Exception) -> str:
+    content = getattr(error, "content", b"") or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+    return content
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Transient failures worth retrying - 5xx, 429, rate-limit 403s, timeouts and dropped connections"""
+    if isinstance(error, (socket.timeout, TimeoutError, ConnectionError, DriveUnavailableError)):
+        return True
+    status = error_status(error)
+    if status is None:
+        return type(error).__name__ in ("ServerNotFoundError", "SSLError", "RemoteDisconnected")
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        content = _error_content(error)
+        return any(reason in content for reason in RATE_LIMIT_REASONS)
+    return False
+
+
+def is_user_rate_limit_error(error: Exception) -> bool:
+    """One user ran out of quota - other users' calls to the same endpoint are unaffected"""
+    return error_status(error) in (403, 429) and USER_RATE_LIMIT_REASON in _error_content(error)
+
+
+def is_user_specific_error(error: Exception) -> bool:
+    """Failures about one user's credentials, permissions or quota - they say nothing about Drive being up for others"""
+    if type(error).__name__ == "RefreshError":
+        # Revoked or expired refresh token
+        return True
+    status = error_status(error)
+    return status == 401 or (status == 403 and not is_retryable_error(error)) or is_user_rate_limit_error(error)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff for a zero-based retry attempt"""
+    return random.uniform(0, min(DRIVE_BACKOFF_MAX_SECONDS, DRIVE_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """Stops calling an endpoint after repeated failures, letting one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = DRIVE_BREAKER_FAILURES, reset_timeout: float = DRIVE_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Check if a call may go out - while half-open only a single probe is allowed"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_neutral(self):
+        """A call whose outcome says nothing about the endpoint - frees the probe slot, leaves the state as it is"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"Opening Drive circuit after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class EndpointStats:
+    """Counters and recent latencies for one Drive endpoint
+
+    Updated from request threads, hedged reads and the download pool at once, so every
+    change goes through count() or record_latency() under the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.breaker_rejections = 0
+        self.stale_served = 0
+        self.hedges_started = 0
+        self.hedges_won = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "breaker_rejections": self.breaker_rejections,
+                "stale_served": self.stale_served,
+                "hedges_started": self.hedges_started,
+                "hedges_won": self.hedges_won,
+            }
+            latencies = sorted(self.latencies)
+
+        def percentile(fraction: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 1)
+
+        return {
+            **counters,
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
+
+
+class DriveResilience:
+    """Shared circuit breakers, stale-response cache and metrics for all Drive requests"""
+
+    def __init__(self, stale_entries: int = DRIVE_STALE_CACHE_ENTRIES):
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, EndpointStats] = {}
+        self._stale: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+        self.stale_entries = stale_entries
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker()
+            return self._breakers[endpoint]
+
+    def stats(self, endpoint: str) -> EndpointStats:
+        with self._lock:
+            if endpoint not in self._stats:
+                self._stats[endpoint] = EndpointStats()
+            return self._stats[endpoint]
+
+    def remember(self, scope: str, uri: str, result: Any):
+        """Keep a successful GET response - cached per user so nobody sees another user's files"""
+        if isinstance(result, (bytes, bytearray)) and len(result) > DRIVE_STALE_MAX_BYTES:
+            return
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._stale[(scope, uri)] = result
+            self._stale.move_to_end((scope, uri))
+            while len(self._stale) > self.stale_entries:
+                self._stale.popitem(last=False)
+
+    def recall(self, scope: str, uri: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if (scope, uri) not in self._stale:
+                return False, None
+            return True, copy.deepcopy(self._stale[(scope, uri)])
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = list(self._stats.items())
+            breakers = dict(self._breakers)
+            stale_size = len(self._stale)
+        return {
+            "endpoints": {
+                endpoint: {**stats.snapshot(), "circuit": breakers[endpoint].state if endpoint in breakers else "closed"}
+                for endpoint, stats in endpoints
+            },
+            "stale_cache_entries": stale_size,
+        }
+
+
+drive_resilience = DriveResilience()
+
+# Threads for hedged reads - a losing request keeps running on its own connection
+_hedge_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="drive-hedge")
+
+
+def request_endpoint(method_id: Optional[str], uri: str) -> str:
+    """Endpoint name for metrics and breakers, e.g. drive.files.list or drive.files.get:media"""
+    endpoint = method_id or "unknown"
+    if "alt=media" in uri:
+        endpoint += ":media"
+    return endpoint
+
+
+def _apply_timeout(http, timeout: float):
+    """Set the socket timeout on an httplib2 or pooled client, including its already open connections"""
+    inner = getattr(http, "http", http)
+    inner.timeout = timeout
+    for connection in getattr(inner, "connections", {}).values():
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            sock.settimeout(timeout)
+
+
+@lru_cache(maxsize=1)
+def resilient_request_class():
+    """HttpRequest subclass adding retries, timeouts, circuit breaking, stale fallback and hedging"""
+    import google_auth_httplib2
+    import httplib2
+    from googleapiclient.http import HttpRequest
+
+    class ResilientHttpRequest(HttpRequest):
+        cache_scope = ""
+        # For writes that are not idempotent - finds what an attempt that seemed to fail already wrote
+        find_existing: Optional[Callable[[], Any]] = None
+
+        @property
+        def endpoint(self) -> str:
+            return request_endpoint(self.methodId, self.uri)
+
+        @property
+        def idempotent(self) -> bool:
+            return self.method in IDEMPOTENT_METHODS or self.methodId in IDEMPOTENT_ENDPOINTS
+
+        def execute(self, http=None, num_retries=0):
+            endpoint = self.endpoint
+            stats = drive_resilience.stats(endpoint)
+            breaker = drive_resilience.breaker(endpoint)
+            timeout = DRIVE_ENDPOINT_TIMEOUTS.get(endpoint, DRIVE_DEFAULT_TIMEOUT_SECONDS)
+            stats.count("calls")
+
+            last_error: Exception = DriveUnavailableError(f"Drive endpoint {endpoint} is unavailable")
+            for attempt in range(DRIVE_MAX_RETRIES + 1):
+                if not breaker.allow():
+                    stats.count("breaker_rejections")
+                    break
+
+                if attempt and not self.idempotent:
+                    # The failed attempt may have landed anyway - sending it again would write a second copy
+                    existing = self.find_existing() if self.find_existing else None
+                    if existing is not None:
+                        logger.info(f"{endpoint} had succeeded despite the error, not sending it again")
+                        breaker.record_success()
+                        stats.count("successes")
+                        return existing
+
+                started = time.monotonic()
+                try:
+                    result = self._execute_once(http, timeout, stats)
+                except Exception as e:
+                    if isinstance(e, (socket.timeout, TimeoutError)):
+                        stats.count("timeouts")
+                    if is_user_specific_error(e):
+                        # One user's credentials or quota must neither open nor close the circuit for everyone
+                        breaker.record_neutral()
+                    elif not is_retryable_error(e):
+                        # Drive answered, just not with success - that is not an outage
+                        breaker.record_success()
+                    else:
+                        breaker.record_failure()
+                    if not is_retryable_error(e):
+                        stats.count("failures")
+                        raise
+                    last_error = e
+                    if not self.idempotent and self.find_existing is None:
+                        stats.count("failures")
+                        raise
+                    if attempt < DRIVE_MAX_RETRIES:
+                        stats.count("retries")
+                        delay = backoff_delay(attempt)
+                        logger.warning(f"Retrying {endpoint} in {delay:.2f}s after: {e}")
+                        time.sleep(delay)
+                    continue
+
+                stats.record_latency(time.monotonic() - started)
+                stats.count("successes")
+                breaker.record_success()
+                if self.method == "GET":
+                    drive_resilience.remember(self.cache_scope, self.uri, result)
+                return result
+
+            stats.count("failures")
+            if self.method == "GET":
+                found, result = drive_resilience.recall(self.cache_scope, self.uri)
+                if found:
+                    stats.count("stale_served")
+                    logger.warning(f"Serving cached response for {endpoint} while Drive is failing")
+                    return result
+            raise last_error
+
+        def _execute_once(self, http, timeout: float, stats: EndpointStats):
+            if self._should_hedge(http):
+                return self._execute_hedged(timeout, stats)
+            http = http or self.http
+            _apply_timeout(http, timeout)
+            return super().execute(http=http)
+
+        def _should_hedge(self, http) -> bool:
+            return (
+                DRIVE_HEDGE_DELAY_SECONDS > 0
+                and http is None
+                and self.method == "GET"
+                and self.endpoint in DRIVE_HEDGED_ENDPOINTS
+                and getattr(self.http, "credentials", None) is not None
+            )
+
+        def _fresh_http(self, timeout: float):
+            # Hedged requests run side by side - pooled clients share connections safely, httplib2 clients cannot
+            if isinstance(self.http, PooledHttp):
+                return self.http.with_timeout(timeout)
+            return google_auth_httplib2.AuthorizedHttp(self.http.credentials, http=httplib2.Http(timeout=timeout))
+
+        def _execute_hedged(self, timeout: float, stats: EndpointStats):
+            primary = _hedge_executor.submit(super().execute, http=self._fresh_http(timeout))
+            done, _ = concurrent.futures.wait([primary], timeout=DRIVE_HEDGE_DELAY_SECONDS)
+            if done:
+                return primary.result()
+
+            stats.count("hedges_started")
+            hedge = _hedge_executor.submit(super().execute, http=self._fresh_http(timeout))
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is hedge:
+                            stats.count("hedges_won")
+                        return future.result()
+                    error = future.exception()
+            raise error
+
+    return ResilientHttpRequest
+
+
+def create_file_once(service, folder_id: str, name: str, media_body, fields: str = "id"):
+    """Create a file in a folder, retrying failures only once a lookup shows the file was not created"""
+    request = service.files().create(
+        body={'name': name, 'parents': [folder_id]},
+        media_body=media_body,
+        fields=fields
+    )
+
+    def find_existing():
+        query = f"'{folder_id}' in parents and name='{name}' and trashed=false"
+        files = service.files().list(q=query, fields=f"files({fields})").execute().get('files', [])
+        return files[0] if files else None
+
+    request.find_existing = find_existing
+    return request.execute()
+
+
+def batch_allowed(request) -> bool:
+    """Whether a request may go inside a batch - while its endpoint's circuit is not closed it is sent
+    on its own instead, where the breaker rejects or probes it and cached responses are served"""
+    endpoint = getattr(request, "endpoint", None)
+    return endpoint is None or drive_resilience.breaker(endpoint).state == "closed"
+
+
+def record_batched_response(request, result: Any = None, error: Optional[Exception] = None):
+    """Count a sub-request Drive answered inside a batch the way execute() counts a request sent on its own
+
+    Retryable failures are left out - they are sent again on their own, and counted there.
+    """
+    endpoint = getattr(request, "endpoint", None)
+    if endpoint is None or (error is not None and is_retryable_error(error)):
+        return
+    stats = drive_resilience.stats(endpoint)
+    stats.count("calls")
+    if error is not None and is_user_specific_error(error):
+        drive_resilience.breaker(endpoint).record_neutral()
+    else:
+        # Drive answered, so the endpoint is up even if this request was refused
+        drive_resilience.breaker(endpoint).record_success()
+    if error is not None:
+        stats.count("failures")
+        return
+    stats.count("successes")
+    if request.method == "GET":
+        drive_resilience.remember(request.cache_scope, request.uri, result)
+
+
+def drive_request_builder(cache_scope: str) -> Callable[..., Any]:
+    """requestBuilder for googleapiclient's build(), caching stale responses under the given scope"""
+    request_class = resilient_request_class()
+
+    def build_request(*args, **kwargs):
+        request = request_class(*args, **kwargs)
+        request.cache_scope = cache_scope
+        return request
+
+    return build_request
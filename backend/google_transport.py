@@ -0,0 +1,180 @@
+import os
+import threading
+import weakref
+from functools import lru_cache
+from logging import getLogger
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = getLogger(__name__)
+
+# Keep-alive connections kept open per Google host, and how many hosts get a pool
+GOOGLE_HTTP_POOL_SIZE = int(os.getenv("GOOGLE_HTTP_POOL_SIZE", "32"))
+GOOGLE_HTTP_POOL_HOSTS = int(os.getenv("GOOGLE_HTTP_POOL_HOSTS", "8"))
+GOOGLE_HTTP_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_HTTP_TIMEOUT_SECONDS", "20"))
+
+# Responses that mean the access token was rejected and is worth refreshing once
+REFRESH_STATUS_CODES = {401}
+
+# One lock per credentials object keeps concurrent requests from refreshing the same token twice,
+# without one user's refresh holding up anyone else's
+_refresh_locks: "weakref.WeakKeyDictionary[Any, threading.Lock]" = weakref.WeakKeyDictionary()
+_refresh_locks_guard = threading.Lock()
+
+
+def refresh_lock(credentials) -> threading.Lock:
+    """The lock serialising refreshes of one credentials object"""
+    with _refresh_locks_guard:
+        lock = _refresh_locks.get(credentials)
+        if lock is None:
+            lock = _refresh_locks[credentials] = threading.Lock()
+        return lock
+
+
+def create_session(pool_size: int = GOOGLE_HTTP_POOL_SIZE, pool_hosts: int = GOOGLE_HTTP_POOL_HOSTS):
+    """requests session with bounded keep-alive pools - callers wait for a free connection instead of opening more"""
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # Retries are left to drive_client, which knows which failures are worth retrying
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+@lru_cache(maxsize=1)
+def shared_session():
+    """Process-wide session whose TLS connections are reused by every user's Google API calls"""
+    return create_session()
+
+
+class PooledHttp:
+    """Drop-in for httplib2.Http that sends requests through a shared connection pool
+
+    Each instance signs requests with one user's credentials, while connections come from
+    the shared, thread-safe pool - so services built per request no longer open (and
+    TLS-handshake) connections of their own. The timeout is per thread, because one
+    instance can serve several threads at once. on_refresh gets the credentials after each
+    refresh, so the new token can be stored.
+    """
+
+    def __init__(self, credentials=None, timeout: float = GOOGLE_HTTP_TIMEOUT_SECONDS, session=None, on_refresh: Optional[Callable[[Any], None]] = None):
+        self.credentials = credentials
+        self.default_timeout = timeout
+        self.on_refresh = on_refresh
+        self._session = session
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        return self._session or shared_session()
+
+    @property
+    def timeout(self) -> float:
+        return getattr(self._local, "timeout", self.default_timeout)
+
+    @timeout.setter
+    def timeout(self, value: float):
+        self._local.timeout = value
+
+    def with_timeout(self, timeout: float) -> "PooledHttp":
+        """Another client for the same user and pool, for work handed to other threads"""
+        return PooledHttp(self.credentials, timeout=timeout, session=self._session, on_refresh=self.on_refresh)
+
+    def request(self, uri: str, method: str = "GET", body=None, headers: Optional[Dict[str, str]] = None, redirections: int = 5, connection_type=None) -> Tuple[Any, bytes]:
+        """Send a request the way httplib2.Http.request does, returning (httplib2.Response, content)"""
+        headers = dict(headers or {})
+        if self.credentials is not None:
+            self._authorize(headers)
+
+        response = self._send(uri, method, body, headers, redirections)
+        if response.status_code in REFRESH_STATUS_CODES and getattr(self.credentials, "refresh_token", None):
+            logger.info("Google API rejected the access token, refreshing and retrying once")
+            self._refresh(force=True)
+            self.credentials.apply(headers)
+            response = self._send(uri, method, body, headers, redirections)
+
+        return to_httplib2_response(response), response.content
+
+    def close(self):
+        # Connections belong to the shared pool and outlive any one service
+        pass
+
+    def _send(self, uri: str, method: str, body, headers: Dict[str, str], redirections: int):
+        return self.session.request(
+            method,
+            uri,
+            data=body,
+            headers=headers,
+            timeout=self.timeout,
+            allow_redirects=redirections > 0
+        )
+
+    def _authorize(self, headers: Dict[str, str]):
+        if not self.credentials.valid:
+            self._refresh()
+        self.credentials.apply(headers)
+
+    def _refresh(self, force: bool = False):
+        from google.auth.transport.requests import Request as GoogleRequest
+
+        token = self.credentials.token
+        with refresh_lock(self.credentials):
+            # Another thread may have refreshed the same credentials while this one waited
+            if (force and self.credentials.token != token) or (not force and self.credentials.valid):
+                return
+            self.credentials.refresh(GoogleRequest(session=BorrowedSession(self.session)))
+
+        if self.on_refresh is not None:
+            try:
+                self.on_refresh(self.credentials)
+            except Exception:
+                # The refreshed token still works for this request, it is just not stored
+                logger.exception("Failed to store refreshed Google credentials")
+
+
+class BorrowedSession:
+    """Lends a pooled session to google-auth, whose Request closes its session once garbage collected"""
+
+    def __init__(self, session):
+        self._session = session
+
+    def request(self, *args, **kwargs):
+        return self._session.request(*args, **kwargs)
+
+    def close(self):
+        # Closing the shared session would drop every user's pooled connections
+        pass
+
+
+def to_httplib2_response(response) -> Any:
+    """Turn a requests response into the httplib2.Response googleapiclient expects"""
+    import httplib2
+
+    info = {key.lower(): value for key, value in response.headers.items()}
+    info["status"] = str(response.status_code)
+    if "content-encoding" in info:
+        # requests already decoded the body - report it the way httplib2 does after decompressing
+        info["-content-encoding"] = info.pop("content-encoding")
+        info["content-length"] = str(len(response.content))
+    result = httplib2.Response(info)
+    result.reason = response.reason
+    return result
+
+
+def transport_metrics(session=None) -> Dict[str, Any]:
+    """Connections opened and requests sent per pooled host - fewer connections than requests means reuse"""
+    session = session or shared_session()
+    hosts = {}
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+            }
+    return {"pool_size": GOOGLE_HTTP_POOL_SIZE, "pool_hosts": GOOGLE_HTTP_POOL_HOSTS, "hosts": hosts}
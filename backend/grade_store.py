@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Coroutine, Deque, Dict, List, Optional, Set, Tuple
+
+from database import Base
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text
+
+logger = getLogger(__name__)
+
+# Documents graded at once by a reconciliation job, and how many finished jobs are kept for status lookups
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "2"))
+RECONCILE_JOB_HISTORY = 50
+
+# Why a document needs a new grade
+NEW = "new"
+CV_CHANGED = "cv_changed"
+POSITION_CHANGED = "position_changed"
+
+class StoredGrade(Base):
+    """AI grade of one revision of a CV, for one position description, language and model chain"""
+    __tablename__ = "stored_grades"
+
+    document_id = Column(String, primary_key=True)
+    md5_checksum = Column(String, primary_key=True)
+    position_hash = Column(String, primary_key=True)
+    language = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)  # Grading config key - model chain, token limits and thresholds
+    rating = Column(Integer, nullable=False)
+    comment = Column(Text, nullable=False)
+    graded_model = Column(String, nullable=True)  # Model whose grade was kept
+    confidence = Column(Float, nullable=True)
+    graded_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Exact copies of a CV are found by content, whatever their document ID
+    __table_args__ = (Index("ix_stored_grades_content", "md5_checksum", "position_hash", "language", "model"),)
+
+def position_hash(position_description: str) -> str:
+    """Stable short hash of a position description, ignoring surrounding whitespace"""
+    return hashlib.sha256(position_description.strip().encode("utf-8")).hexdigest()[:16]
+
+def save_grade(db, document_id: str, md5_checksum: str, position_description: str, language: str, model: str, rating: int, comment: str, graded_model: Optional[str] = None, confidence: Optional[float] = None) -> StoredGrade:
+    """Store a grade, replacing one stored for the same key"""
+    grade = db.merge(StoredGrade(
+        document_id=document_id,
+        md5_checksum=md5_checksum,
+        position_hash=position_hash(position_description),
+        language=language,
+        model=model,
+        rating=rating,
+        comment=comment,
+        graded_model=graded_model,
+        confidence=confidence,
+        graded_at=datetime.utcnow()
+    ))
+    db.commit()
+    return grade
+
+def lookup_grade(db, document_id: str, md5_checksum: str, position_description: str, language: str, model: str) -> Optional[StoredGrade]:
+    """The document's grade for this revision and position, or the grade of an exact copy stored under its ID"""
+    key = (document_id, md5_checksum, position_hash(position_description), language, model)
+    grade = db.get(StoredGrade, key)
+    if grade is not None:
+        return grade
+
+    copy = db.query(StoredGrade).filter(
+        StoredGrade.md5_checksum == md5_checksum,
+        StoredGrade.position_hash == key[2],
+        StoredGrade.language == language,
+        StoredGrade.model == model
+    ).first()
+    if copy is None:
+        return None
+    return save_grade(db, document_id, md5_checksum, position_description, language, model, copy.rating, copy.comment, copy.graded_model, copy.confidence)
+
+@dataclass
+class ReconcileItem:
+    """One document of a reconciliation job"""
+    document_id: str
+    name: str
+    md5_checksum: Optional[str]
+    status: str  # reused, copied, pending, grading, recomputed, skipped or failed
+    reason: Optional[str] = None  # Why it needed a new grade
+    rating: Optional[int] = None
+    comment: Optional[str] = None
+    model: Optional[str] = None
+    error: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def has_grade(self) -> bool:
+        return self.status in ("reused", "copied", "recomputed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "document_id": self.document_id,
+            "name": self.name,
+            "status": self.status,
+            "reason": self.reason,
+            "rating": self.rating,
+            "comment": self.comment,
+            "model": self.model,
+            "error": self.error,
+        }
+
+@dataclass
+class ReconcileJob:
+    """Background re-grading of a folder's stale grades"""
+    id: str
+    folder_id: str
+    position_description: str
+    language: str
+    model: str
+    items: List[ReconcileItem]
+    user_id: Optional[str] = None  # Who started the job - only they can look it up
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def status(self) -> str:
+        return "done" if self.finished_at else "running"
+
+    def summary(self, include_items: bool = True) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        summary = {
+            "job_id": self.id,
+            "folder_id": self.folder_id,
+            "status": self.status,
+            "position_hash": position_hash(self.position_description),
+            "language": self.language,
+            "model": self.model,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "total": len(self.items),
+            "reused": counts.get("reused", 0) + counts.get("copied", 0),
+            "recomputed": counts.get("recomputed", 0),
+            "counts": counts,
+        }
+        if include_items:
+            summary["documents"] = [item.to_dict() for item in self.items]
+        return summary
+
+def plan_reconciliation(db, folder_id: str, documents: List[Dict[str, Any]], position_description: str, language: str, model: str, user_id: Optional[str] = None) -> ReconcileJob:
+    """Sort a folder's documents into grades that are still current and grades that have to be recomputed"""
+    current_hash = position_hash(position_description)
+    document_ids = [document['id'] for document in documents]
+    checksums = {document.get('md5Checksum') for document in documents} - {None}
+
+    # Two queries for the whole folder - every grade of its documents, and current grades of identical files
+    by_document: Dict[str, List[StoredGrade]] = {}
+    for grade in db.query(StoredGrade).filter(
+        StoredGrade.document_id.in_(document_ids),
+        StoredGrade.language == language,
+        StoredGrade.model == model
+    ):
+        by_document.setdefault(grade.document_id, []).append(grade)
+    by_content: Dict[str, StoredGrade] = {}
+    if checksums:
+        for grade in db.query(StoredGrade).filter(
+            StoredGrade.md5_checksum.in_(checksums),
+            StoredGrade.position_hash == current_hash,
+            StoredGrade.language == language,
+            StoredGrade.model == model
+        ):
+            by_content.setdefault(grade.md5_checksum, grade)
+
+    items = []
+    for document in documents:
+        md5_checksum = document.get('md5Checksum')
+        item = ReconcileItem(document['id'], document.get('name', ''), md5_checksum, status="pending", metadata=document)
+        items.append(item)
+        if not md5_checksum:
+            # Without a checksum there is no way to tell revisions apart
+            item.status = "skipped"
+            item.reason = "no_checksum"
+            continue
+
+        grades = by_document.get(document['id'], [])
+        current = next((grade for grade in grades if grade.md5_checksum == md5_checksum and grade.position_hash == current_hash), None)
+        if current is not None:
+            item.status = "reused"
+        elif md5_checksum in by_content:
+            current = by_content[md5_checksum]
+            item.status = "copied"
+            save_grade(db, item.document_id, md5_checksum, position_description, language, model, current.rating, current.comment, current.graded_model, current.confidence)
+        elif any(grade.md5_checksum == md5_checksum for grade in grades):
+            item.reason = POSITION_CHANGED
+        elif grades:
+            item.reason = CV_CHANGED
+        else:
+            item.reason = NEW
+
+        if current is not None:
+            item.rating = current.rating
+            item.comment = current.comment
+            item.model = current.graded_model
+
+    return ReconcileJob(uuid.uuid4().hex, folder_id, position_description, language, model, items, user_id=user_id)
+
+# Grades one document, returning (rating, comment, graded model, confidence)
+GradeDocument = Callable[[ReconcileItem], Awaitable[Tuple[int, str, Optional[str], Optional[float]]]]
+
+# Persists a recomputed grade, given the item and the grade's confidence
+StoreGrade = Callable[[ReconcileItem, Optional[float]], None]
+
+# Publishes a job's current grades once they are all known, e.g. to scores.csv
+PublishGrades = Callable[[ReconcileJob], Awaitable[None]]
+
+async def run_reconciliation(job: ReconcileJob, grade_document: GradeDocument, store: StoreGrade, concurrency: int = RECONCILE_CONCURRENCY, publish: Optional[PublishGrades] = None):
+    """Recompute a job's pending grades, at most `concurrency` at a time
+
+    Pending documents with identical content are graded once and the grade shared between them.
+    The job only counts as done once its grades are published.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = sorted((item for item in job.items if item.status == "pending"), key=lambda item: item.md5_checksum)
+
+    async def grade_group(group: List[ReconcileItem]):
+        async with semaphore:
+            for item in group:
+                item.status = "grading"
+            try:
+                rating, comment, graded_model, confidence = await grade_document(group[0])
+            except Exception as e:
+                logger.exception(f"Failed to re-grade document {group[0].document_id}")
+                for item in group:
+                    item.status = "failed"
+                    item.error = str(getattr(e, "detail", None) or e)
+                return
+
+            for item in group:
+                item.rating, item.comment, item.model = rating, comment, graded_model
+                try:
+                    await asyncio.to_thread(store, item, confidence)
+                    item.status = "recomputed"
+                except Exception as e:
+                    logger.exception(f"Failed to store grade of document {item.document_id}")
+                    item.status = "failed"
+                    item.error = str(e)
+
+    try:
+        await asyncio.gather(*(
+            grade_group(list(group))
+            for _, group in itertools.groupby(pending, key=lambda item: item.md5_checksum)
+        ))
+        if publish is not None:
+            try:
+                await publish(job)
+            except Exception:
+                logger.exception(f"Failed to publish grades of reconciliation {job.id}")
+    finally:
+        job.finished_at = datetime.utcnow()
+        logger.info(f"Reconciliation {job.id} for folder {job.folder_id} finished: {job.summary(include_items=False)['counts']}")
+
+class ReconcileJobs:
+    """Recent reconciliation jobs, running and finished"""
+
+    def __init__(self, history: int = RECONCILE_JOB_HISTORY):
+        self._jobs: Deque[ReconcileJob] = deque(maxlen=history)
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+
+    def start(self, job: ReconcileJob, work: Coroutine[Any, Any, None]):
+        """Run a job's work in the background, keeping the task referenced until it finishes"""
+        job.task = asyncio.create_task(work)
+        self._tasks.add(job.task)
+        job.task.add_done_callback(self._tasks.discard)
+        with self._lock:
+            self._jobs.append(job)
+
+    def get(self, job_id: str, user_id: str) -> Optional[ReconcileJob]:
+        """The user's job with this ID - other users' jobs are not found"""
+        with self._lock:
+            return next((job for job in self._jobs if job.id == job_id and job.user_id == user_id), None)
+
+    def running(self, folder_id: str, position_description: str, language: str, model: str, user_id: str) -> Optional[ReconcileJob]:
+        """A job of the user already re-grading the same folder for the same position, language and model"""
+        key = (folder_id, position_hash(position_description), language, model, user_id)
+        with self._lock:
+            for job in self._jobs:
+                if job.status == "running" and (job.folder_id, position_hash(job.position_description), job.language, job.model, job.user_id) == key:
+                    return job
+        return None
+
+reconcile_jobs = ReconcileJobs()
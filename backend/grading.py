@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from logging import getLogger
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from admission import estimate_tokens
+
+logger = getLogger(__name__)
+
+# Model settings for CV grading
+GRADING_MODEL = "gpt-4o"
+GRADING_MAX_TOKENS = 1000
+GRADING_TEMPERATURE = 0.3  # Lower temperature for more consistent evaluations
+
+# Tiered grading: a cheap triage model first, escalating only unclear cases to the full model
+TIERED_GRADING_DEFAULT = os.getenv("TIERED_GRADING", "false").lower() == "true"
+TRIAGE_MODEL = os.getenv("TRIAGE_MODEL", "gpt-4o-mini")
+TRIAGE_MAX_TOKENS = int(os.getenv("TRIAGE_MAX_TOKENS", "150"))
+TRIAGE_BORDERLINE_LOW = float(os.getenv("TRIAGE_BORDERLINE_LOW", "3"))
+TRIAGE_BORDERLINE_HIGH = float(os.getenv("TRIAGE_BORDERLINE_HIGH", "4"))
+TRIAGE_MIN_CONFIDENCE = float(os.getenv("TRIAGE_MIN_CONFIDENCE", "0.7"))
+
+# Limits on model chains sent by clients, which run on the server's OpenAI key - the server's own models are always allowed
+GRADING_ALLOWED_MODELS = {
+    model.strip() for model in os.getenv("GRADING_ALLOWED_MODELS", "").split(",") if model.strip()
+} | {TRIAGE_MODEL, GRADING_MODEL}
+GRADING_MAX_TOKENS_LIMIT = int(os.getenv("GRADING_MAX_TOKENS_LIMIT", str(GRADING_MAX_TOKENS)))
+GRADING_MAX_TIERS = 3
+
+# Models named "fake:<rating>:<confidence>" answer locally without calling OpenAI - for tests and development only
+FAKE_MODEL_PREFIX = "fake:"
+ALLOW_FAKE_MODELS = os.getenv("ALLOW_FAKE_MODELS", "false").lower() == "true"
+
+# Language-specific prompts
+GRADING_LANGUAGE_CONFIGS = {
+    "en": {
+        "prompt_lang": "English",
+        "grade_intro": "Professional CV Analysis",
+    },
+    "pl": {
+        "prompt_lang": "Polish", 
+        "grade_intro": "Profesjonalna Analiza CV",
+    },
+    "es": {
+        "prompt_lang": "Spanish",
+        "grade_intro": "Análisis Profesional de CV",
+    },
+    "fr": {
+        "prompt_lang": "French",
+        "grade_intro": "Analyse Professionnelle de CV",
+    },
+    "de": {
+        "prompt_lang": "German", 
+        "grade_intro": "Professionelle CV-Analyse",
+    }
+}
+
+def build_grading_messages(candidate_name: str, position_description: str, language: str, pdf_text: str) -> List[Dict[str, str]]:
+    """Build the chat messages for grading a CV against a position description"""
+    lang_config = GRADING_LANGUAGE_CONFIGS.get(language, GRADING_LANGUAGE_CONFIGS["en"])
+    
+    # Create AI prompt for CV grading
+    prompt = f"""You are an expert HR professional and CV evaluator. Analyze this CV against the given position requirements and provide a comprehensive evaluation in {lang_config['prompt_lang']}.
+
+Position Description:
+{position_description}
+
+CV Content:
+{pdf_text[:4000]}  # Limit text to avoid token limits
+
+Candidate: {candidate_name}
+
+Please provide:
+1. A detailed evaluation comment (2-3 paragraphs) covering:
+   - How well the candidate matches the position requirements
+   - Key strengths and relevant experience
+   - Areas where the candidate may need development
+   - Overall assessment of fit for the role
+
+2. A numerical rating from 1-5 where:
+   - 1 = Poor fit, major gaps in requirements
+   - 2 = Below average fit, several important gaps
+   - 3 = Average fit, meets basic requirements
+   - 4 = Good fit, meets most requirements well
+   - 5 = Excellent fit, exceeds requirements
+
+Requirements:
+- Be objective and professional
+- Focus on job-relevant skills and experience
+- Provide constructive feedback
+- Write in {lang_config['prompt_lang']} language
+- Be specific about strengths and weaknesses
+- Consider both technical and soft skills
+
+Format your response as:
+RATING: [1-5]
+COMMENT: [Your detailed evaluation]"""
+
+    return [
+        {"role": "system", "content": f"You are a professional HR expert and CV evaluator. Provide thorough, objective assessments in {lang_config['prompt_lang']}."},
+        {"role": "user", "content": prompt}
+    ]
+
+def parse_grading_response(ai_response: str) -> Tuple[int, str]:
+    """Parse the rating and comment out of a grading response"""
+    # Parse the response to extract rating and comment
+    lines = ai_response.split('\n')
+    rating = 3  # Default rating
+    comment = ai_response  # Default to full response
+    
+    for line in lines:
+        if line.startswith('RATING:'):
+            try:
+                rating = int(line.split(':')[1].strip())
+                rating = max(1, min(5, rating))  # Ensure rating is between 1-5
+            except (ValueError, IndexError):
+                pass
+        elif line.startswith('COMMENT:'):
+            comment = line.split(':', 1)[1].strip()
+            # Get remaining lines too
+            remaining_lines = lines[lines.index(line)+1:]
+            if remaining_lines:
+                comment += '\n' + '\n'.join(remaining_lines)
+            break
+    
+    # Clean up comment - remove any remaining RATING: lines
+    comment_lines = [line for line in comment.split('\n') if not line.startswith('RATING:')]
+    comment = '\n'.join(comment_lines).strip()
+    
+    return rating, comment
+
+
+@dataclass
+class TieredGradingConfig:
+    """Model chain for tiered grading - every model but the last triages, the last grades in full"""
+    models: List[str] = field(default_factory=lambda: [TRIAGE_MODEL, GRADING_MODEL])
+    max_tokens: List[int] = field(default_factory=lambda: [TRIAGE_MAX_TOKENS, GRADING_MAX_TOKENS])
+    borderline_low: float = TRIAGE_BORDERLINE_LOW
+    borderline_high: float = TRIAGE_BORDERLINE_HIGH
+    min_confidence: float = TRIAGE_MIN_CONFIDENCE
+
+    def validate(self):
+        """Reject chains the server will not run, clamping token limits to the configured maximum"""
+        if not self.models:
+            raise ValueError("The model chain needs at least one model")
+        if len(self.models) > GRADING_MAX_TIERS:
+            raise ValueError(f"The model chain can have at most {GRADING_MAX_TIERS} models")
+        if len(self.max_tokens) != len(self.models):
+            raise ValueError("max_tokens needs one limit per model")
+        for model in self.models:
+            if is_fake_model(model):
+                if not ALLOW_FAKE_MODELS:
+                    raise ValueError("Fake models are disabled on this server")
+                parse_fake_model(model)
+            elif model not in GRADING_ALLOWED_MODELS:
+                raise ValueError(f"Model {model} is not allowed, use one of: {', '.join(sorted(GRADING_ALLOWED_MODELS))}")
+        self.max_tokens = [max(1, min(GRADING_MAX_TOKENS_LIMIT, limit)) for limit in self.max_tokens]
+        if self.borderline_low > self.borderline_high:
+            raise ValueError("borderline_low must not be above borderline_high")
+        if not 0 <= self.min_confidence <= 1:
+            raise ValueError("min_confidence must be between 0 and 1")
+
+    def cache_key(self) -> str:
+        """Canonical form of the validated chain, so grades are only reused for the same models, limits and thresholds"""
+        return json.dumps({
+            "models": list(self.models),
+            "max_tokens": [int(limit) for limit in self.max_tokens],
+            "borderline_low": float(self.borderline_low),
+            "borderline_high": float(self.borderline_high),
+            "min_confidence": float(self.min_confidence),
+        }, sort_keys=True, separators=(",", ":"))
+
+    def should_escalate(self, rating: int, confidence: Optional[float]) -> bool:
+        """Escalate borderline ratings and answers the triage model is unsure about"""
+        if self.borderline_low <= rating <= self.borderline_high:
+            return True
+        return confidence is None or confidence < self.min_confidence
+
+@dataclass
+class GradeResult:
+    rating: int
+    comment: str
+    model: str  # Model whose grade was kept
+    models_called: List[str]
+    reached_full_model: bool
+    confidence: Optional[float] = None
+    tokens_by_model: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def escalated(self) -> bool:
+        return len(self.models_called) > 1
+
+# Completion callable: (model, messages, max_tokens, temperature) -> (text, total tokens or None)
+Complete = Callable[[str, List[Dict[str, str]], int, float], Awaitable[Tuple[str, Optional[int]]]]
+
+def build_triage_messages(candidate_name: str, position_description: str, language: str, pdf_text: str) -> List[Dict[str, str]]:
+    """Build short chat messages asking for a quick rating and how sure the model is"""
+    lang_config = GRADING_LANGUAGE_CONFIGS.get(language, GRADING_LANGUAGE_CONFIGS["en"])
+    
+    prompt = f"""Quickly screen this CV against the position requirements.
+
+Position Description:
+{position_description}
+
+CV Content:
+{pdf_text[:4000]}
+
+Candidate: {candidate_name}
+
+Rate the fit from 1-5 (1 = poor fit, 3 = average, 5 = excellent) and say how confident you are in that rating from 0.0 to 1.0.
+Write the comment as a single sentence in {lang_config['prompt_lang']}.
+
+Format your response as:
+RATING: [1-5]
+CONFIDENCE: [0.0-1.0]
+COMMENT: [One sentence]"""
+
+    return [
+        {"role": "system", "content": "You are an HR screener. Give fast, calibrated first-pass ratings."},
+        {"role": "user", "content": prompt}
+    ]
+
+CONFIDENCE_PATTERN = re.compile(r"^CONFIDENCE:\s*([0-9]*\.?[0-9]+)", re.MULTILINE)
+
+def parse_triage_response(ai_response: str) -> Tuple[int, Optional[float], str]:
+    """Parse rating, confidence and comment out of a triage response"""
+    match = CONFIDENCE_PATTERN.search(ai_response)
+    confidence = min(1.0, max(0.0, float(match.group(1)))) if match else None
+    without_confidence = CONFIDENCE_PATTERN.sub("", ai_response)
+    rating, comment = parse_grading_response(without_confidence)
+    return rating, confidence, comment
+
+def is_fake_model(model: str) -> bool:
+    return model.startswith(FAKE_MODEL_PREFIX)
+
+def parse_fake_model(model: str) -> Tuple[Optional[int], Optional[float]]:
+    """Rating and confidence of a "fake:<rating>:<confidence>" model, either may be left empty"""
+    parts = model[len(FAKE_MODEL_PREFIX):].split(":")
+    try:
+        if len(parts) > 2:
+            raise ValueError
+        rating = int(parts[0]) if parts[0] else None
+        confidence = float(parts[1]) if len(parts) > 1 and parts[1] else None
+    except ValueError:
+        raise ValueError(f"Invalid fake model {model}, expected fake:<rating>:<confidence>") from None
+    if rating is not None and not 1 <= rating <= 5:
+        raise ValueError(f"Invalid fake model {model}, the rating must be between 1 and 5")
+    if confidence is not None and not 0 <= confidence <= 1:
+        raise ValueError(f"Invalid fake model {model}, the confidence must be between 0 and 1")
+    return rating, confidence
+
+def fake_completion(model: str, messages: List[Dict[str, str]], max_tokens: int) -> Tuple[str, int]:
+    """Deterministic local stand-in for a model, e.g. "fake:5:0.9" always rates 5 with confidence 0.9
+
+    Without a rating the answer is derived from a hash of the prompt, so tests stay repeatable.
+    """
+    rating, confidence = parse_fake_model(model)
+    digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+    if rating is None:
+        rating = digest[0] % 5 + 1
+    if confidence is None:
+        confidence = round(digest[1] / 255, 2)
+    text = f"RATING: {rating}\nCONFIDENCE: {confidence}\nCOMMENT: Fake evaluation from {model}."
+    return text, estimate_tokens(messages, 0) + len(text) // 4
+
+async def grade_tiered(candidate_name: str, position_description: str, language: str, pdf_text: str, config: TieredGradingConfig, complete: Complete) -> GradeResult:
+    """Grade with each model in the chain until one is confident enough, ending with the full prompt"""
+    config.validate()
+    models_called = []
+    tokens_by_model: Dict[str, int] = {}
+    last_tier = len(config.models) - 1
+
+    for tier, (model, max_tokens) in enumerate(zip(config.models, config.max_tokens)):
+        models_called.append(model)
+        if tier == last_tier:
+            messages = build_grading_messages(candidate_name, position_description, language, pdf_text)
+            text, tokens = await complete(model, messages, max_tokens, GRADING_TEMPERATURE)
+            rating, comment = parse_grading_response(text)
+            confidence = None
+        else:
+            messages = build_triage_messages(candidate_name, position_description, language, pdf_text)
+            text, tokens = await complete(model, messages, max_tokens, 0.0)
+            rating, confidence, comment = parse_triage_response(text)
+        tokens_by_model[model] = tokens_by_model.get(model, 0) + (tokens or 0)
+
+        if tier == last_tier or not config.should_escalate(rating, confidence):
+            return GradeResult(
+                rating=rating,
+                comment=comment,
+                model=model,
+                models_called=models_called,
+                reached_full_model=tier == last_tier,
+                confidence=confidence,
+                tokens_by_model=tokens_by_model
+            )
+
+class GradingRouteStats:
+    """Counters for tiered grading routing and the full-model tokens it avoided"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.graded_total = 0
+        self.escalated_total = 0
+        self.resolved_by_model: Counter = Counter()
+        self.tokens_by_model: Counter = Counter()
+        self.full_model_tokens_avoided = 0
+        self.triage_tokens_on_escalation = 0
+
+    def record(self, result: GradeResult, full_model_estimate: int):
+        """Record one grading, with an estimate of what the full model alone would have used"""
+        with self._lock:
+            self.graded_total += 1
+            if result.escalated:
+                self.escalated_total += 1
+            self.resolved_by_model[result.model] += 1
+            self.tokens_by_model.update(result.tokens_by_model)
+            if result.reached_full_model:
+                # Triage calls that still ended with the full model are pure overhead
+                self.triage_tokens_on_escalation += sum(
+                    tokens for model, tokens in result.tokens_by_model.items() if model != result.model
+                )
+            else:
+                self.full_model_tokens_avoided += full_model_estimate
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "graded_total": self.graded_total,
+                "escalated_total": self.escalated_total,
+                "escalation_rate": round(self.escalated_total / self.graded_total, 3) if self.graded_total else None,
+                "resolved_by_model": dict(self.resolved_by_model),
+                "tokens_by_model": dict(self.tokens_by_model),
+                "full_model_tokens_avoided": self.full_model_tokens_avoided,
+                "triage_tokens_on_escalation": self.triage_tokens_on_escalation,
+                "net_tokens_saved": self.full_model_tokens_avoided - self.triage_tokens_on_escalation,
+            }
+
+grading_route_stats = GradingRouteStats()
@@ -0,0 +1,149 @@
+from typing import Dict, List, Optional, Tuple
+
+# Model settings shared by single and bulk letter generation
+LETTER_MODEL = "gpt-4o"
+LETTER_MAX_TOKENS = 800
+LETTER_TEMPERATURE = 0.7
+
+# Language-specific prompts and templates
+REJECTION_LANGUAGE_CONFIGS = {
+    "en": {
+        "prompt_lang": "English",
+        "subject_template": "Application Update - {position}",
+        "salutation": "Dear {candidate_name},"
+    },
+    "pl": {
+        "prompt_lang": "Polish",
+        "subject_template": "Aktualizacja aplikacji - {position}",
+        "salutation": "Szanowny/a {candidate_name},"
+    },
+    "es": {
+        "prompt_lang": "Spanish",
+        "subject_template": "Actualización de solicitud - {position}",
+        "salutation": "Estimado/a {candidate_name},"
+    },
+    "fr": {
+        "prompt_lang": "French",
+        "subject_template": "Mise à jour de candidature - {position}",
+        "salutation": "Cher/Chère {candidate_name},"
+    },
+    "de": {
+        "prompt_lang": "German",
+        "subject_template": "Bewerbungsupdate - {position}",
+        "salutation": "Liebe/r {candidate_name},"
+    }
+}
+
+ACCEPTANCE_LANGUAGE_CONFIGS = {
+    "en": {
+        "prompt_lang": "English",
+        "subject_template": "Job Offer - {position} Position",
+        "salutation": "Dear {candidate_name},"
+    },
+    "pl": {
+        "prompt_lang": "Polish",
+        "subject_template": "Oferta pracy - stanowisko {position}",
+        "salutation": "Szanowny/a {candidate_name},"
+    },
+    "es": {
+        "prompt_lang": "Spanish",
+        "subject_template": "Oferta de trabajo - Posición {position}",
+        "salutation": "Estimado/a {candidate_name},"
+    },
+    "fr": {
+        "prompt_lang": "French",
+        "subject_template": "Offre d'emploi - Poste {position}",
+        "salutation": "Cher/Chère {candidate_name},"
+    },
+    "de": {
+        "prompt_lang": "German",
+        "subject_template": "Stellenangebot - Position {position}",
+        "salutation": "Liebe/r {candidate_name},"
+    }
+}
+
+def candidate_name_from_document(document_name: str) -> str:
+    """Try to extract name from filename (remove .pdf, _CV, etc.)"""
+    return document_name.replace('.pdf', '').replace('_CV', '').replace('_Resume', '').replace('_', ' ').replace('-', ' ').strip()
+
+def _letter_context(comments: List[str], average_rating: Optional[float]) -> Tuple[str, str]:
+    # Prepare context for AI
+    comments_text = "\n".join([f"- {comment}" for comment in comments if comment.strip()])
+    rating_context = ""
+    if average_rating is not None:
+        rating_context = f"Average rating: {average_rating:.1f}/5.0"
+    return comments_text, rating_context
+
+def build_rejection_letter(candidate_name: str, company_name: str, position: str, language: str, comments: List[str], average_rating: Optional[float]) -> Tuple[List[Dict[str, str]], str]:
+    """Build the chat messages and subject line for a rejection letter"""
+    comments_text, rating_context = _letter_context(comments, average_rating)
+    lang_config = REJECTION_LANGUAGE_CONFIGS.get(language, REJECTION_LANGUAGE_CONFIGS["en"])
+    
+    # Create AI prompt
+    prompt = f"""Write a professional, respectful job application rejection letter in {lang_config['prompt_lang']}.
+
+Context:
+- Candidate: {candidate_name}
+- Company: {company_name}
+- Position: {position}
+{rating_context}
+
+Feedback from reviewers:
+{comments_text if comments_text else "No specific feedback provided"}
+
+Requirements:
+1. Be professional and respectful
+2. Thank the candidate for their interest
+3. If there are specific comments, incorporate constructive feedback tactfully
+4. Encourage future applications if appropriate
+5. Keep it concise but warm
+6. Use proper business letter format
+7. Write in {lang_config['prompt_lang']} language
+
+Do not include company letterhead, addresses, or dates - just the letter content starting with the salutation."""
+
+    messages = [
+        {"role": "system", "content": "You are a professional HR expert who writes empathetic and constructive rejection letters."},
+        {"role": "user", "content": prompt}
+    ]
+    return messages, lang_config["subject_template"].format(position=position)
+
+def build_acceptance_letter(candidate_name: str, company_name: str, position: str, language: str, comments: List[str], average_rating: Optional[float]) -> Tuple[List[Dict[str, str]], str]:
+    """Build the chat messages and subject line for an acceptance letter"""
+    comments_text, rating_context = _letter_context(comments, average_rating)
+    lang_config = ACCEPTANCE_LANGUAGE_CONFIGS.get(language, ACCEPTANCE_LANGUAGE_CONFIGS["en"])
+    
+    # Create AI prompt for acceptance letter
+    prompt = f"""Write a professional, welcoming job offer acceptance letter in {lang_config['prompt_lang']}.
+
+Context:
+- Candidate: {candidate_name}
+- Company: {company_name}
+- Position: {position}
+{rating_context}
+
+Positive feedback from reviewers:
+{comments_text if comments_text else "Strong positive impression from the review team"}
+
+Requirements:
+1. Be professional and enthusiastic
+2. Congratulate the candidate on being selected
+3. If there are specific positive comments, incorporate them to highlight strengths
+4. Express excitement about having them join the team
+5. Mention next steps (HR will contact them soon)
+6. Keep it warm and welcoming but professional
+7. Use proper business letter format
+8. Write in {lang_config['prompt_lang']} language
+
+Do not include company letterhead, addresses, or dates - just the letter content starting with the salutation."""
+
+    messages = [
+        {"role": "system", "content": "You are a professional HR expert who writes welcoming and enthusiastic job offer letters."},
+        {"role": "user", "content": prompt}
+    ]
+    return messages, lang_config["subject_template"].format(position=position)
+
+LETTER_BUILDERS = {
+    "rejection": build_rejection_letter,
+    "acceptance": build_acceptance_letter,
+}
@@ -1,44 +1,143 @@
-import base64
-import csv
+import asyncio
+import gzip
+import hashlib
+import hmac
 import io
 import json
 import logging
 import os
-import pickle
+import re
+from contextlib import asynccontextmanager
 from datetime import datetime
 from logging import getLogger
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
 
-import httpx
-import openai
-import PyPDF2
-import requests
+from admission import BULK, INTERACTIVE, estimate_tokens, get_admission_controller
+from bulk_letters import generate_letters, select_letter_jobs, stream_csv, stream_zip
 from database import (
-    UserSession,
-    cleanup_expired_sessions,
     create_or_update_user_session,
     create_tables,
-    delete_user_session,
     get_db,
     get_user_session,
+    new_session,
+    save_refreshed_credentials,
+    warm_up_pool,
 )
-from fastapi import Depends, FastAPI, File, HTTPException, Request, UploadFile
+from dedup import DocumentFingerprint, find_duplicates, has_reusable_signature, index_document, record_access
+from drive_batch import folder_access, get_drive_batcher, get_folder_files
+from drive_client import DRIVE_BACKOFF_MAX_SECONDS, create_file_once, drive_request_builder, drive_resilience, is_retryable_error
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
-from google.auth.transport.requests import Request as GoogleRequest
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from google_transport import PooledHttp, transport_metrics
+from grade_store import (
+    RECONCILE_CONCURRENCY,
+    ReconcileItem,
+    ReconcileJob,
+    lookup_grade,
+    plan_reconciliation,
+    reconcile_jobs,
+    run_reconciliation,
+    save_grade,
+)
+from grading import (
+    GRADING_MAX_TOKENS,
+    GRADING_MODEL,
+    TIERED_GRADING_DEFAULT,
+    TRIAGE_MAX_TOKENS,
+    TieredGradingConfig,
+    build_grading_messages,
+    fake_completion,
+    grade_tiered,
+    grading_route_stats,
+    is_fake_model,
+)
+from letters import (
+    LETTER_BUILDERS,
+    LETTER_MAX_TOKENS,
+    LETTER_MODEL,
+    LETTER_TEMPERATURE,
+    build_acceptance_letter,
+    build_rejection_letter,
+    candidate_name_from_document,
+)
+from pdf_cache import (
+    CACHE_KEY_FIELDS,
+    DOWNLOAD_BUDGET_WAIT_SECONDS,
+    DownloadBudgetTimeout,
+    FileTooLargeError,
+    cache_document,
+    check_download_size,
+    document_cache_key,
+    download_budget,
+    download_to_cache,
+    extract_and_cache,
+    get_pdf_cache,
+    run_download,
+    warm_document,
+)
+from prefetch import get_prefetcher
+from profiling import PROFILING_ADMIN_TOKEN, ProfilingMiddleware, profile_store, profiling_enabled
 from pydantic import BaseModel
+from queue_store import (
+    claim_next,
+    complete_item,
+    import_queue,
+    is_queue_imported,
+    list_queue,
+    move_item,
+    pop_item,
+    push_item,
+    queue_mirror,
+    release_item,
+    remove_item,
+    replace_queue,
+)
+from report import REPORT_FORMATS, iter_folder_documents, iter_report
+from scores import read_folder_scores, read_scores_file, record_grading_bot_scores, save_folder_scores
 from sqlalchemy.orm import Session
 
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
 logger = getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 BASE_DOMAIN = os.getenv("BASE_DOMAIN", "http://localhost:8000")
 
-app = FastAPI(title="CV Voting API", version="1.0.0")
+# Set once background warm-up has finished, reported by /health
+warm_up_complete = False
+
+def warm_up():
+    """Import heavy client libraries and open database connections ahead of the first request"""
+    global warm_up_complete
+    try:
+        import googleapiclient.discovery  # noqa: F401
+        import googleapiclient.http  # noqa: F401
+        import numpy  # noqa: F401
+        import openai  # noqa: F401
+        import PyPDF2  # noqa: F401
+        
+        warm_up_pool()
+        get_pdf_cache()
+        warm_up_complete = True
+        logger.info("Background warm-up complete")
+    except Exception:
+        # Everything warmed here is also loaded lazily on first use
+        logger.exception("Background warm-up failed")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema setup has to finish before requests touch the database
+    await asyncio.to_thread(create_tables)
+    
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+    yield
+    if not warm_up_task.done():
+        warm_up_task.cancel()
+
+app = FastAPI(title="CV Voting API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -56,6 +155,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request profiling is only wired in when configured, so it costs nothing otherwise
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
 # OAuth2 configuration
 SCOPES = [
     'openid',
@@ -73,11 +176,23 @@ REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:8000/auth/callback")
 
 # OpenAI configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if OPENAI_API_KEY:
-    openai.api_key = OPENAI_API_KEY
 
-# Initialize database on startup
-create_tables()
+def get_openai():
+    """Get the configured OpenAI module, importing it on first use"""
+    import openai
+    if OPENAI_API_KEY and openai.api_key != OPENAI_API_KEY:
+        openai.api_key = OPENAI_API_KEY
+    return openai
+
+def build(*args, **kwargs):
+    """Build a Google API client, importing the discovery machinery on first use"""
+    from googleapiclient.discovery import build as discovery_build
+    return discovery_build(*args, **kwargs)
+
+def get_oauth_flow_class():
+    """Get the OAuth flow class, importing it on first use"""
+    from google_auth_oauthlib.flow import Flow
+    return Flow
 
 # Pydantic models
 class VoteRequest(BaseModel):
@@ -129,33 +244,117 @@ class AcceptanceResponse(BaseModel):
     language: str
     subject: str
 
+class BulkLetterRequest(BaseModel):
+    threshold: float = 3.0  # Average ratings at or above get an acceptance, below a rejection
+    letter_type: str = "auto"  # auto, rejection or acceptance
+    language: str = "en"
+    company_name: str = "Our Company"
+    position: str = "the position"
+
+class QueueEntry(BaseModel):
+    id: str
+    name: Optional[str] = None
+    webViewLink: Optional[str] = None
+    webContentLink: Optional[str] = None
+    addedAt: Optional[str] = None
+
+class QueueMoveRequest(BaseModel):
+    document_id: str
+    before_id: Optional[str] = None
+    after_id: Optional[str] = None
+
+class TieredGradingOptions(BaseModel):
+    # Unset fields fall back to the server defaults
+    models: Optional[List[str]] = None  # Triage models first, full model last, from GRADING_ALLOWED_MODELS; "fake:<rating>:<confidence>" when ALLOW_FAKE_MODELS is on
+    max_tokens: Optional[List[int]] = None  # One limit per model, capped at GRADING_MAX_TOKENS_LIMIT
+    borderline_low: Optional[float] = None
+    borderline_high: Optional[float] = None
+    min_confidence: Optional[float] = None
+
 class GradingRequest(BaseModel):
     document_id: str
     document_name: str
     position_description: str
     language: str = "en"
+    tiered: Optional[TieredGradingOptions] = None
+
+class ReconcileRequest(BaseModel):
+    position_description: str
+    language: str = "en"
+    tiered: Optional[TieredGradingOptions] = None
+    concurrency: Optional[int] = None  # Capped at RECONCILE_CONCURRENCY
 
 class GradingResponse(BaseModel):
     comment: str
     rating: int
     language: str
+    model: Optional[str] = None  # Model whose grade was kept
+    models_called: List[str] = []
+    confidence: Optional[float] = None
+    reused: bool = False  # Grade taken from an identical file graded for the same position
+    exact_duplicates: List[str] = []
+    near_duplicates: List[Dict[str, Any]] = []
 
-def get_google_drive_service(user_id: str, db: Session):
-    """Get authenticated Google Drive service"""
+def admission_key(user_id: str, db: Session) -> str:
+    """Key for per-user admission limits - only signed-in users get one, so the limit cannot be dodged with made-up IDs"""
+    user_session = get_user_session(db, user_id)
+    if not user_session or user_session.is_expired():
+        raise HTTPException(status_code=401, detail="User not authenticated. Please authorize first.")
+    return user_session.user_id
+
+async def create_chat_completion(user_key: str, priority: int, **kwargs):
+    """Call the OpenAI chat API under admission control, off the event loop"""
+    estimated_tokens = estimate_tokens(kwargs["messages"], kwargs.get("max_tokens", 0))
+    async with get_admission_controller().admit(user_key, estimated_tokens, priority) as ticket:
+        response = await asyncio.to_thread(get_openai().chat.completions.create, **kwargs)
+        ticket.record_usage(getattr(response.usage, "total_tokens", None))
+    return response
+
+def get_user_credentials(user_id: str, db: Session) -> "Credentials":
+    """Get the user's Google credentials, refreshing them if expired"""
     user_session = get_user_session(db, user_id)
     if not user_session or user_session.is_expired():
         raise HTTPException(status_code=401, detail="User not authenticated. Please authorize first.")
     
+    return session_credentials(user_session, db)
+
+def session_credentials(user_session, db: Session) -> "Credentials":
+    """Decode a session's Google credentials, refreshing them if expired"""
     creds = user_session.get_credentials()
     
     # Refresh token if expired
     if creds.expired and creds.refresh_token:
+        from google.auth.transport.requests import Request as GoogleRequest
         creds.refresh(GoogleRequest())
         # Update credentials in database
         user_session.set_credentials(creds)
         db.commit()
     
-    return build('drive', 'v3', credentials=creds)
+    return creds
+
+def build_drive_service(user_id: str, creds: "Credentials"):
+    """Build a Drive service on the shared connection pool whose requests retry, time out and fall back to cached responses"""
+    http = PooledHttp(creds, on_refresh=lambda refreshed: save_refreshed_credentials(user_id, refreshed))
+    return build('drive', 'v3', http=http, requestBuilder=drive_request_builder(user_id))
+
+def get_google_drive_service(user_id: str, db: Session):
+    """Get authenticated Google Drive service"""
+    return build_drive_service(user_id, get_user_credentials(user_id, db))
+
+def get_drive_service_factory(user_id: str, db: Session):
+    """Get a factory building Drive services for background work outside the request"""
+    creds = get_user_credentials(user_id, db)
+    return lambda: build_drive_service(user_id, creds)
+
+def drive_failure(error: Exception, message: str) -> HTTPException:
+    """503 with Retry-After when Drive is having trouble, 500 for anything else"""
+    if is_retryable_error(error):
+        return HTTPException(
+            status_code=503,
+            detail=f"{message}: Google Drive is temporarily unavailable. Please retry shortly.",
+            headers={"Retry-After": str(max(1, round(DRIVE_BACKOFF_MAX_SECONDS)))}
+        )
+    return HTTPException(status_code=500, detail=f"{message}: {str(error)}")
 
 def get_user_profile_service(user_id: str, db: Session):
     """Get authenticated Google OAuth2 service for user profile"""
@@ -167,12 +366,13 @@ def get_user_profile_service(user_id: str, db: Session):
     
     # Refresh token if expired
     if creds.expired and creds.refresh_token:
+        from google.auth.transport.requests import Request as GoogleRequest
         creds.refresh(GoogleRequest())
         # Update credentials in database
         user_session.set_credentials(creds)
         db.commit()
     
-    return build('oauth2', 'v2', credentials=creds)
+    return build('oauth2', 'v2', http=PooledHttp(creds, on_refresh=lambda refreshed: save_refreshed_credentials(user_id, refreshed)))
 
 @app.get("/")
 async def root():
@@ -180,7 +380,50 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+    return {"status": "healthy", "timestamp": datetime.utcnow(), "warmed_up": warm_up_complete}
+
+@app.get("/metrics/admission")
+async def admission_metrics():
+    """Queue depth and concurrency of OpenAI-backed requests"""
+    return get_admission_controller().metrics()
+
+@app.get("/metrics/drive")
+async def drive_metrics():
+    """Retries, timeouts, circuit state, hedging and latency per Drive endpoint, plus connection reuse and download budget"""
+    return {**drive_resilience.metrics(), "transport": transport_metrics(), "download_budget": download_budget.metrics()}
+
+@app.get("/metrics/grading")
+async def grading_metrics():
+    """How tiered grading routed CVs and the full-model tokens it saved"""
+    return grading_route_stats.metrics()
+
+def require_profiling_admin(request: Request):
+    """Only admins holding the profiling token may read profiles"""
+    if not PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling admin access is not enabled")
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), PROFILING_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/profiles", dependencies=[Depends(require_profiling_admin)])
+async def list_profiles():
+    """List the most recent request profiles, newest first"""
+    return {"profiles": profile_store.list()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_profiling_admin)])
+async def get_profile(profile_id: int, format: str = "speedscope"):
+    """Get a stored profile as speedscope JSON or collapsed stacks"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return Response(profile.collapsed(), media_type="text/plain")
+    if format != "speedscope":
+        raise HTTPException(status_code=400, detail="Format must be speedscope or collapsed")
+    return Response(
+        json.dumps(profile.speedscope()),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'}
+    )
 
 @app.get("/auth/url", response_model=AuthUrl)
 async def get_auth_url():
@@ -198,7 +441,7 @@ async def get_auth_url():
                     "redirect_uris": [REDIRECT_URI]
                 }
             }
-            flow = Flow.from_client_config(client_config, scopes=SCOPES)
+            flow = get_oauth_flow_class().from_client_config(client_config, scopes=SCOPES)
             logger.info("Using Google OAuth credentials from environment variables")
         else:
             # Fall back to credentials.json file
@@ -209,7 +452,7 @@ async def get_auth_url():
                     detail=f"Google OAuth credentials not configured. Please set GOOGLE_CLIENT_ID and GOOGLE_CLIENT_SECRET environment variables or provide {GOOGLE_CLIENT_SECRETS_FILE}"
                 )
             
-            flow = Flow.from_client_secrets_file(
+            flow = get_oauth_flow_class().from_client_secrets_file(
                 GOOGLE_CLIENT_SECRETS_FILE,
                 scopes=SCOPES
             )
@@ -249,10 +492,10 @@ async def auth_callback(request: Request, db: Session = Depends(get_db)):
                     "redirect_uris": [REDIRECT_URI]
                 }
             }
-            flow = Flow.from_client_config(client_config, scopes=SCOPES)
+            flow = get_oauth_flow_class().from_client_config(client_config, scopes=SCOPES)
         else:
             # Fall back to credentials.json file
-            flow = Flow.from_client_secrets_file(
+            flow = get_oauth_flow_class().from_client_secrets_file(
                 GOOGLE_CLIENT_SECRETS_FILE,
                 scopes=SCOPES
             )
@@ -263,7 +506,7 @@ async def auth_callback(request: Request, db: Session = Depends(get_db)):
         
         # Get user info to create session
         try:
-            user_service = build('oauth2', 'v2', credentials=flow.credentials)
+            user_service = build('oauth2', 'v2', http=PooledHttp(flow.credentials))
             user_info = user_service.userinfo().get().execute()
             
             user_id = user_info.get('email') or user_info.get('id')  # Use email or Google ID as user ID
@@ -332,10 +575,10 @@ async def get_documents(folder_id: str, user_id: str, db: Session = Depends(get_
         
         # List files in the folder
         query = f"'{folder_id}' in parents and mimeType='application/pdf' and name != 'scores.csv'"
-        results = service.files().list(
+        results = await get_drive_batcher(user_id).submit(service, service.files().list(
             q=query,
             fields="files(id,name,mimeType,webViewLink,webContentLink)"
-        ).execute()
+        ))
         
         files = results.get('files', [])
         return [
@@ -353,6 +596,157 @@ async def get_documents(folder_id: str, user_id: str, db: Session = Depends(get_
         logger.exception("Failed to get documents")
         raise HTTPException(status_code=500, detail=f"Failed to get documents: {str(e)}")
 
+RANGE_HEADER_PATTERN = re.compile(r"bytes=(\d*)-(\d*)$")
+
+def parse_range_header(range_header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into inclusive byte offsets, or None to send the whole file"""
+    match = RANGE_HEADER_PATTERN.match(range_header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    
+    if match.group(1) == "":
+        # Suffix range - the last N bytes
+        start = max(0, file_size - int(match.group(2)))
+        end = file_size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), file_size - 1) if match.group(2) else file_size - 1
+    
+    if start >= file_size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{file_size}"}
+        )
+    return start, end
+
+def iter_file_range(pdf_file: BinaryIO, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Read an inclusive byte range of an open file in chunks, closing it afterwards"""
+    with pdf_file as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+class ReleasingResponseMixin:
+    """Runs a release callback once the response is sent, or the client went away before it was"""
+    
+    def __init__(self, *args, release: Callable[[], None], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = release
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+class CachedFileResponse(ReleasingResponseMixin, FileResponse):
+    """A whole cached PDF, sent by path and kept from eviction until it is"""
+
+class CachedRangeResponse(ReleasingResponseMixin, StreamingResponse):
+    """Part of a cached PDF, read from a handle that is closed however the response ends"""
+
+@app.get("/documents/{file_id}/content")
+async def get_document_content(file_id: str, user_id: str, request: Request, db: Session = Depends(get_db)):
+    """Serve a document's PDF through the shared disk cache, with Range and ETag support
+    
+    Files other than PDFs are sent as attachments, so the API origin never renders them.
+    """
+    try:
+        service = get_google_drive_service(user_id, db)
+        # Looking up metadata with the user's credentials also checks they can see the file
+        metadata = await asyncio.to_thread(service.files().get(
+            fileId=file_id,
+            fields=f"{CACHE_KEY_FIELDS},name,mimeType,size"
+        ).execute)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Failed to get document metadata")
+        raise HTTPException(status_code=500, detail=f"Failed to get document: {str(e)}")
+    
+    cache_key = document_cache_key(metadata)
+    is_pdf = metadata.get('mimeType', 'application/pdf') == 'application/pdf'
+    media_type = "application/pdf" if is_pdf else "application/octet-stream"
+    headers = {
+        "ETag": f'"{cache_key}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"{'inline' if is_pdf else 'attachment'}; filename*=UTF-8''{quote(metadata.get('name', file_id))}",
+        "X-Content-Type-Options": "nosniff",
+    }
+    
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in etags or headers["ETag"] in etags:
+            return Response(status_code=304, headers=headers)
+    
+    range_header = request.headers.get("range")
+    if not range_header:
+        # Whole cached files are handed to FileResponse by path, leaving the file reads to the server
+        cached_path = get_pdf_cache().pin_pdf(cache_key)
+        if cached_path is not None:
+            return CachedFileResponse(
+                cached_path,
+                media_type=media_type,
+                headers=headers,
+                release=lambda: get_pdf_cache().unpin(cache_key)
+            )
+    
+    # An open handle keeps serving the file even if the cache evicts it meanwhile
+    pdf_file = get_pdf_cache().open_pdf(cache_key) if range_header else None
+    
+    if pdf_file is None:
+        declared_size = int(metadata['size']) if metadata.get('size') else None
+        try:
+            check_download_size(declared_size)
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=f"Document is too large to serve: {e}")
+        
+        if not range_header:
+            # Pass chunks through to the client as they arrive while filling the cache - or, when
+            # another request is already downloading the file, from the cache once it is done
+            if declared_size is not None:
+                headers["Content-Length"] = str(declared_size)
+            return StreamingResponse(
+                download_to_cache(service, file_id, cache_key, declared_size),
+                media_type=media_type,
+                headers=headers
+            )
+        
+        # Ranges are served from disk, so fill the cache first
+        try:
+            pdf_file = await asyncio.to_thread(cache_document, service, file_id, cache_key, declared_size)
+        except FileTooLargeError as e:
+            raise HTTPException(status_code=413, detail=f"Document is too large to serve: {e}")
+        except Exception as e:
+            logger.exception("Failed to download document")
+            raise HTTPException(status_code=500, detail=f"Failed to download document: {str(e)}")
+    
+    file_size = os.fstat(pdf_file.fileno()).st_size
+    try:
+        byte_range = parse_range_header(range_header, file_size)
+    except HTTPException:
+        pdf_file.close()
+        raise
+    start, end = byte_range or (0, file_size - 1)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return CachedRangeResponse(
+        iter_file_range(pdf_file, start, end),
+        status_code=206 if byte_range else 200,
+        media_type=media_type,
+        headers=headers,
+        release=pdf_file.close
+    )
+
 @app.get("/scores/{folder_id}")
 async def get_scores(folder_id: str, user_id: str, db: Session = Depends(get_db)):
     """Load existing scores from scores.csv in the Google Drive folder"""
@@ -361,56 +755,52 @@ async def get_scores(folder_id: str, user_id: str, db: Session = Depends(get_db)
         
         # Find scores.csv file
         query = f"'{folder_id}' in parents and name='scores.csv'"
-        results = service.files().list(q=query).execute()
+        results = await get_drive_batcher(user_id).submit(service, service.files().list(q=query))
         files = results.get('files', [])
         
         if not files:
             return {"votes": {}, "comments": {}}
         
-        # Download the CSV content
-        scores_file_id = files[0]['id']
-        request = service.files().get_media(fileId=scores_file_id)
-        
-        # Execute the request and get content
-        csv_content = request.execute().decode('utf-8')
-        
-        # Parse CSV data
-        lines = csv_content.strip().split('\n')
-        if len(lines) <= 1:  # Only header or empty
-            return {"votes": {}, "comments": {}}
-        
-        votes = {}
-        comments = {}
-        
-        # Parse CSV with proper handling
-        csv_reader = csv.reader(lines)
-        header = next(csv_reader)  # Skip header
-        
-        for row in csv_reader:
-            if len(row) >= 3:
-                doc_id, voter, rating = row[0], row[1], row[2]
-                comment = row[3] if len(row) > 3 else ""
-                
-                try:
-                    rating = int(rating)
-                except ValueError:
-                    continue
-                
-                if doc_id not in votes:
-                    votes[doc_id] = {}
-                if doc_id not in comments:
-                    comments[doc_id] = {}
-                
-                votes[doc_id][voter] = rating
-                if comment:
-                    comments[doc_id][voter] = comment
+        # Download and parse the CSV content
+        votes, comments = await asyncio.to_thread(read_scores_file, service, files[0]['id'])
         
         return {"votes": votes, "comments": comments}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to load scores")
-        # Return empty data on error - let the frontend handle it gracefully
-        return {"votes": {}, "comments": {}}
+        # Empty scores would look like nobody has voted yet, so report the failure instead
+        raise drive_failure(e, "Failed to load scores")
+
+@app.get("/analytics/{folder_id}")
+async def get_analytics(folder_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Reviewer-normalized scores, confidence intervals and inter-rater agreement for a folder"""
+    from analytics import analytics_cache, compute_analytics
+    
+    service = get_google_drive_service(user_id, db)
+    try:
+        query = f"'{folder_id}' in parents and name='scores.csv'"
+        results = await get_drive_batcher(user_id).submit(service, service.files().list(
+            q=query,
+            fields="files(id,version)"
+        ))
+        files = results.get('files', [])
+        if not files:
+            return await asyncio.to_thread(compute_analytics, {})
+        
+        # The file's version changes on every save, so it doubles as the cache key
+        scores_version = f"{files[0]['id']}:{files[0].get('version')}"
+        analytics = analytics_cache.get(folder_id, scores_version)
+        if analytics is None:
+            votes, _ = await asyncio.to_thread(read_scores_file, service, files[0]['id'])
+            analytics = await asyncio.to_thread(compute_analytics, votes)
+            analytics_cache.put(folder_id, scores_version, analytics)
+        return analytics
+        
+    except Exception as e:
+        logger.exception("Failed to compute analytics")
+        raise HTTPException(status_code=500, detail=f"Failed to compute analytics: {str(e)}")
 
 @app.post("/scores/{folder_id}")
 async def save_scores(folder_id: str, scores_data: dict[str, Any], user_id: str, db: Session = Depends(get_db)):
@@ -425,66 +815,19 @@ async def save_scores(folder_id: str, scores_data: dict[str, Any], user_id: str,
         logger.info(f"Received votes: {votes}")
         logger.info(f"Received comments: {comments}")
         
-        # Create CSV content
-        csv_buffer = io.StringIO()
-        csv_writer = csv.writer(csv_buffer)
-        
-        # Write header
-        csv_writer.writerow(['document_id', 'voter_name', 'rating', 'comment'])
-        
-        # Write data - collect all voters from both votes and comments
-        all_docs = set(votes.keys()) | set(comments.keys())
-        
-        for doc_id in all_docs:
-            doc_votes = votes.get(doc_id, {})
-            doc_comments = comments.get(doc_id, {})
-            
-            # Get all voters who either voted or commented
-            all_voters = set(doc_votes.keys()) | set(doc_comments.keys())
-            
-            for voter in all_voters:
-                rating = doc_votes.get(voter, 0)  # Default to 0 if no rating
-                comment = doc_comments.get(voter, "")
-                logger.info(f"Writing row: {doc_id}, {voter}, {rating}, '{comment}'")
-                csv_writer.writerow([doc_id, voter, rating, comment])
-        
-        csv_content = csv_buffer.getvalue()
-        logger.info(f"Generated CSV content:\n{csv_content}")
-        csv_buffer.close()
-        
         # Check if scores.csv already exists
         query = f"'{folder_id}' in parents and name='scores.csv'"
-        results = service.files().list(q=query).execute()
+        results = await get_drive_batcher(user_id).submit(service, service.files().list(q=query))
         existing_files = results.get('files', [])
+        scores_file_id = existing_files[0]['id'] if existing_files else None
         
-        # Create media upload
-        media = MediaIoBaseUpload(
-            io.BytesIO(csv_content.encode('utf-8')),
-            mimetype='text/csv'
-        )
-        
-        if existing_files:
-            # Update existing file
-            file_id = existing_files[0]['id']
-            logger.info(f"Updating existing CSV file with ID: {file_id}")
-            result = service.files().update(
-                fileId=file_id,
-                media_body=media
-            ).execute()
-            logger.info(f"Update result: {result}")
+        if scores_file_id:
+            logger.info(f"Updating existing CSV file with ID: {scores_file_id}")
         else:
-            # Create new file
-            file_metadata = {
-                'name': 'scores.csv',
-                'parents': [folder_id]
-            }
             logger.info(f"Creating new CSV file in folder: {folder_id}")
-            result = service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
-            logger.info(f"Create result: {result}")
+        # The upload and its retries run off the event loop, taking turns with Grading bot updates
+        result = await asyncio.to_thread(save_folder_scores, service, folder_id, votes, comments, scores_file_id)
+        logger.info(f"Save result: {result}")
         
         logger.info("CSV file saved successfully to Google Drive")
         return {"message": "Scores saved successfully"}
@@ -501,431 +844,705 @@ async def submit_vote(vote: VoteRequest):
     
     return {"message": "Vote received", "vote": vote.dict()}
 
+def read_drive_queue(service, folder_id: str) -> Optional[List[Any]]:
+    """Read queue.txt from the Google Drive folder, or None if it is unreadable"""
+    # Find queue.txt file
+    query = f"'{folder_id}' in parents and name='queue.txt'"
+    files = service.files().list(q=query).execute().get('files', [])
+    
+    if not files:
+        return []
+    
+    return read_queue_file(service, files[0]['id'])
+
+def read_queue_file(service, queue_file_id: str) -> Optional[List[Any]]:
+    """Download and parse a queue.txt file, or None if it is unreadable"""
+    txt_content = service.files().get_media(fileId=queue_file_id).execute().decode('utf-8')
+    
+    # Parse the queue data (JSON format)
+    try:
+        return json.loads(txt_content) if txt_content.strip() else []
+    except json.JSONDecodeError:
+        logger.error("Failed to parse queue.txt content")
+        return None
+
+def write_drive_queue(service, folder_id: str, queue: List[Any]):
+    """Save a queue snapshot to queue.txt in the Google Drive folder"""
+    from googleapiclient.http import MediaIoBaseUpload
+    
+    # Create JSON content
+    json_content = json.dumps(queue, indent=2)
+    
+    # Check if queue.txt already exists
+    query = f"'{folder_id}' in parents and name='queue.txt'"
+    existing_files = service.files().list(q=query).execute().get('files', [])
+    
+    # Create media upload
+    media = MediaIoBaseUpload(
+        io.BytesIO(json_content.encode('utf-8')),
+        mimetype='text/plain'
+    )
+    
+    if existing_files:
+        # Update existing file
+        file_id = existing_files[0]['id']
+        logger.info(f"Updating existing queue file with ID: {file_id}")
+        service.files().update(fileId=file_id, media_body=media).execute()
+    else:
+        # Create new file, checking a failed attempt did not create it before trying again
+        logger.info(f"Creating new queue file in folder: {folder_id}")
+        create_file_once(service, folder_id, 'queue.txt', media)
+    
+    logger.info(f"Queue snapshot for folder {folder_id} mirrored to Google Drive")
+
+def queue_changed(folder_id: str, service_factory, db: Session):
+    """Mirror a changed queue to queue.txt in the background and re-target prefetching"""
+    def write_snapshot():
+        # Read the queue when the snapshot is written, so it includes every change made meanwhile
+        snapshot_db = new_session()
+        try:
+            queue = [item.to_dict() for item in list_queue(snapshot_db, folder_id)]
+        finally:
+            snapshot_db.close()
+        write_drive_queue(service_factory(), folder_id, queue)
+    
+    queue_mirror.schedule(folder_id, write_snapshot)
+    
+    head = [item.to_dict() for item in list_queue(db, folder_id, limit=get_prefetcher().depth)]
+    get_prefetcher().schedule(folder_id, head, service_factory)
+
+async def require_folder_access(folder_id: str, user_id: str, db: Session):
+    """Get a Drive service factory for the user, once Drive confirms they can open the folder
+    
+    The queue is served from the database, so Drive no longer enforces folder access on its own.
+    """
+    service_factory = get_drive_service_factory(user_id, db)
+    try:
+        allowed = await folder_access.check(user_id, service_factory, folder_id)
+    except Exception as e:
+        logger.exception("Failed to check folder access")
+        raise drive_failure(e, "Failed to check folder access")
+    if not allowed:
+        raise HTTPException(status_code=404, detail="Folder not found")
+    return service_factory
+
+async def ensure_queue_imported(folder_id: str, service_factory, db: Session):
+    """Import queue.txt before the first change to a folder's queue, so the mirror never replaces it with a partial queue"""
+    if is_queue_imported(db, folder_id):
+        return
+    try:
+        queue_data = await asyncio.to_thread(lambda: read_drive_queue(service_factory(), folder_id))
+    except Exception as e:
+        logger.exception("Failed to import queue")
+        raise drive_failure(e, "Failed to import queue")
+    if queue_data is None:
+        raise HTTPException(status_code=409, detail="queue.txt in this folder could not be read. Fix or remove it before changing the queue.")
+    import_queue(db, folder_id, queue_data)
+
 @app.get("/queue/{folder_id}")
 async def get_queue(folder_id: str, user_id: str, db: Session = Depends(get_db)):
-    """Load existing queue from queue.txt in the Google Drive folder"""
+    """Load the folder's queue, importing queue.txt from Google Drive on first use"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
     try:
-        service = get_google_drive_service(user_id, db)
-        
-        # Find queue.txt file
-        query = f"'{folder_id}' in parents and name='queue.txt'"
-        results = service.files().list(q=query).execute()
-        files = results.get('files', [])
+        if not is_queue_imported(db, folder_id):
+            queue_data = await asyncio.to_thread(lambda: read_drive_queue(service_factory(), folder_id))
+            if queue_data is None:
+                return {"queue": []}
+            import_queue(db, folder_id, queue_data)
         
-        if not files:
-            return {"queue": []}
+        queue = [item.to_dict() for item in list_queue(db, folder_id)]
         
-        # Download the txt content
-        queue_file_id = files[0]['id']
-        request = service.files().get_media(fileId=queue_file_id)
-        
-        # Execute the request and get content
-        txt_content = request.execute().decode('utf-8')
-        
-        # Parse the queue data (JSON format)
-        try:
-            queue_data = json.loads(txt_content) if txt_content.strip() else []
-            return {"queue": queue_data}
-        except json.JSONDecodeError:
-            logger.error("Failed to parse queue.txt content")
-            return {"queue": []}
+        # Reviewers are about to work through this queue, so start warming it
+        get_prefetcher().schedule(folder_id, queue, service_factory)
+        return {"queue": queue}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to load queue")
-        # Return empty queue on error
-        return {"queue": []}
+        raise drive_failure(e, "Failed to load queue")
+
+# Responses smaller than this are sent uncompressed - gzip would barely shrink them
+GZIP_MIN_BYTES = 1024
+
+def section_etag(section: str, payload: Any) -> str:
+    """ETag of one section of a combined response, from its canonical JSON"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return f'"{section}-{hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]}"'
+
+def parse_if_none_match(header: Optional[str]) -> set:
+    """ETags listed in an If-None-Match header, ignoring weak markers"""
+    if not header:
+        return set()
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+def json_response(request: Request, payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Compact JSON response, gzipped when the client accepts it and the body is worth compressing"""
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", "").lower():
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/folders/{folder_id}/bootstrap")
+async def bootstrap_folder(folder_id: str, user_id: str, request: Request, db: Session = Depends(get_db)):
+    """Everything the voting page needs to open a folder - profile, documents, scores and queue - in one response
+    
+    The session is resolved and the Drive service built once. The three folder lookups go out as
+    one batch, then scores.csv and queue.txt are downloaded concurrently. Each section carries its
+    own ETag; sections whose ETag the client sends in If-None-Match come back as null and are
+    listed under "unchanged", and a 304 is returned when nothing changed at all.
+    """
+    user_session = get_user_session(db, user_id)
+    if not user_session or user_session.is_expired():
+        raise HTTPException(status_code=401, detail="User not authenticated. Please authorize first.")
+    
+    creds = session_credentials(user_session, db)
+    service_factory = lambda: build_drive_service(user_id, creds)
+    service = service_factory()
+    
+    queue_imported = is_queue_imported(db, folder_id)
+    try:
+        # Listings of a folder the user cannot open just come back empty, so access is checked alongside them
+        allowed, folder_files = await asyncio.gather(
+            folder_access.check(user_id, service_factory, folder_id),
+            asyncio.to_thread(get_folder_files, service, folder_id)
+        )
+        if not allowed:
+            raise HTTPException(status_code=404, detail="Folder not found")
+        
+        async def load_scores():
+            if not folder_files["scores"]:
+                return {}, {}
+            return await asyncio.to_thread(read_scores_file, service, folder_files["scores"][0]['id'])
+        
+        async def load_drive_queue():
+            # queue.txt is only read the first time a folder is opened, the database holds the queue after that
+            if queue_imported or not folder_files["queue"]:
+                return []
+            # Service objects are not thread-safe, so the concurrent download gets its own
+            queue_service = await asyncio.to_thread(service_factory)
+            return await asyncio.to_thread(read_queue_file, queue_service, folder_files["queue"][0]['id'])
+        
+        (votes, comments), queue_data = await asyncio.gather(load_scores(), load_drive_queue())
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Failed to bootstrap folder")
+        raise drive_failure(e, "Failed to load folder")
+    
+    if not queue_imported and queue_data is not None:
+        import_queue(db, folder_id, queue_data)
+    queue = [item.to_dict() for item in list_queue(db, folder_id)]
+    if queue:
+        # Reviewers are about to work through this queue, so start warming it
+        get_prefetcher().schedule(folder_id, queue, service_factory)
+    
+    sections = {
+        "profile": UserProfile(name=user_session.name, email=user_session.email, picture=user_session.picture).dict(),
+        "documents": [
+            DocumentResponse(
+                id=file['id'],
+                name=file['name'],
+                mimeType=file['mimeType'],
+                webViewLink=file['webViewLink'],
+                webContentLink=file['webContentLink']
+            ).dict()
+            for file in folder_files["documents"]
+        ],
+        "scores": {"votes": votes, "comments": comments},
+        "queue": queue,
+    }
+    etags = {name: section_etag(name, payload) for name, payload in sections.items()}
+    overall_etag = section_etag("bootstrap", etags)
+    
+    known = parse_if_none_match(request.headers.get("if-none-match"))
+    unchanged = [name for name, etag in etags.items() if etag in known]
+    if overall_etag in known or len(unchanged) == len(sections):
+        return Response(status_code=304, headers={"ETag": overall_etag, "Vary": "Accept-Encoding"})
+    
+    payload = {name: (None if name in unchanged else section) for name, section in sections.items()}
+    payload["etags"] = etags
+    payload["unchanged"] = unchanged
+    return json_response(request, payload, headers={"ETag": overall_etag, "Cache-Control": "private, no-cache"})
 
 @app.post("/queue/{folder_id}")
 async def save_queue(folder_id: str, queue_data: dict[str, Any], user_id: str, db: Session = Depends(get_db)):
-    """Save queue to queue.txt in the Google Drive folder"""
+    """Replace the folder's whole queue"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
     try:
-        service = get_google_drive_service(user_id, db)
-        
-        queue = queue_data.get("queue", [])
-        
-        # Create JSON content
-        json_content = json.dumps(queue, indent=2)
-        
-        # Check if queue.txt already exists
-        query = f"'{folder_id}' in parents and name='queue.txt'"
-        results = service.files().list(q=query).execute()
-        existing_files = results.get('files', [])
-        
-        # Create media upload
-        media = MediaIoBaseUpload(
-            io.BytesIO(json_content.encode('utf-8')),
-            mimetype='text/plain'
-        )
-        
-        if existing_files:
-            # Update existing file
-            file_id = existing_files[0]['id']
-            logger.info(f"Updating existing queue file with ID: {file_id}")
-            result = service.files().update(
-                fileId=file_id,
-                media_body=media
-            ).execute()
-            logger.info(f"Update result: {result}")
-        else:
-            # Create new file
-            file_metadata = {
-                'name': 'queue.txt',
-                'parents': [folder_id]
-            }
-            logger.info(f"Creating new queue file in folder: {folder_id}")
-            result = service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
-            logger.info(f"Create result: {result}")
-        
-        logger.info("Queue file saved successfully to Google Drive")
+        replace_queue(db, folder_id, queue_data.get("queue", []))
+        queue_changed(folder_id, service_factory, db)
         return {"message": "Queue saved successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to save queue")
         raise HTTPException(status_code=500, detail=f"Failed to save queue: {str(e)}")
 
+@app.post("/queue/{folder_id}/push")
+async def push_queue_item(folder_id: str, entry: QueueEntry, user_id: str, db: Session = Depends(get_db)):
+    """Add a document to the end of the queue"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    queue_item = push_item(db, folder_id, entry.dict(exclude_none=True))
+    if not queue_item:
+        raise HTTPException(status_code=409, detail="Document is already in the queue")
+    
+    queue_changed(folder_id, service_factory, db)
+    return {"item": queue_item.to_dict()}
+
+@app.post("/queue/{folder_id}/pop")
+async def pop_queue_item(folder_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Remove and return the first document in the queue"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    item = pop_item(db, folder_id)
+    if item:
+        queue_changed(folder_id, service_factory, db)
+    return {"item": item}
+
+@app.post("/queue/{folder_id}/move")
+async def move_queue_item(folder_id: str, move: QueueMoveRequest, user_id: str, db: Session = Depends(get_db)):
+    """Move a document directly before or after another queued document"""
+    if (move.before_id is None) == (move.after_id is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of before_id or after_id")
+    
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    queue_item = move_item(db, folder_id, move.document_id, before_id=move.before_id, after_id=move.after_id)
+    if not queue_item:
+        raise HTTPException(status_code=404, detail="Document or anchor not found in the queue")
+    
+    queue_changed(folder_id, service_factory, db)
+    return {"item": queue_item.to_dict()}
+
+@app.delete("/queue/{folder_id}/items/{document_id}")
+async def remove_queue_item(folder_id: str, document_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Remove a document from the queue"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    if not remove_item(db, folder_id, document_id):
+        raise HTTPException(status_code=404, detail="Document not found in the queue")
+    
+    queue_changed(folder_id, service_factory, db)
+    return {"message": "Document removed from queue"}
+
+@app.post("/queue/{folder_id}/claim-next")
+async def claim_next_queue_item(folder_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Claim the next document nobody else is reviewing, handing the reviewer's previous one back to the queue"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    queue_item = claim_next(db, folder_id, user_id)
+    # Claims show up in queue.txt, and the released document may be claimable again
+    queue_changed(folder_id, service_factory, db)
+    return {"item": queue_item.to_dict() if queue_item else None}
+
+@app.post("/queue/{folder_id}/items/{document_id}/complete")
+async def complete_queue_item(folder_id: str, document_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Remove a document the reviewer has finished reviewing from the queue"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    if not complete_item(db, folder_id, document_id, user_id):
+        raise HTTPException(status_code=409, detail="Document is not claimed by this reviewer")
+    
+    queue_changed(folder_id, service_factory, db)
+    return {"message": "Document completed"}
+
+@app.post("/queue/{folder_id}/items/{document_id}/release")
+async def release_queue_item(folder_id: str, document_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Hand a claimed document back to the queue without reviewing it"""
+    service_factory = await require_folder_access(folder_id, user_id, db)
+    await ensure_queue_imported(folder_id, service_factory, db)
+    if not release_item(db, folder_id, document_id, user_id):
+        raise HTTPException(status_code=409, detail="Document is not claimed by this reviewer")
+    
+    queue_changed(folder_id, service_factory, db)
+    return {"message": "Document released"}
+
 @app.post("/generate-rejection", response_model=RejectionResponse)
-async def generate_rejection_letter(request: RejectionRequest):
+async def generate_rejection_letter(request: RejectionRequest, user_id: str, db: Session = Depends(get_db)):
     """Generate AI-powered rejection letter based on comments and ratings"""
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OpenAI API key not configured")
     
     try:
-        # Extract candidate name from document name if not provided
-        candidate_name = request.candidate_name
-        if not candidate_name:
-            # Try to extract name from filename (remove .pdf, _CV, etc.)
-            candidate_name = request.document_name.replace('.pdf', '').replace('_CV', '').replace('_Resume', '').replace('_', ' ').replace('-', ' ').strip()
-        
-        # Prepare context for AI
-        comments_text = "\n".join([f"- {comment}" for comment in request.comments if comment.strip()])
-        rating_context = ""
-        if request.average_rating is not None:
-            rating_context = f"Average rating: {request.average_rating:.1f}/5.0"
-        
-        # Language-specific prompts and templates
-        language_configs = {
-            "en": {
-                "prompt_lang": "English",
-                "subject_template": "Application Update - {position}",
-                "salutation": "Dear {candidate_name},"
-            },
-            "pl": {
-                "prompt_lang": "Polish",
-                "subject_template": "Aktualizacja aplikacji - {position}",
-                "salutation": "Szanowny/a {candidate_name},"
-            },
-            "es": {
-                "prompt_lang": "Spanish",
-                "subject_template": "Actualización de solicitud - {position}",
-                "salutation": "Estimado/a {candidate_name},"
-            },
-            "fr": {
-                "prompt_lang": "French",
-                "subject_template": "Mise à jour de candidature - {position}",
-                "salutation": "Cher/Chère {candidate_name},"
-            },
-            "de": {
-                "prompt_lang": "German",
-                "subject_template": "Bewerbungsupdate - {position}",
-                "salutation": "Liebe/r {candidate_name},"
-            }
-        }
-        
-        lang_config = language_configs.get(request.language, language_configs["en"])
+        candidate_name = request.candidate_name or candidate_name_from_document(request.document_name)
+        messages, subject = build_rejection_letter(
+            candidate_name,
+            request.company_name,
+            request.position,
+            request.language,
+            request.comments,
+            request.average_rating
+        )
         
-        # Create AI prompt
-        prompt = f"""Write a professional, respectful job application rejection letter in {lang_config['prompt_lang']}.
-
-Context:
-- Candidate: {candidate_name}
-- Company: {request.company_name}
-- Position: {request.position}
-{rating_context}
-
-Feedback from reviewers:
-{comments_text if comments_text else "No specific feedback provided"}
-
-Requirements:
-1. Be professional and respectful
-2. Thank the candidate for their interest
-3. If there are specific comments, incorporate constructive feedback tactfully
-4. Encourage future applications if appropriate
-5. Keep it concise but warm
-6. Use proper business letter format
-7. Write in {lang_config['prompt_lang']} language
-
-Do not include company letterhead, addresses, or dates - just the letter content starting with the salutation."""
-
         # Generate letter using OpenAI
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a professional HR expert who writes empathetic and constructive rejection letters."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=800,
-            temperature=0.7
+        response = await create_chat_completion(
+            admission_key(user_id, db),
+            INTERACTIVE,
+            model=LETTER_MODEL,
+            messages=messages,
+            max_tokens=LETTER_MAX_TOKENS,
+            temperature=LETTER_TEMPERATURE
         )
         
         letter_content = response.choices[0].message.content.strip()
         
-        # Generate subject line
-        subject = lang_config["subject_template"].format(position=request.position)
-        
         return RejectionResponse(
             letter=letter_content,
             language=request.language,
             subject=subject
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to generate rejection letter")
         raise HTTPException(status_code=500, detail=f"Failed to generate rejection letter: {str(e)}")
 
 @app.post("/generate-acceptance", response_model=AcceptanceResponse)
-async def generate_acceptance_letter(request: AcceptanceRequest):
+async def generate_acceptance_letter(request: AcceptanceRequest, user_id: str, db: Session = Depends(get_db)):
     """Generate AI-powered acceptance letter based on comments and ratings"""
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OpenAI API key not configured")
     
     try:
-        # Extract candidate name from document name if not provided
-        candidate_name = request.candidate_name
-        if not candidate_name:
-            # Try to extract name from filename (remove .pdf, _CV, etc.)
-            candidate_name = request.document_name.replace('.pdf', '').replace('_CV', '').replace('_Resume', '').replace('_', ' ').replace('-', ' ').strip()
-        
-        # Prepare context for AI
-        comments_text = "\n".join([f"- {comment}" for comment in request.comments if comment.strip()])
-        rating_context = ""
-        if request.average_rating is not None:
-            rating_context = f"Average rating: {request.average_rating:.1f}/5.0"
-        
-        # Language-specific prompts and templates
-        language_configs = {
-            "en": {
-                "prompt_lang": "English",
-                "subject_template": "Job Offer - {position} Position",
-                "salutation": "Dear {candidate_name},"
-            },
-            "pl": {
-                "prompt_lang": "Polish",
-                "subject_template": "Oferta pracy - stanowisko {position}",
-                "salutation": "Szanowny/a {candidate_name},"
-            },
-            "es": {
-                "prompt_lang": "Spanish",
-                "subject_template": "Oferta de trabajo - Posición {position}",
-                "salutation": "Estimado/a {candidate_name},"
-            },
-            "fr": {
-                "prompt_lang": "French",
-                "subject_template": "Offre d'emploi - Poste {position}",
-                "salutation": "Cher/Chère {candidate_name},"
-            },
-            "de": {
-                "prompt_lang": "German",
-                "subject_template": "Stellenangebot - Position {position}",
-                "salutation": "Liebe/r {candidate_name},"
-            }
-        }
-        
-        lang_config = language_configs.get(request.language, language_configs["en"])
+        candidate_name = request.candidate_name or candidate_name_from_document(request.document_name)
+        messages, subject = build_acceptance_letter(
+            candidate_name,
+            request.company_name,
+            request.position,
+            request.language,
+            request.comments,
+            request.average_rating
+        )
         
-        # Create AI prompt for acceptance letter
-        prompt = f"""Write a professional, welcoming job offer acceptance letter in {lang_config['prompt_lang']}.
-
-Context:
-- Candidate: {candidate_name}
-- Company: {request.company_name}
-- Position: {request.position}
-{rating_context}
-
-Positive feedback from reviewers:
-{comments_text if comments_text else "Strong positive impression from the review team"}
-
-Requirements:
-1. Be professional and enthusiastic
-2. Congratulate the candidate on being selected
-3. If there are specific positive comments, incorporate them to highlight strengths
-4. Express excitement about having them join the team
-5. Mention next steps (HR will contact them soon)
-6. Keep it warm and welcoming but professional
-7. Use proper business letter format
-8. Write in {lang_config['prompt_lang']} language
-
-Do not include company letterhead, addresses, or dates - just the letter content starting with the salutation."""
-
         # Generate letter using OpenAI
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a professional HR expert who writes welcoming and enthusiastic job offer letters."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=800,
-            temperature=0.7
+        response = await create_chat_completion(
+            admission_key(user_id, db),
+            INTERACTIVE,
+            model=LETTER_MODEL,
+            messages=messages,
+            max_tokens=LETTER_MAX_TOKENS,
+            temperature=LETTER_TEMPERATURE
         )
         
         letter_content = response.choices[0].message.content.strip()
         
-        # Generate subject line
-        subject = lang_config["subject_template"].format(position=request.position)
-        
         return AcceptanceResponse(
             letter=letter_content,
             language=request.language,
             subject=subject
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to generate acceptance letter")
         raise HTTPException(status_code=500, detail=f"Failed to generate acceptance letter: {str(e)}")
 
-@app.post("/grade-cv", response_model=GradingResponse)
-async def grade_cv(request: GradingRequest, user_id: str, db: Session = Depends(get_db)):
-    """AI-powered CV grading agent that analyzes CV against position description"""
+@app.post("/letters/bulk/{folder_id}")
+async def generate_bulk_letters(folder_id: str, request: BulkLetterRequest, user_id: str, format: str = "zip", db: Session = Depends(get_db)):
+    """Generate letters for every rated document in a folder, streamed as a ZIP of text files or a CSV"""
     if not OPENAI_API_KEY:
         raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    if format not in ("zip", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be zip or csv")
+    if request.letter_type not in ("auto", *LETTER_BUILDERS):
+        raise HTTPException(status_code=400, detail="Letter type must be auto, rejection or acceptance")
     
+    # Everything that can fail with a proper status code happens before streaming starts
+    service = get_google_drive_service(user_id, db)
     try:
-        # Get Google Drive service for the user
-        service = get_google_drive_service(user_id, db)
-        
-        # Download the PDF file from Google Drive
-        pdf_request = service.files().get_media(fileId=request.document_id)
-        pdf_content = pdf_request.execute()
-        
-        # Extract text from PDF
-        pdf_text = ""
-        try:
-            pdf_file = io.BytesIO(pdf_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            for page in pdf_reader.pages:
-                pdf_text += page.extract_text() + "\n"
-                
-        except Exception as pdf_error:
-            logger.error(f"Failed to extract text from PDF: {pdf_error}")
-            pdf_text = "[Could not extract text from PDF - file may be image-based or corrupted]"
-        
-        # Extract candidate name from document name if possible
-        candidate_name = request.document_name.replace('.pdf', '').replace('_CV', '').replace('_Resume', '').replace('_', ' ').replace('-', ' ').strip()
-        
-        # Language-specific prompts
-        language_configs = {
-            "en": {
-                "prompt_lang": "English",
-                "grade_intro": "Professional CV Analysis",
-            },
-            "pl": {
-                "prompt_lang": "Polish", 
-                "grade_intro": "Profesjonalna Analiza CV",
-            },
-            "es": {
-                "prompt_lang": "Spanish",
-                "grade_intro": "Análisis Profesional de CV",
-            },
-            "fr": {
-                "prompt_lang": "French",
-                "grade_intro": "Analyse Professionnelle de CV",
-            },
-            "de": {
-                "prompt_lang": "German", 
-                "grade_intro": "Professionelle CV-Analyse",
-            }
-        }
-        
-        lang_config = language_configs.get(request.language, language_configs["en"])
-        
-        # Create AI prompt for CV grading
-        prompt = f"""You are an expert HR professional and CV evaluator. Analyze this CV against the given position requirements and provide a comprehensive evaluation in {lang_config['prompt_lang']}.
-
-Position Description:
-{request.position_description}
+        # Every page of the folder - a single listing stops at Drive's default page size
+        documents = await asyncio.to_thread(lambda: list(iter_folder_documents(service, folder_id, fields="id,name")))
+        votes, comments = await asyncio.to_thread(read_folder_scores, service, folder_id)
+    except Exception as e:
+        logger.exception("Failed to load folder for bulk letters")
+        raise HTTPException(status_code=502, detail=f"Failed to load folder from Google Drive: {str(e)}")
+    
+    jobs = select_letter_jobs(documents, votes, comments, request.threshold, request.letter_type)
+    user_key = admission_key(user_id, db)
+    
+    async def complete(messages: List[Dict[str, str]]) -> str:
+        response = await create_chat_completion(
+            user_key,
+            BULK,
+            model=LETTER_MODEL,
+            messages=messages,
+            max_tokens=LETTER_MAX_TOKENS,
+            temperature=LETTER_TEMPERATURE
+        )
+        return response.choices[0].message.content.strip()
+    
+    results = generate_letters(jobs, request.language, request.company_name, request.position, complete)
+    filename = f"letters-{folder_id}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "X-Letter-Count": str(len(jobs))}
+    
+    if format == "csv":
+        return StreamingResponse(stream_csv(results), media_type="text/csv", headers=headers)
+    return StreamingResponse(stream_zip(results), media_type="application/zip", headers=headers)
 
-CV Content:
-{pdf_text[:4000]}  # Limit text to avoid token limits
+@app.get("/report/{folder_id}")
+async def get_report(folder_id: str, user_id: str, format: str = "csv", db: Session = Depends(get_db)):
+    """Export a folder's documents joined with vote aggregates, comments and AI grades"""
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(REPORT_FORMATS)}")
+    
+    # Scores are loaded up front so Drive errors still get a proper status code
+    service = get_google_drive_service(user_id, db)
+    try:
+        votes, comments = await asyncio.to_thread(read_folder_scores, service, folder_id)
+    except Exception as e:
+        logger.exception("Failed to load scores for report")
+        raise HTTPException(status_code=502, detail=f"Failed to load scores from Google Drive: {str(e)}")
+    
+    media_type, _ = REPORT_FORMATS[format]
+    return StreamingResponse(
+        iter_report(service, folder_id, votes, comments, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="report-{folder_id}.{format}"'}
+    )
 
-Candidate: {candidate_name}
+def grading_config_for(tiered: Optional[TieredGradingOptions]) -> TieredGradingConfig:
+    """Model chain for a grading request - its own tiers, the server's tiered default, or the full model alone"""
+    if tiered is not None:
+        config = TieredGradingConfig(**tiered.dict(exclude_none=True))
+        if tiered.models is not None and tiered.max_tokens is None:
+            # Custom chains without limits get the triage limit for every tier but the last
+            config.max_tokens = [TRIAGE_MAX_TOKENS] * (len(config.models) - 1) + [GRADING_MAX_TOKENS]
+    elif TIERED_GRADING_DEFAULT:
+        config = TieredGradingConfig()
+    else:
+        config = TieredGradingConfig(models=[GRADING_MODEL], max_tokens=[GRADING_MAX_TOKENS])
+    config.validate()
+    return config
 
-Please provide:
-1. A detailed evaluation comment (2-3 paragraphs) covering:
-   - How well the candidate matches the position requirements
-   - Key strengths and relevant experience
-   - Areas where the candidate may need development
-   - Overall assessment of fit for the role
+def index_and_find_duplicates(db: Session, user_id: str, metadata: Dict[str, Any], pdf_text: Optional[str]) -> Dict[str, Any]:
+    """Add a document to the dedup index and look up the user's copies of it, without failing the caller
 
-2. A numerical rating from 1-5 where:
-   - 1 = Poor fit, major gaps in requirements
-   - 2 = Below average fit, several important gaps
-   - 3 = Average fit, meets basic requirements
-   - 4 = Good fit, meets most requirements well
-   - 5 = Excellent fit, exceeds requirements
+    Without the text (the CV was not downloaded) it is only indexed when a copy's signature can be reused.
+    """
+    no_duplicates = {"document_id": metadata['id'], "exact": [], "near": []}
+    try:
+        if pdf_text is not None or has_reusable_signature(db, metadata.get('md5Checksum')):
+            index_document(db, metadata['id'], metadata.get('md5Checksum'), pdf_text or "", metadata.get('name'), user_id)
+        return find_duplicates(db, metadata['id'], user_id) or no_duplicates
+    except Exception:
+        logger.exception(f"Failed to update dedup index for document {metadata['id']}")
+        db.rollback()
+        return no_duplicates
 
-Requirements:
-- Be objective and professional
-- Focus on job-relevant skills and experience
-- Provide constructive feedback
-- Write in {lang_config['prompt_lang']} language
-- Be specific about strengths and weaknesses
-- Consider both technical and soft skills
+@app.get("/documents/{document_id}/duplicates")
+async def get_document_duplicates(document_id: str, user_id: str, db: Session = Depends(get_db)):
+    """Find exact copies and near-duplicates of a document among the indexed CVs the user can reach"""
+    service = get_google_drive_service(user_id, db)
+    try:
+        metadata = await asyncio.to_thread(service.files().get(fileId=document_id, fields=f"{CACHE_KEY_FIELDS},name").execute)
+        fingerprint = db.get(DocumentFingerprint, document_id)
+        if fingerprint is None or fingerprint.md5_checksum != metadata.get('md5Checksum'):
+            # Index on demand, reusing the cached extraction when there is one
+            cache_key = await asyncio.to_thread(warm_document, service, document_id)
+            index_document(db, document_id, metadata.get('md5Checksum'), get_pdf_cache().get_text(cache_key) or "", metadata.get('name'), user_id)
+        else:
+            # The metadata lookup above went through the user's Drive, so they can reach this document
+            record_access(db, document_id, user_id)
+        return find_duplicates(db, document_id, user_id)
+    except HTTPException:
+        raise
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"Document is too large to index: {e}")
+    except Exception as e:
+        logger.exception("Failed to find duplicates")
+        raise HTTPException(status_code=500, detail=f"Failed to find duplicates: {str(e)}")
 
-Format your response as:
-RATING: [1-5]
-COMMENT: [Your detailed evaluation]"""
+async def document_text(service, metadata: Dict[str, Any]) -> str:
+    """A document's extracted text - warmed by the queue prefetcher when unchanged, else downloaded under the size limits"""
+    cache_key = document_cache_key(metadata)
+    pdf_text = get_pdf_cache().get_text(cache_key)
+    if pdf_text is not None:
+        logger.info(f"Using cached text for document {metadata['id']}")
+        return pdf_text
+    
+    # Stream the PDF through a spooled file in the download pool, where waiting for budget blocks no other work
+    declared_size = int(metadata['size']) if metadata.get('size') else None
+    try:
+        return await run_download(extract_and_cache, service, metadata['id'], cache_key, declared_size)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"CV is too large to grade: {e}")
+    except DownloadBudgetTimeout:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many large CVs are being downloaded right now. Please retry shortly.",
+            headers={"Retry-After": str(round(DOWNLOAD_BUDGET_WAIT_SECONDS))}
+        )
 
+def chat_completer(user_key: str, priority: int):
+    """Completion function for grade_tiered - fake models answer locally, the rest go to OpenAI under admission control"""
+    async def complete(model: str, messages: List[Dict[str, str]], max_tokens: int, temperature: float):
+        if is_fake_model(model):
+            return fake_completion(model, messages, max_tokens)
         # Generate evaluation using OpenAI
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": f"You are a professional HR expert and CV evaluator. Provide thorough, objective assessments in {lang_config['prompt_lang']}."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-            temperature=0.3  # Lower temperature for more consistent evaluations
+        response = await create_chat_completion(
+            user_key,
+            priority,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature
         )
+        return response.choices[0].message.content.strip(), getattr(response.usage, "total_tokens", None)
+    
+    return complete
+
+@app.post("/grade-cv", response_model=GradingResponse)
+async def grade_cv(request: GradingRequest, user_id: str, db: Session = Depends(get_db)):
+    """AI-powered CV grading agent that analyzes CV against position description"""
+    try:
+        grading_config = grading_config_for(request.tiered)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not OPENAI_API_KEY and not all(is_fake_model(model) for model in grading_config.models):
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    try:
+        # Get Google Drive service for the user
+        service = get_google_drive_service(user_id, db)
         
-        ai_response = response.choices[0].message.content.strip()
-        
-        # Parse the response to extract rating and comment
-        lines = ai_response.split('\n')
-        rating = 3  # Default rating
-        comment = ai_response  # Default to full response
-        
-        for line in lines:
-            if line.startswith('RATING:'):
-                try:
-                    rating = int(line.split(':')[1].strip())
-                    rating = max(1, min(5, rating))  # Ensure rating is between 1-5
-                except (ValueError, IndexError):
-                    pass
-            elif line.startswith('COMMENT:'):
-                comment = line.split(':', 1)[1].strip()
-                # Get remaining lines too
-                remaining_lines = lines[lines.index(line)+1:]
-                if remaining_lines:
-                    comment += '\n' + '\n'.join(remaining_lines)
-                break
+        metadata = await asyncio.to_thread(service.files().get(fileId=request.document_id, fields=f"{CACHE_KEY_FIELDS},name,size").execute)
+        
+        # This revision, or an exact copy of it, may already be graded for this position - then the PDF is not downloaded
+        md5_checksum = metadata.get('md5Checksum')
+        chain_key = grading_config.cache_key()
+        stored_grade = None
+        if md5_checksum:
+            stored_grade = lookup_grade(db, request.document_id, md5_checksum, request.position_description, request.language, chain_key)
+        
+        if stored_grade:
+            logger.info(f"Reusing stored grade for document {request.document_id}")
+            duplicates = index_and_find_duplicates(db, user_id, metadata, get_pdf_cache().get_text(document_cache_key(metadata)))
+            return GradingResponse(
+                comment=stored_grade.comment,
+                rating=stored_grade.rating,
+                language=request.language,
+                model=stored_grade.graded_model,
+                confidence=stored_grade.confidence,
+                reused=True,
+                exact_duplicates=[copy["document_id"] for copy in duplicates["exact"]],
+                near_duplicates=duplicates["near"]
+            )
+        
+        pdf_text = await document_text(service, metadata)
+        duplicates = index_and_find_duplicates(db, user_id, metadata, pdf_text)
+        
+        complete = chat_completer(admission_key(user_id, db), INTERACTIVE)
         
-        # Clean up comment - remove any remaining RATING: lines
-        comment_lines = [line for line in comment.split('\n') if not line.startswith('RATING:')]
-        comment = '\n'.join(comment_lines).strip()
+        candidate_name = candidate_name_from_document(request.document_name)
+        result = await grade_tiered(candidate_name, request.position_description, request.language, pdf_text, grading_config, complete)
+        
+        full_model_estimate = estimate_tokens(
+            build_grading_messages(candidate_name, request.position_description, request.language, pdf_text),
+            grading_config.max_tokens[-1]
+        )
+        grading_route_stats.record(result, full_model_estimate)
+        if len(grading_config.models) > 1:
+            logger.info(f"Graded document {request.document_id} with {' -> '.join(result.models_called)}")
+        
+        if md5_checksum:
+            save_grade(db, request.document_id, md5_checksum, request.position_description, request.language, chain_key, result.rating, result.comment, result.model, result.confidence)
         
         return GradingResponse(
-            comment=comment,
-            rating=rating,
-            language=request.language
+            comment=result.comment,
+            rating=result.rating,
+            language=request.language,
+            model=result.model,
+            models_called=result.models_called,
+            confidence=result.confidence,
+            exact_duplicates=[copy["document_id"] for copy in duplicates["exact"]],
+            near_duplicates=duplicates["near"]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception("Failed to grade CV")
         raise HTTPException(status_code=500, detail=f"Failed to grade CV: {str(e)}")
 
+@app.post("/grades/{folder_id}/reconcile", status_code=202)
+async def reconcile_grades(folder_id: str, request: ReconcileRequest, user_id: str, db: Session = Depends(get_db)):
+    """Re-grade only the folder's CVs whose file or position description changed since they were graded
+    
+    Grades that are still current are reused, and the rest are recomputed in the background.
+    The job is returned right away; its progress is at GET /grades/jobs/{job_id}.
+    """
+    try:
+        grading_config = grading_config_for(request.tiered)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if not OPENAI_API_KEY and not all(is_fake_model(model) for model in grading_config.models):
+        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
+    
+    chain_key = grading_config.cache_key()
+    running_job = reconcile_jobs.running(folder_id, request.position_description, request.language, chain_key, user_id)
+    if running_job:
+        return running_job.summary()
+    
+    service_factory = get_drive_service_factory(user_id, db)
+    try:
+        documents = await asyncio.to_thread(
+            lambda: list(iter_folder_documents(service_factory(), folder_id, fields=f"{CACHE_KEY_FIELDS},name,size"))
+        )
+    except Exception as e:
+        logger.exception("Failed to list documents for reconciliation")
+        raise drive_failure(e, "Failed to list documents")
+    
+    job = plan_reconciliation(db, folder_id, documents, request.position_description, request.language, chain_key, user_id)
+    complete = chat_completer(admission_key(user_id, db), BULK)
+    
+    async def grade_document(item: ReconcileItem):
+        # Each document gets its own service, since several are graded at once
+        service = await asyncio.to_thread(service_factory)
+        pdf_text = await document_text(service, item.metadata)
+        candidate_name = candidate_name_from_document(item.name)
+        result = await grade_tiered(candidate_name, request.position_description, request.language, pdf_text, grading_config, complete)
+        grading_route_stats.record(result, estimate_tokens(
+            build_grading_messages(candidate_name, request.position_description, request.language, pdf_text),
+            grading_config.max_tokens[-1]
+        ))
+        return result.rating, result.comment, result.model, result.confidence
+    
+    def store(item: ReconcileItem, confidence: Optional[float]):
+        store_db = new_session()
+        try:
+            save_grade(store_db, item.document_id, item.md5_checksum, request.position_description, request.language, chain_key, item.rating, item.comment, item.model, confidence)
+        finally:
+            store_db.close()
+    
+    async def publish(job: ReconcileJob):
+        # The voting app and reports read AI grades from the Grading bot's rows in scores.csv
+        grades = {item.document_id: (item.rating, item.comment) for item in job.items if item.has_grade}
+        if grades:
+            await asyncio.to_thread(lambda: record_grading_bot_scores(service_factory(), folder_id, grades))
+    
+    concurrency = max(1, min(request.concurrency or RECONCILE_CONCURRENCY, RECONCILE_CONCURRENCY))
+    reconcile_jobs.start(job, run_reconciliation(job, grade_document, store, concurrency, publish))
+    logger.info(f"Started reconciliation {job.id} for folder {folder_id}: {job.summary(include_items=False)['counts']}")
+    return job.summary()
+
+@app.get("/grades/jobs/{job_id}")
+async def get_reconcile_job(job_id: str, user_id: str):
+    """Progress of a reconciliation job - which grades were reused and which were recomputed"""
+    # Only the user who started the job sees it, as its grades come from their folder
+    job = reconcile_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Reconciliation job not found")
+    return job.summary()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
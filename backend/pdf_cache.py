@@ -0,0 +1,457 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, TypeVar
+
+logger = getLogger(__name__)
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "/tmp/cv-voting-cache")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+UNREADABLE_PDF_TEXT = "[Could not extract text from PDF - file may be image-based or corrupted]"
+
+# Chunk size for streaming downloads from Drive
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DRIVE_DOWNLOAD_CHUNK_KB", "1024")) * 1024
+
+# Largest file one request may download, and bytes all downloads together may hold at once
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_MB", "50")) * 1024 * 1024
+DOWNLOAD_BUDGET_BYTES = int(os.getenv("DOWNLOAD_BUDGET_MB", "200")) * 1024 * 1024
+DOWNLOAD_BUDGET_WAIT_SECONDS = float(os.getenv("DOWNLOAD_BUDGET_WAIT_SECONDS", "30"))
+# Spooled downloads move from memory to a temporary file beyond this size
+DOWNLOAD_SPOOL_MEMORY_BYTES = int(os.getenv("DOWNLOAD_SPOOL_MEMORY_KB", "1024")) * 1024
+# Threads for budgeted downloads - waiting for budget ties up one of these, never the default executor
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+
+T = TypeVar("T")
+
+
+class FileTooLargeError(Exception):
+    """A file is larger than a single download may be"""
+
+    def __init__(self, size: int, max_bytes: int):
+        super().__init__(f"File is {size / 1024 / 1024:.1f} MB, the limit is {max_bytes / 1024 / 1024:.0f} MB")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+class DownloadBudgetTimeout(Exception):
+    """Other downloads held the shared byte budget for too long"""
+
+
+class DownloadCancelled(Exception):
+    """Whoever started a download no longer wants it"""
+
+
+class ByteBudget:
+    """Bytes reserved by downloads in flight - a reservation waits until enough has been released"""
+
+    def __init__(self, capacity: int = DOWNLOAD_BUDGET_BYTES):
+        self.capacity = capacity
+        self._in_use = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes: int, timeout: float = DOWNLOAD_BUDGET_WAIT_SECONDS) -> Iterator[int]:
+        # A file larger than the whole budget still gets through, it just runs alone
+        nbytes = min(nbytes, self.capacity)
+        with self._condition:
+            self._waiting += 1
+            try:
+                if not self._condition.wait_for(lambda: self._in_use + nbytes <= self.capacity, timeout=timeout):
+                    raise DownloadBudgetTimeout(f"Waited {timeout:g}s for {nbytes} bytes of download budget")
+            finally:
+                self._waiting -= 1
+            self._in_use += nbytes
+        try:
+            yield nbytes
+        finally:
+            with self._condition:
+                self._in_use -= nbytes
+                self._condition.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._condition:
+            return {"capacity_bytes": self.capacity, "in_use_bytes": self._in_use, "waiting": self._waiting}
+
+
+download_budget = ByteBudget()
+
+_download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix="pdf-download")
+
+
+async def run_download(func: Callable[..., T], *args) -> T:
+    """Run a budgeted download in its own thread pool, so budget waits leave asyncio.to_thread work alone"""
+    return await asyncio.get_running_loop().run_in_executor(_download_executor, functools.partial(func, *args))
+
+
+def check_download_size(declared_size: Optional[int], max_bytes: int = DOWNLOAD_MAX_BYTES):
+    """Reject a file whose declared size is over the per-file limit, before downloading any of it"""
+    if declared_size is not None and declared_size > max_bytes:
+        raise FileTooLargeError(declared_size, max_bytes)
+
+
+def extract_pdf_text(pdf_file: BinaryIO) -> str:
+    """Extract text from a PDF file object, falling back to a placeholder for unreadable files"""
+    import PyPDF2
+
+    pdf_text = ""
+    try:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        for page in pdf_reader.pages:
+            pdf_text += page.extract_text() + "\n"
+    except Exception as pdf_error:
+        logger.error(f"Failed to extract text from PDF: {pdf_error}")
+        pdf_text = UNREADABLE_PDF_TEXT
+    return pdf_text
+
+
+def stream_download(service, file_id: str, fd: BinaryIO, chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+    """Download a Drive file into fd chunk by chunk, yielding each chunk as it arrives"""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    downloader = MediaIoBaseDownload(fd, service.files().get_media(fileId=file_id), chunksize=chunk_size)
+    offset = fd.tell()
+    done = False
+    while not done:
+        _, done = downloader.next_chunk()
+        end = fd.tell()
+        fd.seek(offset)
+        chunk = fd.read(end - offset)
+        offset = end
+        if chunk:
+            yield chunk
+
+
+@contextmanager
+def spooled_download(service, file_id: str, declared_size: Optional[int], max_bytes: int = DOWNLOAD_MAX_BYTES, budget: ByteBudget = download_budget) -> Iterator[BinaryIO]:
+    """Download a Drive file into a spooled temporary file, rewound and ready to read
+
+    The declared size is checked before anything is downloaded, and counted against the shared
+    budget while the file is in use - files of unknown size count as the per-file maximum.
+    Only the first DOWNLOAD_SPOOL_MEMORY_KB stay in memory, the rest spills to disk.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+
+    check_download_size(declared_size, max_bytes)
+    with budget.reserve(declared_size if declared_size is not None else max_bytes):
+        with tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MEMORY_BYTES) as spool:
+            downloader = MediaIoBaseDownload(spool, service.files().get_media(fileId=file_id), chunksize=DOWNLOAD_CHUNK_SIZE)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+                # The declared size may be missing or wrong, so the limit is enforced on what arrives too
+                if spool.tell() > max_bytes:
+                    raise FileTooLargeError(spool.tell(), max_bytes)
+            spool.seek(0)
+            yield spool
+
+
+class PdfCache:
+    """Disk cache of PDF bytes and extracted text, evicted least recently used first"""
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        # Keys being served by path, which eviction leaves alone, and downloads in progress per key
+        self._pins: Dict[str, int] = {}
+        self._downloads: Dict[str, threading.Event] = {}
+        os.makedirs(directory, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        """Rebuild the LRU order from files left by a previous process"""
+        sizes = {}
+        mtimes = {}
+        for name in os.listdir(self.directory):
+            key, ext = os.path.splitext(name)
+            if ext not in (".pdf", ".txt"):
+                # Leftovers from downloads interrupted more than an hour ago
+                path = os.path.join(self.directory, name)
+                if ext == ".tmp" and time.time() - os.path.getmtime(path) > 3600:
+                    os.remove(path)
+                continue
+            stat = os.stat(os.path.join(self.directory, name))
+            sizes[key] = sizes.get(key, 0) + stat.st_size
+            mtimes[key] = max(mtimes.get(key, 0), stat.st_mtime)
+
+        for key in sorted(sizes, key=lambda k: mtimes[k]):
+            self._entries[key] = sizes[key]
+            self._size += sizes[key]
+        self._evict()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, f"{key}{ext}")
+
+    def _touch(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def get_text(self, key: str) -> Optional[str]:
+        """Get cached extracted text for a key"""
+        if not self._touch(key):
+            return None
+        try:
+            with open(self._path(key, ".txt"), encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def open_pdf(self, key: str) -> Optional[BinaryIO]:
+        """Open the cached PDF for a key - eviction may remove the file afterwards, but not the open handle"""
+        with self._lock:
+            return self._open_pdf_locked(key)
+
+    def _open_pdf_locked(self, key: str) -> Optional[BinaryIO]:
+        # Eviction deletes files under the same lock, so the file cannot vanish between the check and the open
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        try:
+            return open(self._path(key, ".pdf"), "rb")
+        except FileNotFoundError:
+            return None
+
+    def pin_pdf(self, key: str) -> Optional[str]:
+        """Path of the cached PDF for a key, kept from eviction until unpin() - for responses that send it by path"""
+        with self._lock:
+            if key not in self._entries or not os.path.exists(self._path(key, ".pdf")):
+                return None
+            self._entries.move_to_end(key)
+            self._pins[key] = self._pins.get(key, 0) + 1
+            return self._path(key, ".pdf")
+
+    def unpin(self, key: str):
+        """Release a pin taken by pin_pdf(), evicting the entry if the cache grew past its limit meanwhile"""
+        with self._lock:
+            if self._pins.get(key, 0) <= 1:
+                self._pins.pop(key, None)
+            else:
+                self._pins[key] -= 1
+            self._evict()
+
+    @contextmanager
+    def single_download(self, key: str, timeout: float = DOWNLOAD_BUDGET_WAIT_SECONDS) -> Iterator[Optional[BinaryIO]]:
+        """Let concurrent downloads of one key share a single download from Drive
+
+        Yields the cached PDF, opened for reading, once it is there - waiting for another caller's
+        download of the key if one is running. Yields None when this caller is to download it;
+        others wait until it leaves the block. A download still running after the timeout is not
+        waited for any longer, the caller then downloads on its own.
+        """
+        claim: Optional[threading.Event] = None
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                pdf_file = self._open_pdf_locked(key)
+                running = self._downloads.get(key)
+                if pdf_file is None and running is None:
+                    claim = self._downloads[key] = threading.Event()
+            if pdf_file is not None or claim is not None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not running.wait(remaining):
+                logger.warning(f"Download of {key} is taking too long, downloading it again")
+                break
+        try:
+            yield pdf_file
+        finally:
+            if claim is not None:
+                with self._lock:
+                    if self._downloads.get(key) is claim:
+                        del self._downloads[key]
+                claim.set()
+
+    def put_text(self, key: str, text: str):
+        """Store extracted text alongside an already cached PDF"""
+        self._write(self._path(key, ".txt"), text.encode("utf-8"))
+        self._add(key)
+
+    def put_pdf_stream(self, key: str, pdf_file: BinaryIO):
+        """Copy a PDF from an open file into the cache, without reading it into memory at once"""
+        tmp_file = self.new_temp_file()
+        try:
+            with tmp_file:
+                shutil.copyfileobj(pdf_file, tmp_file, DOWNLOAD_CHUNK_SIZE)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+        self.put_pdf_file(key, tmp_file.name)
+
+    def new_temp_file(self) -> BinaryIO:
+        """Open a temporary file in the cache directory, ready to be moved into place"""
+        return tempfile.NamedTemporaryFile(dir=self.directory, suffix=".tmp", delete=False)
+
+    def put_pdf_file(self, key: str, tmp_path: str) -> str:
+        """Move a fully written temporary file into the cache as the PDF for a key"""
+        path = self._path(key, ".pdf")
+        os.replace(tmp_path, path)
+        self._add(key)
+        return path
+
+    def _write(self, path: str, content: bytes):
+        # Write to a temporary name first so readers never see a partial file
+        with self.new_temp_file() as f:
+            f.write(content)
+        os.replace(f.name, path)
+
+    def _add(self, key: str):
+        size = 0
+        for ext in (".pdf", ".txt"):
+            try:
+                size += os.path.getsize(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self._size <= self.max_bytes or len(self._entries) <= 1:
+                break
+            if key in self._pins:
+                # Being sent by path right now - it goes once unpinned
+                continue
+            size = self._entries.pop(key)
+            self._size -= size
+            self._remove_files(key)
+            logger.info(f"Evicted {key} from PDF cache ({size} bytes)")
+
+    def discard(self, key: str):
+        """Drop a key from the cache"""
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._remove_files(key)
+
+    def _remove_files(self, key: str):
+        for ext in (".pdf", ".txt"):
+            try:
+                os.remove(self._path(key, ext))
+            except FileNotFoundError:
+                pass
+
+
+_pdf_cache: Optional[PdfCache] = None
+_pdf_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> PdfCache:
+    """Get the shared PDF cache, scanning the cache directory on first use"""
+    global _pdf_cache
+    with _pdf_cache_lock:
+        if _pdf_cache is None:
+            _pdf_cache = PdfCache()
+    return _pdf_cache
+
+
+# Drive fields needed to compute a document's cache key
+CACHE_KEY_FIELDS = "id,md5Checksum,version"
+
+
+def document_cache_key(metadata: dict) -> str:
+    """Cache key for a Drive file - its content checksum, or its ID and version when Drive has none"""
+    return metadata.get('md5Checksum') or f"{metadata['id']}-{metadata.get('version', '0')}"
+
+
+def download_to_cache(service, document_id: str, key: str, declared_size: Optional[int], cache: Optional[PdfCache] = None, max_bytes: int = DOWNLOAD_MAX_BYTES) -> Iterator[bytes]:
+    """Stream a Drive file into the cache, yielding chunks so callers can forward them
+
+    Files over the per-file limit are rejected like budgeted downloads, by declared size and by what arrives.
+    When the file is already being downloaded, the chunks come from the cache once that download is done.
+    """
+    check_download_size(declared_size, max_bytes)
+    cache = cache or get_pdf_cache()
+    with cache.single_download(key) as cached:
+        if cached is not None:
+            with cached:
+                yield from iter(functools.partial(cached.read, DOWNLOAD_CHUNK_SIZE), b"")
+            return
+
+        tmp_file = cache.new_temp_file()
+        try:
+            with tmp_file:
+                yield from _limited_download(service, document_id, tmp_file, max_bytes)
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+        cache.put_pdf_file(key, tmp_file.name)
+
+
+def cache_document(service, document_id: str, key: str, declared_size: Optional[int], cache: Optional[PdfCache] = None, max_bytes: int = DOWNLOAD_MAX_BYTES, cancelled: Optional[threading.Event] = None) -> BinaryIO:
+    """Download a Drive file into the cache, returning the cached PDF opened for reading
+
+    Setting the cancelled event stops the download after the chunk in flight, raising DownloadCancelled.
+    When the file is already being downloaded, that download is waited for instead of starting another.
+    """
+    check_download_size(declared_size, max_bytes)
+    cache = cache or get_pdf_cache()
+    with cache.single_download(key) as cached:
+        if cached is not None:
+            return cached
+
+        tmp_file = cache.new_temp_file()
+        try:
+            with tmp_file:
+                for _ in _limited_download(service, document_id, tmp_file, max_bytes):
+                    if cancelled is not None and cancelled.is_set():
+                        raise DownloadCancelled(f"Download of {document_id} was cancelled")
+            # Opened before it moves into place, so a concurrent eviction cannot take it away from the caller
+            pdf_file = open(tmp_file.name, "rb")
+        except BaseException:
+            os.remove(tmp_file.name)
+            raise
+        cache.put_pdf_file(key, tmp_file.name)
+        return pdf_file
+
+
+def _limited_download(service, document_id: str, fd: BinaryIO, max_bytes: int) -> Iterator[bytes]:
+    # The declared size may be missing or wrong, so the limit is enforced on what arrives too
+    for chunk in stream_download(service, document_id, fd):
+        if fd.tell() > max_bytes:
+            raise FileTooLargeError(fd.tell(), max_bytes)
+        yield chunk
+
+
+def extract_and_cache(service, document_id: str, key: str, declared_size: Optional[int], cache: Optional[PdfCache] = None) -> str:
+    """Download a PDF with bounded memory, cache it with its extracted text and return the text"""
+    cache = cache or get_pdf_cache()
+    with spooled_download(service, document_id, declared_size) as pdf_file:
+        text = extract_pdf_text(pdf_file)
+        pdf_file.seek(0)
+        cache.put_pdf_stream(key, pdf_file)
+    cache.put_text(key, text)
+    return text
+
+
+def warm_document(service, document_id: str, cache: Optional[PdfCache] = None, cancelled: Optional[threading.Event] = None) -> str:
+    """Make sure a document's PDF and extracted text are cached, returning its cache key"""
+    cache = cache or get_pdf_cache()
+    metadata = service.files().get(fileId=document_id, fields=f"{CACHE_KEY_FIELDS},size").execute()
+    key = document_cache_key(metadata)
+    if cache.get_text(key) is not None:
+        return key
+
+    declared_size = int(metadata['size']) if metadata.get('size') else None
+    pdf_file = cache.open_pdf(key) or cache_document(service, document_id, key, declared_size, cache, cancelled=cancelled)
+
+    with pdf_file:
+        cache.put_text(key, extract_pdf_text(pdf_file))
+    return key
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import threading
+from logging import getLogger
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pdf_cache import DownloadCancelled, PdfCache, get_pdf_cache, warm_document
+
+logger = getLogger(__name__)
+
+# How many upcoming queue entries to keep warm, and how many downloads may run at once
+PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "5"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+
+
+def queue_document_ids(queue: List[Any]) -> List[str]:
+    """Get document IDs from queue entries, which are either IDs or document dicts"""
+    document_ids = []
+    for item in queue:
+        document_id = item.get('id') if isinstance(item, dict) else item
+        if isinstance(document_id, str) and document_id:
+            document_ids.append(document_id)
+    return document_ids
+
+
+class QueuePrefetcher:
+    """Warms the PDF cache for the next documents in each folder's review queue"""
+
+    def __init__(self, cache: Optional[PdfCache] = None, depth: int = PREFETCH_DEPTH, concurrency: int = PREFETCH_CONCURRENCY):
+        self.cache = cache or get_pdf_cache()
+        self.depth = depth
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Each folder's task, with the event that stops its downloads already running in threads
+        self._tasks: Dict[str, Tuple[asyncio.Task, threading.Event]] = {}
+
+    def schedule(self, folder_id: str, queue: List[Any], service_factory: Callable[[], Any]):
+        """Start warming a folder's queue, cancelling work for its previous version"""
+        self.cancel(folder_id)
+
+        document_ids = queue_document_ids(queue)[:self.depth]
+        if not document_ids or self.depth <= 0:
+            return
+
+        cancelled = threading.Event()
+        task = asyncio.ensure_future(self._warm_queue(folder_id, document_ids, service_factory, cancelled))
+        self._tasks[folder_id] = (task, cancelled)
+        task.add_done_callback(lambda t: self._forget(folder_id, t))
+
+    def cancel(self, folder_id: str):
+        """Cancel pending prefetches for a folder, stopping running downloads after their current chunk"""
+        task, cancelled = self._tasks.pop(folder_id, (None, None))
+        if task is not None:
+            cancelled.set()
+            if not task.done():
+                task.cancel()
+
+    def _forget(self, folder_id: str, task: asyncio.Task):
+        if folder_id in self._tasks and self._tasks[folder_id][0] is task:
+            del self._tasks[folder_id]
+
+    async def _warm_queue(self, folder_id: str, document_ids: List[str], service_factory: Callable[[], Any], cancelled: threading.Event):
+        # Documents take the semaphore in queue order, so the next one up starts first
+        await asyncio.gather(*(
+            self._warm_in_turn(folder_id, document_id, service_factory, cancelled)
+            for document_id in document_ids
+        ))
+
+    async def _warm_in_turn(self, folder_id: str, document_id: str, service_factory: Callable[[], Any], cancelled: threading.Event):
+        async with self._semaphore:
+            try:
+                # Each download gets its own service - the underlying HTTP client is not thread-safe
+                await asyncio.to_thread(self._warm_document, service_factory, document_id, cancelled)
+            except asyncio.CancelledError:
+                raise
+            except DownloadCancelled:
+                logger.info(f"Stopped prefetching document {document_id} from folder {folder_id}, the queue changed")
+            except Exception as e:
+                logger.warning(f"Failed to prefetch document {document_id} from folder {folder_id}: {e}")
+
+    def _warm_document(self, service_factory: Callable[[], Any], document_id: str, cancelled: threading.Event):
+        if cancelled.is_set():
+            raise DownloadCancelled(f"Prefetch of {document_id} was cancelled")
+        warm_document(service_factory(), document_id, self.cache, cancelled=cancelled)
+
+
+_prefetcher: Optional[QueuePrefetcher] = None
+
+
+def get_prefetcher() -> QueuePrefetcher:
+    """Get the shared queue prefetcher"""
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = QueuePrefetcher()
+    return _prefetcher
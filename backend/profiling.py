@@ -0,0 +1,237 @@
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import getLogger
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = getLogger(__name__)
+
+# Profiling is off unless an admin token is configured - the sampling rate only applies with one,
+# since nobody could read the profiles otherwise
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_BUFFER_SIZE = int(os.getenv("PROFILING_BUFFER_SIZE", "20"))
+PROFILING_INTERVAL_SECONDS = float(os.getenv("PROFILING_INTERVAL_MS", "5")) / 1000
+
+# Request header that asks for a profile, carrying the admin token
+PROFILE_HEADER = b"x-profile"
+
+# Deepest stack recorded per sample
+MAX_STACK_DEPTH = 128
+
+Frame = Tuple[str, str, int]  # function name, file, line
+
+
+def profiling_enabled() -> bool:
+    """Check if requests can be profiled at all"""
+    if PROFILING_SAMPLE_RATE > 0 and not PROFILING_ADMIN_TOKEN:
+        logger.warning("PROFILING_SAMPLE_RATE is set without PROFILING_ADMIN_TOKEN - profiling stays off")
+    return bool(PROFILING_ADMIN_TOKEN)
+
+
+@dataclass
+class Profile:
+    """Sampled call stacks of one request"""
+    id: int
+    method: str
+    path: str
+    started_at: datetime
+    interval: float
+    duration: float = 0.0
+    status_code: Optional[int] = None
+    stacks: Counter = field(default_factory=Counter)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 1),
+            "status_code": self.status_code,
+            "samples": sum(self.stacks.values()),
+        }
+
+    def collapsed(self) -> str:
+        """Collapsed stacks ("root;child;leaf count" per line) for flamegraph.pl and similar tools"""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(";".join(f"{name} ({os.path.basename(file)}:{line})" for name, file, line in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        """The profile in speedscope's sampled file format"""
+        frame_index: Dict[Frame, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            samples.append([frame_index.setdefault(frame, len(frame_index)) for frame in stack])
+            weights.append(round(count * self.interval * 1000, 3))
+
+        name = f"{self.method} {self.path} #{self.id}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "cv-voting-profiler",
+            "shared": {
+                "frames": [{"name": frame_name, "file": file, "line": line} for (frame_name, file, line) in frame_index]
+            },
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(self.duration * 1000, 3),
+                "samples": samples,
+                "weights": weights,
+            }],
+        }
+
+
+class StackSampler:
+    """One background thread that records the stacks of every other thread at a fixed interval
+
+    Handlers run on the event loop thread and in worker threads, so all threads are
+    sampled; each stack starts with its thread's name. Every sample goes to all profiles
+    being collected, so concurrent requests share the thread and show up in each other's
+    profiles. The thread starts with the first profile and exits on its own once none is
+    left, so neither adding nor removing a profile ever waits for it.
+    """
+
+    def __init__(self, interval: float = PROFILING_INTERVAL_SECONDS):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._profiles: List[Profile] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        """Start recording stacks into a profile"""
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        """Stop recording stacks into a profile - it gets no samples after this returns"""
+        with self._lock:
+            self._profiles.remove(profile)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._profiles:
+                    self._thread = None
+                    return
+            stacks = self._sample(own_id)
+            with self._lock:
+                for profile in self._profiles:
+                    profile.stacks.update(stacks)
+
+    def _sample(self, own_id: int) -> List[Tuple[Frame, ...]]:
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, frame.f_lineno))
+                frame = frame.f_back
+            stack.append((f"thread {thread_names.get(thread_id, thread_id)}", "", 0))
+            stacks.append(tuple(reversed(stack)))
+        return stacks
+
+
+class ProfileStore:
+    """Ring buffer of the most recent request profiles"""
+
+    def __init__(self, size: int = PROFILING_BUFFER_SIZE):
+        self._profiles: Deque[Profile] = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [profile.summary() for profile in reversed(self._profiles)]
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+
+profile_store = ProfileStore()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying the admin header, plus a random sample of the rest
+
+    Only installed when profiling is enabled, so requests pay nothing when it is off. Without
+    an admin token nothing is profiled, since the stored profiles could not be read.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store, admin_token: str = PROFILING_ADMIN_TOKEN, sample_rate: float = PROFILING_SAMPLE_RATE, interval: float = PROFILING_INTERVAL_SECONDS):
+        self.app = app
+        self.store = store
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.sampler = StackSampler(interval)
+
+    def _should_profile(self, scope) -> bool:
+        if not self.admin_token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == PROFILE_HEADER and hmac.compare_digest(value, self.admin_token.encode("latin-1")):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(
+            id=self.store.next_id(),
+            method=scope.get("method", ""),
+            path=scope.get("path", ""),
+            started_at=datetime.utcnow(),
+            interval=self.interval
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", str(profile.id).encode())]
+            await send(message)
+
+        started = time.perf_counter()
+        self.sampler.add(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.sampler.remove(profile)
+            profile.duration = time.perf_counter() - started
+            self.store.add(profile)
+            logger.info(f"Profiled {profile.method} {profile.path} as #{profile.id} ({profile.duration * 1000:.0f} ms)")
@@ -0,0 +1,346 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Any, Callable, Dict, List, Optional
+
+from database import Base
+from sqlalchemy import JSON, Column, DateTime, Float, Index, String, func, or_
+from sqlalchemy.exc import IntegrityError
+
+logger = getLogger(__name__)
+
+# Claims not renewed within this time go back to the pool
+QUEUE_CLAIM_TTL = timedelta(minutes=int(os.getenv("QUEUE_CLAIM_TTL_MINUTES", "30")))
+
+# Delay before a folder's queue is mirrored to queue.txt, so bursts of changes cost one upload
+QUEUE_MIRROR_DELAY_SECONDS = float(os.getenv("QUEUE_MIRROR_DELAY_SECONDS", "2"))
+
+# Items are spaced out so a move only rewrites the moved item's position
+POSITION_STEP = 1024.0
+MIN_POSITION_GAP = 1e-6
+
+class QueueFolder(Base):
+    """Marks a folder whose queue.txt has been imported into the queue table"""
+    __tablename__ = "queue_folders"
+
+    folder_id = Column(String, primary_key=True)
+    imported_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class QueueItem(Base):
+    __tablename__ = "queue_items"
+    __table_args__ = (
+        Index("ix_queue_items_folder_position", "folder_id", "position"),
+    )
+
+    folder_id = Column(String, primary_key=True)
+    document_id = Column(String, primary_key=True)
+    position = Column(Float, nullable=False)
+    data = Column(JSON, nullable=False, default=dict)  # Document details sent by the client
+    added_at = Column(DateTime, default=datetime.utcnow)
+    claimed_by = Column(String, nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+
+    def is_claimed(self) -> bool:
+        """Check if a reviewer holds an unexpired claim on this item"""
+        return bool(self.claimed_by) and self.claimed_at is not None and datetime.utcnow() - self.claimed_at < QUEUE_CLAIM_TTL
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Queue entry in the format used by the frontend and queue.txt"""
+        item = dict(self.data or {})
+        item['id'] = self.document_id
+        if 'addedAt' not in item and self.added_at:
+            item['addedAt'] = self.added_at.isoformat()
+        if self.is_claimed():
+            item['claimedBy'] = self.claimed_by
+            item['claimedAt'] = self.claimed_at.isoformat()
+        return item
+
+def _item_data(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in item.items() if key not in ('id', 'claimedBy', 'claimedAt')}
+
+class QueueNotImported(Exception):
+    """A folder's queue.txt has not been imported, so its queue does not live in the database yet"""
+
+def _touch_folder(db, folder_id: str):
+    folder = db.get(QueueFolder, folder_id)
+    if folder:
+        folder.updated_at = datetime.utcnow()
+
+def _lock_folder(db, folder_id: str) -> Optional[QueueFolder]:
+    """Lock a folder's row for the rest of the transaction, so position changes in it happen one at a time"""
+    folder = db.query(QueueFolder).filter(QueueFolder.folder_id == folder_id).with_for_update().first()
+    if folder:
+        folder.updated_at = datetime.utcnow()
+    return folder
+
+def is_queue_imported(db, folder_id: str) -> bool:
+    """Check if a folder's queue already lives in the database"""
+    return db.get(QueueFolder, folder_id) is not None
+
+def list_queue(db, folder_id: str, limit: Optional[int] = None) -> List[QueueItem]:
+    """Get a folder's queue in order"""
+    query = db.query(QueueItem).filter(QueueItem.folder_id == folder_id).order_by(QueueItem.position)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def _add_items(db, folder_id: str, items: List[Any]):
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            item = {'id': item}
+        document_id = item.get('id')
+        if not document_id or document_id in seen:
+            continue
+        seen.add(document_id)
+        db.add(QueueItem(
+            folder_id=folder_id,
+            document_id=document_id,
+            position=len(seen) * POSITION_STEP,
+            data=_item_data(item)
+        ))
+
+def import_queue(db, folder_id: str, items: List[Any]) -> bool:
+    """Import a folder's queue.txt, returning False if its queue was already imported
+
+    Only imports and replace_queue() mark a folder as imported - per-item changes never do,
+    so a queue.txt that was never read cannot be overwritten by a partial queue.
+    """
+    if is_queue_imported(db, folder_id):
+        return False
+    try:
+        db.add(QueueFolder(folder_id=folder_id))
+        db.flush()
+    except IntegrityError:
+        # A concurrent request imported it first
+        db.rollback()
+        return False
+
+    db.query(QueueItem).filter(QueueItem.folder_id == folder_id).delete()
+    _add_items(db, folder_id, items)
+    db.commit()
+    return True
+
+def replace_queue(db, folder_id: str, items: List[Any]):
+    """Replace a folder's whole queue with one sent by the client"""
+    db.query(QueueItem).filter(QueueItem.folder_id == folder_id).delete()
+    _add_items(db, folder_id, items)
+
+    folder = db.get(QueueFolder, folder_id)
+    if folder:
+        folder.updated_at = datetime.utcnow()
+    else:
+        db.add(QueueFolder(folder_id=folder_id))
+    db.commit()
+
+def push_item(db, folder_id: str, item: Dict[str, Any]) -> Optional[QueueItem]:
+    """Append a document to the end of the queue, or return None if it is already queued"""
+    if _lock_folder(db, folder_id) is None:
+        db.rollback()
+        raise QueueNotImported(folder_id)
+    if db.get(QueueItem, (folder_id, item['id'])):
+        db.rollback()
+        return None
+
+    last_position = db.query(func.max(QueueItem.position)).filter(QueueItem.folder_id == folder_id).scalar()
+    queue_item = QueueItem(
+        folder_id=folder_id,
+        document_id=item['id'],
+        position=(last_position or 0) + POSITION_STEP,
+        data=_item_data(item)
+    )
+    db.add(queue_item)
+    db.commit()
+    return queue_item
+
+def pop_item(db, folder_id: str) -> Optional[Dict[str, Any]]:
+    """Remove and return the first entry of the queue"""
+    queue_item = (
+        db.query(QueueItem)
+        .filter(QueueItem.folder_id == folder_id)
+        .order_by(QueueItem.position)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if not queue_item:
+        return None
+
+    item = queue_item.to_dict()
+    db.delete(queue_item)
+    _touch_folder(db, folder_id)
+    db.commit()
+    return item
+
+def remove_item(db, folder_id: str, document_id: str) -> bool:
+    """Remove a document from the queue"""
+    deleted = db.query(QueueItem).filter(
+        QueueItem.folder_id == folder_id,
+        QueueItem.document_id == document_id
+    ).delete()
+    _touch_folder(db, folder_id)
+    db.commit()
+    return deleted > 0
+
+def _neighbour_position(db, folder_id: str, document_id: str, position: float, after: bool) -> Optional[float]:
+    """Position of the item right after (or before) a position, ignoring the item being moved"""
+    query = db.query(QueueItem.position).filter(
+        QueueItem.folder_id == folder_id,
+        QueueItem.document_id != document_id
+    )
+    if after:
+        query = query.filter(QueueItem.position > position).order_by(QueueItem.position)
+    else:
+        query = query.filter(QueueItem.position < position).order_by(QueueItem.position.desc())
+    row = query.first()
+    return row[0] if row else None
+
+def _renumber(db, folder_id: str):
+    """Spread positions out again once repeated moves have used up the gap between two items"""
+    for index, queue_item in enumerate(list_queue(db, folder_id), start=1):
+        queue_item.position = index * POSITION_STEP
+    db.flush()
+
+def move_item(db, folder_id: str, document_id: str, before_id: Optional[str] = None, after_id: Optional[str] = None) -> Optional[QueueItem]:
+    """Move a document directly before or after another queued document"""
+    _lock_folder(db, folder_id)
+    queue_item = db.get(QueueItem, (folder_id, document_id))
+    anchor = db.get(QueueItem, (folder_id, after_id or before_id))
+    if not queue_item or not anchor or anchor is queue_item:
+        db.rollback()
+        return None
+
+    after = after_id is not None
+    for attempt in range(2):
+        neighbour = _neighbour_position(db, folder_id, document_id, anchor.position, after)
+        if neighbour is None:
+            new_position = anchor.position + (POSITION_STEP if after else -POSITION_STEP)
+            break
+        if abs(neighbour - anchor.position) > MIN_POSITION_GAP:
+            new_position = (neighbour + anchor.position) / 2
+            break
+        _renumber(db, folder_id)
+
+    queue_item.position = new_position
+    db.commit()
+    return queue_item
+
+def _release_claims(db, folder_id: str, reviewer: str) -> List[str]:
+    """Put the documents a reviewer holds back in the queue, returning their IDs"""
+    held = [
+        row[0] for row in db.query(QueueItem.document_id).filter(
+            QueueItem.folder_id == folder_id,
+            QueueItem.claimed_by == reviewer
+        )
+    ]
+    if held:
+        db.query(QueueItem).filter(
+            QueueItem.folder_id == folder_id,
+            QueueItem.document_id.in_(held)
+        ).update({QueueItem.claimed_by: None, QueueItem.claimed_at: None}, synchronize_session=False)
+    return held
+
+def claim_next(db, folder_id: str, reviewer: str) -> Optional[QueueItem]:
+    """Atomically claim the first queued document nobody else is reviewing
+
+    The reviewer's previous document goes back to the queue rather than being removed - only
+    complete_item() removes a reviewed document. The next claim skips the released document
+    while any other is free, so asking again moves on, and concurrent reviewers never get the
+    same one.
+    """
+    cutoff = datetime.utcnow() - QUEUE_CLAIM_TTL
+    released = _release_claims(db, folder_id, reviewer)
+
+    # Another reviewer may win a race for a row, so try the next free one a few times
+    for attempt in range(5):
+        free = or_(QueueItem.claimed_by.is_(None), QueueItem.claimed_at < cutoff)
+        candidate = None
+        if released:
+            candidate = (
+                db.query(QueueItem)
+                .filter(QueueItem.folder_id == folder_id, free, QueueItem.document_id.notin_(released))
+                .order_by(QueueItem.position)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+        if candidate is None:
+            candidate = (
+                db.query(QueueItem)
+                .filter(QueueItem.folder_id == folder_id, free)
+                .order_by(QueueItem.position)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+        if not candidate:
+            db.commit()
+            return None
+
+        claimed = db.query(QueueItem).filter(
+            QueueItem.folder_id == folder_id,
+            QueueItem.document_id == candidate.document_id,
+            free
+        ).update({QueueItem.claimed_by: reviewer, QueueItem.claimed_at: datetime.utcnow()}, synchronize_session=False)
+
+        if claimed:
+            db.commit()
+            db.refresh(candidate)
+            return candidate
+
+    db.commit()
+    return None
+
+def complete_item(db, folder_id: str, document_id: str, reviewer: str) -> bool:
+    """Remove a reviewed document from the queue - only while the reviewer holds its claim"""
+    completed = db.query(QueueItem).filter(
+        QueueItem.folder_id == folder_id,
+        QueueItem.document_id == document_id,
+        QueueItem.claimed_by == reviewer
+    ).delete(synchronize_session=False)
+    if completed:
+        _touch_folder(db, folder_id)
+    db.commit()
+    return completed > 0
+
+def release_item(db, folder_id: str, document_id: str, reviewer: str) -> bool:
+    """Hand a claimed document back to the queue without reviewing it"""
+    released = db.query(QueueItem).filter(
+        QueueItem.folder_id == folder_id,
+        QueueItem.document_id == document_id,
+        QueueItem.claimed_by == reviewer
+    ).update({QueueItem.claimed_by: None, QueueItem.claimed_at: None}, synchronize_session=False)
+    db.commit()
+    return released > 0
+
+class QueueMirror:
+    """Debounced background snapshots of each folder's queue
+
+    Each folder has at most one writer task, so snapshots are written one at a time and in order.
+    Changes made while a snapshot waits or is being written are marked pending and picked up by
+    the same writer, instead of starting another write alongside it.
+    """
+
+    def __init__(self, delay: float = QUEUE_MIRROR_DELAY_SECONDS):
+        self.delay = delay
+        self._writers: Dict[str, asyncio.Task] = {}
+        self._pending: Dict[str, Callable[[], None]] = {}
+
+    def schedule(self, folder_id: str, write_snapshot: Callable[[], None]):
+        """Write a snapshot after the delay - changes made before it is written share the write"""
+        self._pending[folder_id] = write_snapshot
+        if folder_id not in self._writers:
+            self._writers[folder_id] = asyncio.ensure_future(self._write_pending(folder_id))
+
+    async def _write_pending(self, folder_id: str):
+        try:
+            while folder_id in self._pending:
+                await asyncio.sleep(self.delay)
+                write_snapshot = self._pending.pop(folder_id)
+                try:
+                    await asyncio.to_thread(write_snapshot)
+                except Exception:
+                    logger.exception(f"Failed to mirror queue for folder {folder_id}")
+        finally:
+            del self._writers[folder_id]
+
+queue_mirror = QueueMirror()
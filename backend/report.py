@@ -0,0 +1,182 @@
+import csv
+import io
+import json
+import re
+import zipfile
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+from xml.sax.saxutils import escape
+
+from scores import GRADING_BOT, Comments, Votes, average_rating
+from streaming import StreamBuffer
+
+# Drive listing page size - the report streams page by page instead of loading the whole folder
+REPORT_PAGE_SIZE = 1000
+
+REPORT_COLUMNS = [
+    'document_id', 'document_name', 'web_view_link', 'vote_count', 'average_rating',
+    'min_rating', 'max_rating', 'ai_rating', 'ai_comment', 'comments'
+]
+
+# Excel rejects longer cells and XML 1.0 control characters
+XLSX_MAX_CELL_LENGTH = 32767
+XLSX_INVALID_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def iter_folder_documents(service, folder_id: str, page_size: int = REPORT_PAGE_SIZE, fields: str = "id,name,webViewLink") -> Iterator[Dict[str, Any]]:
+    """List a folder's PDFs one page at a time"""
+    query = f"'{folder_id}' in parents and mimeType='application/pdf' and name != 'scores.csv'"
+    page_token = None
+    while True:
+        results = service.files().list(
+            q=query,
+            fields=f"nextPageToken,files({fields})",
+            orderBy="name",
+            pageSize=page_size,
+            pageToken=page_token
+        ).execute()
+        yield from results.get('files', [])
+
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def report_row(document: Dict[str, Any], votes: Votes, comments: Comments) -> Dict[str, Any]:
+    """Join a document with its reviewer votes, comments and AI grade"""
+    doc_votes = dict(votes.get(document['id'], {}))
+    doc_comments = dict(comments.get(document['id'], {}))
+    ai_rating = doc_votes.pop(GRADING_BOT, None)
+    ai_comment = doc_comments.pop(GRADING_BOT, None)
+
+    ratings = [rating for rating in doc_votes.values() if rating > 0]
+    rating = average_rating(doc_votes)
+
+    return {
+        'document_id': document['id'],
+        'document_name': document['name'],
+        'web_view_link': document.get('webViewLink'),
+        'vote_count': len(ratings),
+        'average_rating': round(rating, 2) if rating is not None else None,
+        'min_rating': min(ratings) if ratings else None,
+        'max_rating': max(ratings) if ratings else None,
+        'ai_rating': ai_rating or None,
+        'ai_comment': ai_comment,
+        'votes': doc_votes,
+        'comments': doc_comments,
+    }
+
+
+def _flat_row(row: Dict[str, Any]) -> List[Any]:
+    """Row values for tabular formats, with comments as one "voter: comment" line each"""
+    values = dict(row)
+    values['comments'] = "\n".join(f"{voter}: {comment}" for voter, comment in row['comments'].items())
+    return [values[column] for column in REPORT_COLUMNS]
+
+
+def iter_csv(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Stream report rows as CSV"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(REPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in _flat_row(row)])
+        # Send rows in chunks of a few KB rather than one tiny write each
+        if output.tell() >= 64 * 1024:
+            yield output.getvalue().encode('utf-8')
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue().encode('utf-8')
+
+
+def iter_jsonl(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Stream report rows as JSON lines, keeping votes and comments per voter"""
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _xlsx_cell(value: Any) -> str:
+    if value is None or value == "":
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = XLSX_INVALID_CHARS.sub('', str(value))[:XLSX_MAX_CELL_LENGTH]
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def _xlsx_row(values: List[Any]) -> str:
+    return '<row>' + ''.join(_xlsx_cell(value) for value in values) + '</row>'
+
+
+def iter_xlsx(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    """Stream report rows as a single-sheet XLSX workbook
+
+    The sheet is written with inline strings so no shared string table has to be
+    collected first, and the archive is drained as it is compressed.
+    """
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', XLSX_CONTENT_TYPES)
+        archive.writestr('_rels/.rels', XLSX_ROOT_RELS)
+        archive.writestr('xl/workbook.xml', XLSX_WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', XLSX_WORKBOOK_RELS)
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_xlsx_row(REPORT_COLUMNS).encode('utf-8'))
+            for row in rows:
+                sheet.write(_xlsx_row(_flat_row(row)).encode('utf-8'))
+                data = buffer.drain()
+                if data:
+                    yield data
+            sheet.write(b'</sheetData></worksheet>')
+    yield buffer.drain()
+
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# format -> (media type, row serializer)
+REPORT_FORMATS: Dict[str, Tuple[str, Callable[[Iterator[Dict[str, Any]]], Iterator[bytes]]]] = {
+    "csv": ("text/csv", iter_csv),
+    "jsonl": ("application/x-ndjson", iter_jsonl),
+    "xlsx": (XLSX_MEDIA_TYPE, iter_xlsx),
+}
+
+
+def iter_report(service, folder_id: str, votes: Votes, comments: Comments, format: str) -> Iterator[bytes]:
+    """Stream a folder report, listing documents page by page as the response is sent"""
+    rows = (report_row(document, votes, comments) for document in iter_folder_documents(service, folder_id))
+    _, serialize = REPORT_FORMATS[format]
+    yield from serialize(rows)
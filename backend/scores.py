@@ -0,0 +1,147 @@
+import csv
+import io
+import threading
+from logging import getLogger
+from typing import Dict, Optional, Tuple
+
+from drive_client import create_file_once
+
+logger = getLogger(__name__)
+
+# doc_id -> voter -> rating, and doc_id -> voter -> comment
+Votes = Dict[str, Dict[str, int]]
+Comments = Dict[str, Dict[str, str]]
+
+# Voter name the AI grader records its rating and comment under
+GRADING_BOT = "Grading bot"
+
+# scores.csv is read, changed and uploaded whole, so writes to one folder's file take turns
+_folder_locks: Dict[str, threading.Lock] = {}
+_folder_locks_lock = threading.Lock()
+
+def scores_lock(folder_id: str) -> threading.Lock:
+    """Lock held while a folder's scores.csv is read and rewritten"""
+    with _folder_locks_lock:
+        return _folder_locks.setdefault(folder_id, threading.Lock())
+
+def parse_scores_csv(csv_content: str) -> Tuple[Votes, Comments]:
+    """Parse scores.csv content into votes and comments"""
+    votes: Votes = {}
+    comments: Comments = {}
+    
+    # Parse CSV with proper handling - quoted comments may span lines
+    csv_reader = csv.reader(io.StringIO(csv_content.strip()))
+    next(csv_reader, None)  # Skip header
+    
+    for row in csv_reader:
+        if len(row) >= 3:
+            doc_id, voter, rating = row[0], row[1], row[2]
+            comment = row[3] if len(row) > 3 else ""
+            
+            try:
+                rating = int(rating)
+            except ValueError:
+                continue
+            
+            if doc_id not in votes:
+                votes[doc_id] = {}
+            if doc_id not in comments:
+                comments[doc_id] = {}
+            
+            votes[doc_id][voter] = rating
+            if comment:
+                comments[doc_id][voter] = comment
+    
+    return votes, comments
+
+def find_scores_file(service, folder_id: str) -> Optional[Dict]:
+    """Find scores.csv in the Google Drive folder"""
+    query = f"'{folder_id}' in parents and name='scores.csv'"
+    files = service.files().list(q=query).execute().get('files', [])
+    return files[0] if files else None
+
+def read_scores_file(service, scores_file_id: str) -> Tuple[Votes, Comments]:
+    """Download and parse a scores.csv file"""
+    csv_content = service.files().get_media(fileId=scores_file_id).execute().decode('utf-8')
+    return parse_scores_csv(csv_content)
+
+def read_folder_scores(service, folder_id: str) -> Tuple[Votes, Comments]:
+    """Load votes and comments from scores.csv in the Google Drive folder"""
+    scores_file = find_scores_file(service, folder_id)
+    if not scores_file:
+        return {}, {}
+    return read_scores_file(service, scores_file['id'])
+
+def average_rating(doc_votes: Dict[str, int]) -> Optional[float]:
+    """Average of a document's ratings - a 0 rating only means the voter left a comment"""
+    ratings = [rating for rating in doc_votes.values() if rating > 0]
+    if not ratings:
+        return None
+    return sum(ratings) / len(ratings)
+
+def format_scores_csv(votes: Votes, comments: Comments) -> str:
+    """scores.csv content - one row per document and voter who either voted or commented"""
+    csv_buffer = io.StringIO()
+    csv_writer = csv.writer(csv_buffer)
+    csv_writer.writerow(['document_id', 'voter_name', 'rating', 'comment'])
+    
+    for doc_id in set(votes.keys()) | set(comments.keys()):
+        doc_votes = votes.get(doc_id, {})
+        doc_comments = comments.get(doc_id, {})
+        for voter in set(doc_votes.keys()) | set(doc_comments.keys()):
+            # A voter who only commented gets a 0 rating
+            csv_writer.writerow([doc_id, voter, doc_votes.get(voter, 0), doc_comments.get(voter, "")])
+    
+    return csv_buffer.getvalue()
+
+def write_scores_file(service, folder_id: str, csv_content: str, scores_file_id: Optional[str] = None):
+    """Upload scores.csv, replacing the given file or creating it in the folder"""
+    from googleapiclient.http import MediaIoBaseUpload
+    
+    media = MediaIoBaseUpload(io.BytesIO(csv_content.encode('utf-8')), mimetype='text/csv')
+    if scores_file_id:
+        return service.files().update(fileId=scores_file_id, media_body=media).execute()
+    # Check a failed attempt did not create the file before trying again
+    return create_file_once(service, folder_id, 'scores.csv', media)
+
+def save_folder_scores(service, folder_id: str, votes: Votes, comments: Comments, scores_file_id: Optional[str] = None):
+    """Write the voting app's scores to scores.csv, keeping Grading bot scores it has not loaded
+
+    The app sends back the scores it loaded, so Grading bot rows written since then are carried over.
+    """
+    with scores_lock(folder_id):
+        if not scores_file_id:
+            # The Grading bot may have created the file since the caller looked
+            scores_file = find_scores_file(service, folder_id)
+            scores_file_id = scores_file['id'] if scores_file else None
+        if scores_file_id:
+            current_votes, current_comments = read_scores_file(service, scores_file_id)
+            for doc_id, doc_votes in current_votes.items():
+                if GRADING_BOT not in doc_votes or GRADING_BOT in votes.get(doc_id, {}) or GRADING_BOT in comments.get(doc_id, {}):
+                    continue
+                votes.setdefault(doc_id, {})[GRADING_BOT] = doc_votes[GRADING_BOT]
+                if GRADING_BOT in current_comments.get(doc_id, {}):
+                    comments.setdefault(doc_id, {})[GRADING_BOT] = current_comments[doc_id][GRADING_BOT]
+        return write_scores_file(service, folder_id, format_scores_csv(votes, comments), scores_file_id)
+
+def record_grading_bot_scores(service, folder_id: str, grades: Dict[str, Tuple[int, str]]) -> bool:
+    """Write AI grades into scores.csv as the Grading bot's votes, returning whether anything changed
+
+    Grades recomputed in the background only reach the voting app and reports this way.
+    """
+    with scores_lock(folder_id):
+        scores_file = find_scores_file(service, folder_id)
+        votes, comments = read_scores_file(service, scores_file['id']) if scores_file else ({}, {})
+        
+        changed = False
+        for doc_id, (rating, comment) in grades.items():
+            if votes.get(doc_id, {}).get(GRADING_BOT) == rating and comments.get(doc_id, {}).get(GRADING_BOT) == comment:
+                continue
+            votes.setdefault(doc_id, {})[GRADING_BOT] = rating
+            comments.setdefault(doc_id, {})[GRADING_BOT] = comment
+            changed = True
+        
+        if changed:
+            write_scores_file(service, folder_id, format_scores_csv(votes, comments), scores_file['id'] if scores_file else None)
+            logger.info(f"Recorded {len(grades)} Grading bot scores in scores.csv of folder {folder_id}")
+    return changed
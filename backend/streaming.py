@@ -0,0 +1,30 @@
+from typing import List
+
+
+class StreamBuffer:
+    """Write-only, non-seekable sink that lets zipfile output be drained chunk by chunk
+
+    zipfile sees that it cannot seek and writes each entry's sizes in a data descriptor
+    after the entry, so an archive can be sent while it is being built.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        """Take everything written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+import admission
+from admission import BULK, INTERACTIVE, AdmissionController, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def controller(**limits):
+    settings = dict(max_concurrent=1, max_per_user=5, rpm=1000, tpm=1_000_000, max_queue=10, max_wait=5)
+    settings.update(limits)
+    return AdmissionController(**settings)
+
+
+def test_token_bucket_refills_continuously(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    bucket = TokenBucket(60)
+
+    assert bucket.wait_time(10) == 0
+    bucket.adjust(-60)
+    assert bucket.wait_time(10) == pytest.approx(10)
+
+    clock.now += 4
+    assert bucket.wait_time(10) == pytest.approx(6)
+    # Requests bigger than the bucket only wait for a full one
+    assert bucket.wait_time(1000) == pytest.approx(56)
+
+    bucket.adjust(1000)
+    assert bucket.level == 60
+
+
+def test_token_bucket_can_go_into_debt(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    bucket = TokenBucket(60)
+
+    bucket.adjust(-90)
+    assert bucket.wait_time(1) == pytest.approx(31)
+
+
+def test_waiters_are_admitted_by_priority():
+    async def scenario():
+        limits = controller()
+        order = []
+
+        async def request(user_key, priority):
+            async with limits.admit(user_key, 10, priority):
+                order.append(user_key)
+
+        async with limits.admit("holder", 10):
+            bulk = asyncio.create_task(request("bulk", BULK))
+            await asyncio.sleep(0)
+            interactive = asyncio.create_task(request("interactive", INTERACTIVE))
+            await asyncio.sleep(0)
+            assert limits.metrics()["queue_depth_by_priority"] == {"interactive": 1, "bulk": 1}
+        await asyncio.gather(bulk, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "bulk"]
+
+
+def test_busy_user_does_not_hold_up_others():
+    async def scenario():
+        limits = controller(max_concurrent=3, max_per_user=1)
+        async with limits.admit("ann", 10):
+            second = asyncio.create_task(limits.admit("ann", 10).__aenter__())
+            await asyncio.sleep(0)
+            assert not second.done()
+
+            async with limits.admit("bob", 10):
+                assert limits.metrics()["active_users"] == 2
+                assert limits.metrics()["busiest_user_active"] == 1
+            second.cancel()
+            await asyncio.gather(second, return_exceptions=True)
+        return limits.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert metrics["active"] == 0
+    assert metrics["active_users"] == 0
+    assert metrics["queue_depth"] == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        limits = controller(max_queue=1)
+        async with limits.admit("ann", 10):
+            waiting = asyncio.create_task(limits.admit("bob", 10).__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as error:
+                async with limits.admit("cy", 10):
+                    pass
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+        return limits, error.value
+
+    limits, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert limits.rejected_total == 1
+    assert limits.metrics()["queue_depth"] == 0
+
+
+def test_long_waits_time_out():
+    async def scenario():
+        limits = controller(max_wait=0.01)
+        async with limits.admit("ann", 10):
+            with pytest.raises(HTTPException) as error:
+                async with limits.admit("bob", 10):
+                    pass
+        return limits, error.value
+
+    limits, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert limits.timed_out_total == 1
+    assert limits.metrics()["queue_depth"] == 0
+
+
+def test_token_estimate_is_settled_against_usage():
+    async def scenario():
+        limits = controller(tpm=1000)
+        async with limits.admit("ann", 100) as ticket:
+            assert limits.metrics()["tokens_available"] == pytest.approx(900, abs=2)
+            ticket.record_usage(40)
+            return limits.metrics()["tokens_available"]
+
+    assert asyncio.run(scenario()) == pytest.approx(960, abs=2)
+
+
+def test_metrics_do_not_name_users():
+    async def scenario():
+        limits = controller(max_concurrent=3)
+        async with limits.admit("ann@example.com", 10), limits.admit("ann@example.com", 10):
+            return limits.metrics()
+
+    metrics = asyncio.run(scenario())
+    assert "ann@example.com" not in repr(metrics)
+    assert metrics["active_users"] == 1
+    assert metrics["busiest_user_active"] == 2
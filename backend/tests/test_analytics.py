@@ -0,0 +1,91 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import numpy as np
+
+from analytics import build_vote_matrix, compute_analytics, icc_oneway, krippendorff_alpha_interval
+
+# Two reviewers on three CVs, plus votes that must not count - the Grading bot and a comment-only 0
+VOTES = {
+    "d1": {"Ann": 1, "Bob": 2, "Grading bot": 5},
+    "d2": {"Ann": 3, "Bob": 4},
+    "d3": {"Ann": 5, "Bob": 5, "Cy": 0},
+}
+
+
+def brute_force_alpha(units):
+    """Krippendorff's interval alpha straight from its definition, over all ordered pairs"""
+    pairable = [values for values in units if len(values) >= 2]
+    values = [value for unit in pairable for value in unit]
+    n = len(values)
+    observed = sum(
+        sum((a - b) ** 2 for i, a in enumerate(unit) for j, b in enumerate(unit) if i != j) / (len(unit) - 1)
+        for unit in pairable
+    ) / n
+    expected = sum((a - b) ** 2 for i, a in enumerate(values) for j, b in enumerate(values) if i != j) / (n * (n - 1))
+    return 1 - observed / expected
+
+
+def test_vote_matrix_skips_grading_bot_and_comment_only_votes():
+    matrix = build_vote_matrix(VOTES)
+
+    assert matrix.document_ids == ["d1", "d2", "d3"]
+    assert matrix.voters == ["Ann", "Bob", "Cy"]
+    assert matrix.mask.sum() == 6
+    assert not matrix.mask[:, 2].any()
+
+
+def test_agreement_matches_hand_computed_values():
+    matrix = build_vote_matrix(VOTES)
+
+    assert krippendorff_alpha_interval(matrix.ratings, matrix.mask) == pytest.approx(0.875)
+    # MS between 37/6, MS within 1/3, two raters per CV
+    assert icc_oneway(matrix.ratings, matrix.mask) == pytest.approx((37 / 6 - 1 / 3) / (37 / 6 + 1 / 3))
+
+
+def test_alpha_matches_definition_with_unbalanced_raters():
+    units = [[1, 2, 2], [4, 5], [3], [5, 5, 4, 5], [2, 1]]
+    ratings = np.zeros((len(units), 4))
+    mask = np.zeros(ratings.shape, dtype=bool)
+    for row, values in enumerate(units):
+        ratings[row, :len(values)] = values
+        mask[row, :len(values)] = True
+
+    assert krippendorff_alpha_interval(ratings, mask) == pytest.approx(brute_force_alpha(units))
+
+
+def test_perfect_agreement():
+    matrix = build_vote_matrix({"d1": {"Ann": 5, "Bob": 5}, "d2": {"Ann": 1, "Bob": 1}})
+
+    assert krippendorff_alpha_interval(matrix.ratings, matrix.mask) == pytest.approx(1.0)
+    assert icc_oneway(matrix.ratings, matrix.mask) == pytest.approx(1.0)
+
+
+def test_no_agreement_without_enough_votes():
+    matrix = build_vote_matrix({"d1": {"Ann": 4}, "d2": {"Bob": 2}})
+    assert krippendorff_alpha_interval(matrix.ratings, matrix.mask) is None
+
+    matrix = build_vote_matrix({"d1": {"Ann": 4, "Bob": 4}, "d2": {"Ann": 4, "Bob": 4}})
+    assert krippendorff_alpha_interval(matrix.ratings, matrix.mask) is None
+
+
+def test_compute_analytics():
+    analytics = compute_analytics(VOTES)
+
+    d1 = analytics["documents"]["d1"]
+    assert d1["vote_count"] == 2
+    assert d1["average_rating"] == 1.5
+    assert d1["ci_low"] < 1.5 < d1["ci_high"]
+    assert analytics["overall"] == {"vote_count": 6, "average_rating": 3.333, "std": pytest.approx(1.491, abs=1e-3)}
+    assert analytics["reviewers"]["Ann"]["bias"] == pytest.approx(-0.333, abs=1e-3)
+    assert analytics["reviewers"]["Cy"]["vote_count"] == 0
+    assert analytics["reviewers"]["Cy"]["average_rating"] is None
+    assert analytics["agreement"]["krippendorff_alpha"] == pytest.approx(0.875)
+
+
+def test_single_vote_has_no_confidence_interval():
+    d1 = compute_analytics({"d1": {"Ann": 4}})["documents"]["d1"]
+
+    assert d1["average_rating"] == 4.0
+    assert d1["ci_low"] is None and d1["ci_high"] is None
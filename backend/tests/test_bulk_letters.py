@@ -0,0 +1,61 @@
+import asyncio
+import csv
+import io
+import zipfile
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from bulk_letters import CSV_COLUMNS, stream_csv, stream_zip
+
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+async def letter_results(results):
+    for result in results:
+        await asyncio.sleep(0)
+        yield result
+
+
+def letter(document_id, candidate_name, letter_type="acceptance", error=""):
+    return {
+        "document_id": document_id,
+        "document_name": f"{candidate_name}.pdf",
+        "candidate_name": candidate_name,
+        "average_rating": 4.0,
+        "letter_type": letter_type,
+        "subject": f"Your application, {candidate_name}",
+        "letter": "" if error else f"Dear {candidate_name}",
+        "error": error,
+    }
+
+
+def test_letters_zip_streams_each_letter_and_lists_failures():
+    results = [
+        letter("d1", "Jane Doe"),
+        letter("d2", "Jöhn/../Roe", "rejection"),
+        letter("d3", "Failed Person", error="Too many AI requests"),
+    ]
+    data = asyncio.run(collect(stream_zip(letter_results(results))))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        assert names == ["acceptance/Jane_Doe_d1.txt", "rejection/JöhnRoe_d2.txt", "errors.csv"]
+        assert archive.read(names[0]).decode("utf-8") == "Subject: Your application, Jane Doe\n\nDear Jane Doe\n"
+        errors = list(csv.DictReader(io.StringIO(archive.read("errors.csv").decode("utf-8"))))
+    assert errors == [{"document_id": "d3", "document_name": "Failed Person.pdf", "letter_type": "acceptance", "error": "Too many AI requests"}]
+
+
+def test_letters_csv_streams_one_chunk_per_letter():
+    async def chunks():
+        return [chunk async for chunk in stream_csv(letter_results([letter("d1", "Jane Doe"), letter("d2", "John Roe")]))]
+
+    parts = asyncio.run(chunks())
+    assert len(parts) == 2
+    rows = list(csv.DictReader(io.StringIO(b"".join(parts).decode("utf-8"))))
+    assert list(rows[0]) == CSV_COLUMNS
+    assert [row["letter"] for row in rows] == ["Dear Jane Doe", "Dear John Roe"]
@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("sqlalchemy")
+
+from dedup import LSH_BANDS, MINHASH_PERMUTATIONS, estimated_similarity, lsh_buckets, minhash_signature, text_shingles
+from pdf_cache import UNREADABLE_PDF_TEXT
+
+CV_TEXT = " ".join(f"skill{i % 97} project{i} year{i % 13}" for i in range(150))
+
+
+def test_text_shingles_normalize_words():
+    assert text_shingles("Python, SQL and   python!", size=2) == {"python sql", "sql and", "and python"}
+    assert text_shingles("Short CV", size=5) == {"short cv"}
+    assert text_shingles("", size=5) == set()
+
+
+def test_no_signature_without_text():
+    assert minhash_signature("") is None
+    assert minhash_signature(UNREADABLE_PDF_TEXT) is None
+    assert minhash_signature("  ...  ") is None
+
+
+def test_identical_text_has_identical_signature_and_buckets():
+    signature = minhash_signature(CV_TEXT)
+    assert signature.shape == (MINHASH_PERMUTATIONS,)
+    assert (signature == minhash_signature(CV_TEXT.upper())).all()
+    assert estimated_similarity(signature, minhash_signature(CV_TEXT)) == 1.0
+
+    buckets = lsh_buckets(signature)
+    assert len(buckets) == LSH_BANDS
+    assert [band for band, _ in buckets] == list(range(LSH_BANDS))
+    assert buckets == lsh_buckets(minhash_signature(CV_TEXT))
+
+
+def test_near_duplicates_share_a_bucket():
+    edited = CV_TEXT.replace("project42", "project-forty-two")
+    signature, other = minhash_signature(CV_TEXT), minhash_signature(edited)
+
+    assert 0.85 < estimated_similarity(signature, other) < 1.0
+    assert set(lsh_buckets(signature)) & set(lsh_buckets(other))
+
+
+def test_unrelated_texts_are_not_similar():
+    other_text = " ".join(f"language{i} course{i % 11}" for i in range(200))
+    signature, other = minhash_signature(CV_TEXT), minhash_signature(other_text)
+
+    assert estimated_similarity(signature, other) < 0.2
+    assert not set(lsh_buckets(signature)) & set(lsh_buckets(other))
@@ -0,0 +1,287 @@
+import asyncio
+import threading
+
+import pytest
+
+import drive_batch
+from drive_batch import DriveBatcher, FolderAccess, execute_batch, get_drive_batcher
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient's HttpError, which the Drive helpers only inspect by attribute"""
+
+    def __init__(self, status, content=b""):
+        super().__init__(f"HTTP {status}")
+        self.resp = type("Response", (), {"status": status})()
+        self.content = content
+
+
+class FakeRequest:
+    def __init__(self, service, result=None, error=None):
+        self.service = service
+        self.result = result
+        self.error = error
+
+    def execute(self):
+        self.service.executed.append(self)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class BlockingRequest(FakeRequest):
+    """Request whose batch stays in flight until released"""
+
+    def __init__(self, service, result=None):
+        super().__init__(service, result)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def execute(self):
+        self.started.set()
+        self.release.wait(5)
+        return super().execute()
+
+
+class FlakyRequest(FakeRequest):
+    """Request that fails with the given errors before it succeeds"""
+
+    def __init__(self, service, result, errors):
+        super().__init__(service, result)
+        self.errors = list(errors)
+
+    def execute(self):
+        self.service.executed.append(self)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append([request for _, request in self.requests])
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.execute(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class FakeDriveService:
+    """Just enough of the Drive API for files().get() and batch requests"""
+
+    def __init__(self, folders=None):
+        # folder ID -> metadata, or the error Drive answers with
+        self.folders = folders or {}
+        self.batches = []
+        self.executed = []
+
+    def files(self):
+        return self
+
+    def get(self, fileId, fields=None):
+        answer = self.folders.get(fileId, FakeHttpError(404))
+        if isinstance(answer, Exception):
+            return FakeRequest(self, error=answer)
+        return FakeRequest(self, result=answer)
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_folder_access_is_checked_once_per_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr("drive_batch.time.monotonic", clock)
+    service = FakeDriveService({"folder": {"id": "folder"}})
+    access = FolderAccess(ttl=60)
+
+    async def check():
+        return await access.check("ann", lambda: service, "folder")
+
+    assert asyncio.run(check())
+    assert asyncio.run(check())
+    assert len(service.executed) == 1
+
+    clock.now += 61
+    assert asyncio.run(check())
+    assert len(service.executed) == 2
+
+
+def test_folders_drive_hides_are_refused():
+    service = FakeDriveService({"secret": FakeHttpError(403, b"insufficientFilePermissions")})
+    access = FolderAccess()
+
+    async def check(folder_id):
+        return await access.check("bob", lambda: service, folder_id)
+
+    assert not asyncio.run(check("missing"))
+    assert not asyncio.run(check("secret"))
+    assert not access.allowed("bob", "secret")
+    # Refusals are not cached - access granted in Drive later shows up right away
+    service.folders["secret"] = {"id": "secret"}
+    assert asyncio.run(check("secret"))
+
+
+def test_folder_access_is_per_user():
+    service = FakeDriveService({"folder": {"id": "folder"}})
+    access = FolderAccess()
+
+    assert asyncio.run(access.check("ann", lambda: service, "folder"))
+    assert access.allowed("ann", "folder")
+    assert not access.allowed("bob", "folder")
+
+
+def test_drive_failures_are_raised_not_cached_as_refusals():
+    service = FakeDriveService({"folder": FakeHttpError(403, b"userRateLimitExceeded")})
+    access = FolderAccess()
+
+    with pytest.raises(FakeHttpError):
+        asyncio.run(access.check("cy", lambda: service, "folder"))
+    assert not access.allowed("cy", "folder")
+
+
+def test_folder_access_keeps_a_bounded_number_of_answers():
+    access = FolderAccess(max_entries=2)
+    for folder_id in ("a", "b", "c"):
+        access.grant("ann", folder_id)
+
+    assert not access.allowed("ann", "a")
+    assert access.allowed("ann", "b") and access.allowed("ann", "c")
+
+
+def batched_results(service):
+    return [[request.result["id"] for request in batch] for batch in service.batches]
+
+
+def error_statuses(errors):
+    return {key: error.resp.status for key, error in errors.items()}
+
+
+def test_execute_batch_splits_large_batches():
+    service = FakeDriveService()
+    requests = {str(index): FakeRequest(service, {"id": index}) for index in range(150)}
+
+    results, errors = execute_batch(service, requests)
+
+    assert [len(batch) for batch in service.batches] == [100, 50]
+    assert results == {str(index): {"id": index} for index in range(150)} and not errors
+
+
+def test_execute_batch_resends_transient_failures_on_their_own():
+    service = FakeDriveService()
+    requests = {
+        "flaky": FlakyRequest(service, {"id": "flaky"}, [FakeHttpError(503)]),
+        "missing": FakeRequest(service, error=FakeHttpError(404)),
+    }
+
+    results, errors = execute_batch(service, requests)
+
+    assert results == {"flaky": {"id": "flaky"}}
+    assert error_statuses(errors) == {"missing": 404}
+    assert service.executed.count(requests["flaky"]) == 2
+    assert service.executed.count(requests["missing"]) == 1
+
+
+def test_lone_request_is_sent_without_waiting_for_the_window():
+    service = FakeDriveService()
+    batcher = DriveBatcher(window=60)
+
+    async def submit():
+        return await asyncio.wait_for(batcher.submit(service, FakeRequest(service, {"id": "a"})), 1)
+
+    assert asyncio.run(submit()) == {"id": "a"}
+    assert batched_results(service) == [["a"]]
+    assert batcher.idle
+
+
+def test_requests_issued_together_share_a_batch():
+    service = FakeDriveService()
+    batcher = DriveBatcher(window=60)
+
+    async def submit_all():
+        return await asyncio.wait_for(asyncio.gather(*(
+            batcher.submit(service, FakeRequest(service, {"id": key})) for key in "abc"
+        )), 1)
+
+    assert asyncio.run(submit_all()) == [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    assert batched_results(service) == [["a", "b", "c"]]
+
+
+def test_requests_arriving_during_a_flush_wait_for_the_window():
+    service = FakeDriveService()
+    batcher = DriveBatcher(window=0.05)
+    first = BlockingRequest(service, {"id": "a"})
+
+    async def submit_during_flush():
+        in_flight = asyncio.ensure_future(batcher.submit(service, first))
+        await asyncio.to_thread(first.started.wait, 5)
+        later = asyncio.gather(*(batcher.submit(service, FakeRequest(service, {"id": key})) for key in "bc"))
+        await asyncio.sleep(0)
+        assert not batcher.idle
+        first.release.set()
+        return await asyncio.wait_for(asyncio.gather(in_flight, later), 5)
+
+    asyncio.run(submit_during_flush())
+    assert batched_results(service) == [["a"], ["b", "c"]]
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window(monkeypatch):
+    monkeypatch.setattr(drive_batch, "MAX_BATCH_SIZE", 2)
+    service = FakeDriveService()
+    batcher = DriveBatcher(window=60)
+    first = BlockingRequest(service, {"id": "a"})
+
+    async def fill_batch_during_flush():
+        in_flight = asyncio.ensure_future(batcher.submit(service, first))
+        await asyncio.to_thread(first.started.wait, 5)
+        full = await asyncio.wait_for(asyncio.gather(*(
+            batcher.submit(service, FakeRequest(service, {"id": key})) for key in "bc"
+        )), 1)
+        first.release.set()
+        await in_flight
+        return full
+
+    assert asyncio.run(fill_batch_during_flush()) == [{"id": "b"}, {"id": "c"}]
+    assert sorted(batched_results(service)) == [["a"], ["b", "c"]]
+
+
+def test_batched_failures_reach_only_their_caller():
+    service = FakeDriveService({"folder": {"id": "folder"}})
+    batcher = DriveBatcher()
+
+    async def submit_both():
+        return await asyncio.gather(
+            batcher.submit(service, service.get("folder")),
+            batcher.submit(service, service.get("missing")),
+            return_exceptions=True
+        )
+
+    found, missing = asyncio.run(submit_both())
+    assert found == {"id": "folder"}
+    assert isinstance(missing, FakeHttpError) and missing.resp.status == 404
+
+
+def test_idle_batchers_of_other_users_are_dropped(monkeypatch):
+    monkeypatch.setattr(drive_batch, "_batchers", {})
+    ann = get_drive_batcher("ann")
+    assert get_drive_batcher("ann") is ann
+
+    get_drive_batcher("bob")
+    assert set(drive_batch._batchers) == {"bob"}
+    assert get_drive_batcher("ann") is not ann
@@ -0,0 +1,209 @@
+import pytest
+
+import drive_client
+from drive_client import CircuitBreaker, DriveResilience, DriveUnavailableError, is_retryable_error, is_user_specific_error
+
+
+class FakeHttpError(Exception):
+    """Shaped like googleapiclient's HttpError, which the Drive helpers only inspect by attribute"""
+
+    def __init__(self, status, content=b""):
+        super().__init__(f"HTTP {status}")
+        self.resp = type("Response", (), {"status": status})()
+        self.content = content
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(drive_client.time, "monotonic", clock)
+    return clock
+
+
+def test_error_classification():
+    assert is_retryable_error(FakeHttpError(503))
+    assert is_retryable_error(FakeHttpError(403, b"rateLimitExceeded"))
+    assert is_retryable_error(TimeoutError())
+    assert not is_retryable_error(FakeHttpError(404))
+    assert not is_retryable_error(FakeHttpError(403, b"insufficientFilePermissions"))
+
+    assert is_user_specific_error(FakeHttpError(401))
+    assert is_user_specific_error(FakeHttpError(403, b"insufficientFilePermissions"))
+    assert is_user_specific_error(FakeHttpError(403, b"userRateLimitExceeded"))
+    assert not is_user_specific_error(FakeHttpError(403, b"rateLimitExceeded"))
+    assert not is_user_specific_error(FakeHttpError(503))
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+
+    clock.now += 30
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_neutral_probe_frees_the_probe_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+
+    # e.g. one user's expired token - says nothing about Drive
+    breaker.record_neutral()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+def test_stale_cache_is_scoped_and_bounded():
+    resilience = DriveResilience(stale_entries=2)
+    resilience.remember("ann", "/files/a", {"id": "a"})
+    resilience.remember("ann", "/files/b", {"id": "b"})
+    resilience.remember("bob", "/files/a", {"id": "bob's a"})
+
+    assert resilience.recall("ann", "/files/a") == (False, None)
+    assert resilience.recall("bob", "/files/a") == (True, {"id": "bob's a"})
+    found, result = resilience.recall("ann", "/files/b")
+    result["id"] = "changed"
+    assert resilience.recall("ann", "/files/b") == (True, {"id": "b"})
+
+
+class TestResilientHttpRequest:
+    """execute() with the network call replaced by a script of results and errors"""
+
+    @pytest.fixture(autouse=True)
+    def isolated(self, monkeypatch):
+        pytest.importorskip("googleapiclient")
+        self.resilience = DriveResilience()
+        monkeypatch.setattr(drive_client, "drive_resilience", self.resilience)
+        monkeypatch.setattr(drive_client, "backoff_delay", lambda attempt: 0)
+
+    def request(self, outcomes, method="GET", method_id="drive.files.get"):
+        request_class = drive_client.resilient_request_class()
+        request = request_class(None, lambda resp, content: content, f"https://drive/{method_id}", method=method, methodId=method_id)
+        request.sent = 0
+        outcomes = list(outcomes)
+
+        def execute_once(http, timeout, stats):
+            request.sent += 1
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        request._execute_once = execute_once
+        return request
+
+    def test_reads_are_retried(self):
+        request = self.request([FakeHttpError(503), FakeHttpError(500), {"id": "a"}])
+
+        assert request.execute() == {"id": "a"}
+        assert request.sent == 3
+        stats = self.resilience.stats("drive.files.get").snapshot()
+        assert stats["retries"] == 2 and stats["successes"] == 1
+
+    def test_client_errors_are_not_retried(self):
+        request = self.request([FakeHttpError(404)])
+
+        with pytest.raises(FakeHttpError):
+            request.execute()
+        assert request.sent == 1
+        assert self.resilience.breaker("drive.files.get").state == "closed"
+
+    def test_reads_fall_back_to_the_last_good_response(self):
+        self.request([{"id": "a", "name": "old"}]).execute()
+        failing = self.request([FakeHttpError(503)] * (drive_client.DRIVE_MAX_RETRIES + 1))
+
+        assert failing.execute() == {"id": "a", "name": "old"}
+        assert self.resilience.stats("drive.files.get").snapshot()["stale_served"] == 1
+
+    def test_open_circuit_rejects_without_sending(self):
+        breaker = self.resilience.breaker("drive.files.list")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        request = self.request([{"files": []}], method_id="drive.files.list")
+
+        with pytest.raises(DriveUnavailableError):
+            request.execute()
+        assert request.sent == 0
+
+    def test_creates_are_not_retried_blindly(self):
+        request = self.request([FakeHttpError(503), {"id": "second copy"}], method="POST", method_id="drive.files.create")
+
+        with pytest.raises(FakeHttpError):
+            request.execute()
+        assert request.sent == 1
+
+    def test_create_that_landed_is_not_sent_again(self):
+        request = self.request([FakeHttpError(503), {"id": "second copy"}], method="POST", method_id="drive.files.create")
+        request.find_existing = lambda: {"id": "first copy"}
+
+        assert request.execute() == {"id": "first copy"}
+        assert request.sent == 1
+
+    def test_create_that_did_not_land_is_retried(self):
+        request = self.request([FakeHttpError(503), {"id": "new"}], method="POST", method_id="drive.files.create")
+        request.find_existing = lambda: None
+
+        assert request.execute() == {"id": "new"}
+        assert request.sent == 2
+
+    def test_create_file_once_looks_in_the_folder(self):
+        test = self
+        lookups = []
+
+        class FakeDriveService:
+            def files(self):
+                return self
+
+            def create(self, body, media_body, fields):
+                assert body == {"name": "scores.csv", "parents": ["folder"]}
+                return test.request([TimeoutError(), {"id": "unused"}], method="POST", method_id="drive.files.create")
+
+            def list(self, q, fields):
+                lookups.append(q)
+                return type("Request", (), {"execute": lambda self: {"files": [{"id": "landed"}]}})()
+
+        assert drive_client.create_file_once(FakeDriveService(), "folder", "scores.csv", media_body=None) == {"id": "landed"}
+        assert lookups == ["'folder' in parents and name='scores.csv' and trashed=false"]
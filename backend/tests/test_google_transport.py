@@ -0,0 +1,173 @@
+import gc
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("httplib2")
+pytest.importorskip("google.auth")
+
+from google_transport import PooledHttp, refresh_lock, to_httplib2_response
+
+
+class FakeCredentials:
+    """Just enough of google.oauth2 credentials - apply() signs, refresh() swaps in the next token"""
+
+    def __init__(self, token="old", valid=True, refresh_token="refresh"):
+        self.token = token
+        self.valid = valid
+        self.refresh_token = refresh_token
+        self.refreshes = 0
+
+    def apply(self, headers):
+        headers["authorization"] = f"Bearer {self.token}"
+
+    def refresh(self, request):
+        self.refreshes += 1
+        self.token = f"new{self.refreshes}"
+        self.valid = True
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None, reason="OK"):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.reason = reason
+
+
+class FakeSession:
+    """Answers 401 to any token in `rejected`, and records what was sent"""
+
+    def __init__(self, rejected=("Bearer old",)):
+        self.rejected = set(rejected)
+        self.sent = []
+        self.rejecting = threading.Event()
+        self.closed = False
+
+    def request(self, method, uri, data=None, headers=None, timeout=None, allow_redirects=True):
+        self.sent.append((method, uri, headers.get("authorization"), timeout))
+        if headers.get("authorization") in self.rejected:
+            self.rejecting.set()
+            return FakeResponse(401, b"invalid token", reason="Unauthorized")
+        return FakeResponse(200, b'{"id": "file"}', {"Content-Type": "application/json"})
+
+    def close(self):
+        self.closed = True
+
+
+def authorizations(session):
+    return [authorization for _, _, authorization, _ in session.sent]
+
+
+def test_valid_token_is_sent_once():
+    session = FakeSession()
+    credentials = FakeCredentials(token="current")
+    http = PooledHttp(credentials, timeout=5, session=session)
+
+    response, content = http.request("https://www.googleapis.com/drive/v3/files/file")
+
+    assert (response.status, content) == (200, b'{"id": "file"}')
+    assert session.sent == [("GET", "https://www.googleapis.com/drive/v3/files/file", "Bearer current", 5)]
+    assert credentials.refreshes == 0
+
+
+def test_rejected_token_is_refreshed_and_the_request_retried_once():
+    session = FakeSession()
+    credentials = FakeCredentials()
+    stored = []
+    http = PooledHttp(credentials, session=session, on_refresh=lambda refreshed: stored.append(refreshed.token))
+
+    response, _ = http.request("https://www.googleapis.com/drive/v3/files/file")
+
+    assert response.status == 200
+    assert authorizations(session) == ["Bearer old", "Bearer new1"]
+    assert stored == ["new1"]
+    # google-auth closes the session it refreshed with once collected - the shared pool must survive that
+    gc.collect()
+    assert not session.closed
+
+
+def test_refreshed_token_that_is_still_rejected_is_not_retried_again():
+    session = FakeSession(rejected=("Bearer old", "Bearer new1"))
+    http = PooledHttp(FakeCredentials(), session=session)
+
+    response, _ = http.request("https://www.googleapis.com/drive/v3/files/file")
+
+    assert response.status == 401
+    assert authorizations(session) == ["Bearer old", "Bearer new1"]
+
+
+def test_rejected_token_without_refresh_token_is_returned():
+    session = FakeSession()
+    credentials = FakeCredentials(refresh_token=None)
+    http = PooledHttp(credentials, session=session)
+
+    response, _ = http.request("https://www.googleapis.com/drive/v3/files/file")
+
+    assert response.status == 401
+    assert len(session.sent) == 1 and credentials.refreshes == 0
+
+
+def test_expired_token_is_refreshed_before_sending():
+    session = FakeSession()
+    credentials = FakeCredentials(valid=False)
+    http = PooledHttp(credentials, session=session)
+
+    http.request("https://www.googleapis.com/drive/v3/files/file")
+
+    assert authorizations(session) == ["Bearer new1"]
+
+
+def test_failing_to_store_the_refreshed_token_does_not_fail_the_request():
+    def on_refresh(credentials):
+        raise RuntimeError("Database down")
+
+    session = FakeSession()
+    http = PooledHttp(FakeCredentials(), session=session, on_refresh=on_refresh)
+
+    response, _ = http.request("https://www.googleapis.com/drive/v3/files/file")
+    assert response.status == 200
+
+
+def test_token_refreshed_by_another_thread_is_not_refreshed_again():
+    session = FakeSession()
+    credentials = FakeCredentials()
+    http = PooledHttp(credentials, session=session)
+    results = []
+
+    lock = refresh_lock(credentials)
+    with lock:
+        thread = threading.Thread(target=lambda: results.append(http.request("https://www.googleapis.com/drive/v3/files/file")))
+        thread.start()
+        session.rejecting.wait(5)
+        time.sleep(0.05)
+        # Another request refreshed the token while this one waited for the lock
+        credentials.token = "fresh"
+    thread.join(5)
+
+    assert results[0][0].status == 200
+    assert authorizations(session) == ["Bearer old", "Bearer fresh"]
+    assert credentials.refreshes == 0
+
+
+def test_timeout_is_per_thread():
+    session = FakeSession()
+    http = PooledHttp(FakeCredentials(token="current"), timeout=20, session=session)
+    http.timeout = 3
+
+    other = threading.Thread(target=lambda: http.request("https://www.googleapis.com/a"))
+    other.start()
+    other.join(5)
+    http.request("https://www.googleapis.com/b")
+
+    assert [timeout for _, _, _, timeout in session.sent] == [20, 3]
+
+
+def test_decoded_bodies_are_reported_like_httplib2():
+    response = to_httplib2_response(FakeResponse(200, b"decoded body", {"Content-Encoding": "gzip", "Content-Length": "5"}))
+
+    assert response.status == 200
+    assert response["-content-encoding"] == "gzip"
+    assert "content-encoding" not in response
+    assert response["content-length"] == str(len(b"decoded body"))
@@ -0,0 +1,182 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from grade_store import (
+    CV_CHANGED,
+    NEW,
+    POSITION_CHANGED,
+    ReconcileItem,
+    ReconcileJob,
+    ReconcileJobs,
+    StoredGrade,
+    plan_reconciliation,
+    position_hash,
+    run_reconciliation,
+    save_grade,
+)
+
+POSITION = "Backend engineer"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[StoredGrade.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def document(document_id, md5_checksum):
+    return {"id": document_id, "name": f"{document_id}.pdf", "md5Checksum": md5_checksum}
+
+
+def plan(db, documents, position_description=POSITION):
+    return plan_reconciliation(db, "folder", documents, position_description, "en", "default", user_id="alice@example.com")
+
+
+def statuses(job):
+    return {item.document_id: (item.status, item.reason) for item in job.items}
+
+
+def test_plan_sorts_documents_by_what_changed(db):
+    save_grade(db, "current", "aaa", POSITION, "en", "default", 8, "Good fit", "gpt-4o")
+    save_grade(db, "edited", "old", POSITION, "en", "default", 5, "Outdated")
+    save_grade(db, "other_position", "ccc", "Frontend engineer", "en", "default", 6, "Other role")
+    save_grade(db, "original", "ddd", POSITION, "en", "default", 7, "Copied")
+
+    job = plan(db, [
+        document("current", "aaa"),
+        document("edited", "bbb"),
+        document("other_position", "ccc"),
+        document("copy", "ddd"),
+        document("new", "eee"),
+        {"id": "shortcut", "name": "shortcut"},
+    ])
+
+    assert statuses(job) == {
+        "current": ("reused", None),
+        "edited": ("pending", CV_CHANGED),
+        "other_position": ("pending", POSITION_CHANGED),
+        "copy": ("copied", None),
+        "new": ("pending", NEW),
+        "shortcut": ("skipped", "no_checksum"),
+    }
+    reused = job.items[0]
+    assert (reused.rating, reused.comment, reused.model) == (8, "Good fit", "gpt-4o")
+    assert job.user_id == "alice@example.com"
+
+
+def test_plan_stores_copied_grades_under_the_copy(db):
+    save_grade(db, "original", "ddd", POSITION, "en", "default", 7, "Copied", "gpt-4o", 0.9)
+    plan(db, [document("copy", "ddd")])
+
+    grade = db.get(StoredGrade, ("copy", "ddd", position_hash(POSITION), "en", "default"))
+    assert (grade.rating, grade.comment, grade.graded_model, grade.confidence) == (7, "Copied", "gpt-4o", 0.9)
+
+
+def test_plan_ignores_grades_of_other_languages_and_models(db):
+    save_grade(db, "doc", "aaa", POSITION, "pl", "default", 8, "Polish")
+    save_grade(db, "doc", "aaa", POSITION, "en", "strict", 8, "Other config")
+
+    assert statuses(plan(db, [document("doc", "aaa")])) == {"doc": ("pending", NEW)}
+
+
+def pending_job(documents):
+    items = [ReconcileItem(document_id, f"{document_id}.pdf", md5_checksum, status="pending", reason=NEW) for document_id, md5_checksum in documents]
+    return ReconcileJob("job", "folder", POSITION, "en", "default", items, user_id="alice@example.com")
+
+
+def test_identical_documents_are_graded_once():
+    job = pending_job([("a", "same"), ("b", "other"), ("c", "same")])
+    graded, stored, published = [], [], []
+
+    async def grade_document(item):
+        graded.append(item.md5_checksum)
+        return 7, f"Grade of {item.md5_checksum}", "gpt-4o", 0.8
+
+    def store(item, confidence):
+        stored.append((item.document_id, item.rating, confidence))
+
+    async def publish(finished_job):
+        published.append([item.status for item in finished_job.items])
+
+    asyncio.run(run_reconciliation(job, grade_document, store, concurrency=2, publish=publish))
+
+    assert sorted(graded) == ["other", "same"]
+    assert sorted(stored) == [("a", 7, 0.8), ("b", 7, 0.8), ("c", 7, 0.8)]
+    assert published == [["recomputed"] * 3]
+    assert {item.document_id: item.comment for item in job.items} == {"a": "Grade of same", "b": "Grade of other", "c": "Grade of same"}
+    assert job.status == "done"
+
+
+def test_failed_grade_fails_every_copy_and_the_job_still_finishes():
+    job = pending_job([("a", "same"), ("b", "other"), ("c", "same")])
+
+    async def grade_document(item):
+        if item.md5_checksum == "same":
+            raise RuntimeError("Model unavailable")
+        return 6, "Fine", "gpt-4o", None
+
+    asyncio.run(run_reconciliation(job, grade_document, lambda item, confidence: None))
+
+    assert {item.document_id: (item.status, item.error) for item in job.items} == {
+        "a": ("failed", "Model unavailable"),
+        "b": ("recomputed", None),
+        "c": ("failed", "Model unavailable"),
+    }
+    assert job.finished_at is not None
+
+
+def test_store_failure_only_fails_that_document():
+    job = pending_job([("a", "same"), ("b", "same")])
+
+    async def grade_document(item):
+        return 6, "Fine", "gpt-4o", None
+
+    def store(item, confidence):
+        if item.document_id == "a":
+            raise RuntimeError("Database down")
+
+    asyncio.run(run_reconciliation(job, grade_document, store))
+
+    assert [(item.status, item.error) for item in job.items] == [("failed", "Database down"), ("recomputed", None)]
+
+
+def test_publish_failure_does_not_keep_the_job_running():
+    job = pending_job([("a", "same")])
+
+    async def grade_document(item):
+        return 6, "Fine", "gpt-4o", None
+
+    async def publish(finished_job):
+        raise RuntimeError("Drive down")
+
+    asyncio.run(run_reconciliation(job, grade_document, lambda item, confidence: None, publish=publish))
+
+    assert job.items[0].status == "recomputed"
+    assert job.status == "done"
+
+
+def test_jobs_are_only_found_by_their_user():
+    jobs = ReconcileJobs()
+    job = pending_job([("a", "same")])
+
+    async def start():
+        jobs.start(job, asyncio.sleep(0))
+        assert jobs.get("job", "alice@example.com") is job
+        assert jobs.get("job", "mallory@example.com") is None
+        assert jobs.running("folder", POSITION, "en", "default", "alice@example.com") is job
+        assert jobs.running("folder", POSITION, "en", "default", "mallory@example.com") is None
+        assert jobs.running("folder", "Frontend engineer", "en", "default", "alice@example.com") is None
+        await job.task
+
+    asyncio.run(start())
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import grading
+from grading import GRADING_MAX_TOKENS_LIMIT, GRADING_MODEL, TRIAGE_MODEL, TieredGradingConfig, fake_completion, grade_tiered
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    monkeypatch.setattr(grading, "ALLOW_FAKE_MODELS", True)
+
+
+async def complete_locally(model, messages, max_tokens, temperature):
+    return fake_completion(model, messages, max_tokens)
+
+
+def grade(*models):
+    config = TieredGradingConfig(models=list(models), max_tokens=[150] * (len(models) - 1) + [1000])
+    return asyncio.run(grade_tiered("Jane Doe", "Backend developer", "en", "Python, SQL, 5 years", config, complete_locally))
+
+
+@pytest.mark.parametrize("config, message", [
+    (TieredGradingConfig(models=[], max_tokens=[]), "at least one model"),
+    (TieredGradingConfig(models=[TRIAGE_MODEL] * 3 + [GRADING_MODEL], max_tokens=[1] * 4), "at most"),
+    (TieredGradingConfig(models=[TRIAGE_MODEL, GRADING_MODEL], max_tokens=[100]), "one limit per model"),
+    (TieredGradingConfig(models=["not-a-model"], max_tokens=[100]), "not allowed"),
+    (TieredGradingConfig(borderline_low=4, borderline_high=3), "borderline_low"),
+    (TieredGradingConfig(min_confidence=1.5), "min_confidence"),
+])
+def test_validate_rejects_bad_chains(config, message):
+    with pytest.raises(ValueError, match=message):
+        config.validate()
+
+
+def test_validate_clamps_token_limits():
+    config = TieredGradingConfig(max_tokens=[0, GRADING_MAX_TOKENS_LIMIT + 1000])
+    config.validate()
+    assert config.max_tokens == [1, GRADING_MAX_TOKENS_LIMIT]
+
+
+def test_fake_models_need_to_be_enabled(monkeypatch):
+    monkeypatch.setattr(grading, "ALLOW_FAKE_MODELS", False)
+    with pytest.raises(ValueError, match="disabled"):
+        TieredGradingConfig(models=["fake:5:0.9"], max_tokens=[100]).validate()
+
+
+@pytest.mark.parametrize("model", ["fake:6:0.5", "fake:3:2", "fake:x", "fake:1:0.5:9"])
+def test_invalid_fake_models(fake_models, model):
+    with pytest.raises(ValueError, match="Invalid fake model"):
+        TieredGradingConfig(models=[model], max_tokens=[100]).validate()
+
+
+def test_cache_key_covers_the_whole_config():
+    config = TieredGradingConfig()
+    assert config.cache_key() == TieredGradingConfig().cache_key()
+    assert config.cache_key() != TieredGradingConfig(min_confidence=0.9).cache_key()
+    assert config.cache_key() != TieredGradingConfig(max_tokens=[100, 1000]).cache_key()
+    assert TieredGradingConfig(borderline_low=3).cache_key() == TieredGradingConfig(borderline_low=3.0).cache_key()
+
+
+def test_confident_triage_is_kept(fake_models):
+    result = grade("fake:5:0.9", "fake:2")
+
+    assert result.rating == 5
+    assert result.confidence == 0.9
+    assert result.model == "fake:5:0.9"
+    assert result.models_called == ["fake:5:0.9"]
+    assert not result.escalated and not result.reached_full_model
+
+
+@pytest.mark.parametrize("triage", ["fake:4:0.95", "fake:3:0.95", "fake:5:0.3", "fake:1:0.5"])
+def test_borderline_or_unsure_triage_escalates(fake_models, triage):
+    result = grade(triage, "fake:2")
+
+    assert result.rating == 2
+    assert result.model == "fake:2"
+    assert result.models_called == [triage, "fake:2"]
+    assert result.escalated and result.reached_full_model
+    assert result.confidence is None
+    assert set(result.tokens_by_model) == {triage, "fake:2"}
+
+
+def test_escalation_stops_at_the_first_confident_tier(fake_models):
+    result = grade("fake:4:0.9", "fake:1:0.8", "fake:5")
+
+    assert result.rating == 1
+    assert result.models_called == ["fake:4:0.9", "fake:1:0.8"]
+    assert result.escalated and not result.reached_full_model
+
+
+def test_fake_completion_is_repeatable():
+    messages = [{"role": "user", "content": "Grade this CV"}]
+    assert fake_completion("fake:", messages, 100) == fake_completion("fake:", messages, 100)
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+
+import pytest
+
+import pdf_cache
+from pdf_cache import ByteBudget, DownloadBudgetTimeout, DownloadCancelled, FileTooLargeError, PdfCache, cache_document, check_download_size
+
+
+def fake_stream_download(files, chunk_size=4):
+    """Stand-in for stream_download that writes a file's bytes from a dict, a few at a time"""
+    def stream_download(service, file_id, fd, chunk_size_=None):
+        content = files[file_id]
+        for start in range(0, len(content), chunk_size):
+            chunk = content[start:start + chunk_size]
+            fd.write(chunk)
+            yield chunk
+    return stream_download
+
+
+def put(cache, key, content):
+    with cache.new_temp_file() as tmp_file:
+        tmp_file.write(content)
+    cache.put_pdf_file(key, tmp_file.name)
+
+
+def leftovers(cache):
+    return [name for name in os.listdir(cache.directory) if name.endswith(".tmp")]
+
+
+def test_budget_reservations_are_released():
+    budget = ByteBudget(100)
+    with budget.reserve(60) as reserved:
+        assert reserved == 60
+        assert budget.metrics()["in_use_bytes"] == 60
+    assert budget.metrics()["in_use_bytes"] == 0
+
+
+def test_oversized_reservation_runs_alone():
+    budget = ByteBudget(100)
+    with budget.reserve(500) as reserved:
+        assert reserved == 100
+        with pytest.raises(DownloadBudgetTimeout):
+            with budget.reserve(1, timeout=0.01):
+                pass
+    assert budget.metrics() == {"capacity_bytes": 100, "in_use_bytes": 0, "waiting": 0}
+
+
+def test_reservation_waits_for_release():
+    budget = ByteBudget(100)
+    holding = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with budget.reserve(80):
+            holding.set()
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(5)
+
+    waited = []
+
+    def wait_for_budget():
+        started = time.monotonic()
+        with budget.reserve(50, timeout=5):
+            waited.append(time.monotonic() - started)
+
+    waiter = threading.Thread(target=wait_for_budget)
+    waiter.start()
+    time.sleep(0.05)
+    assert budget.metrics()["waiting"] == 1
+    release.set()
+    holder.join(5)
+    waiter.join(5)
+
+    assert waited and waited[0] >= 0.05
+    assert budget.metrics()["in_use_bytes"] == 0
+
+
+def test_declared_size_over_the_limit_is_rejected():
+    check_download_size(None, 10)
+    check_download_size(10, 10)
+    with pytest.raises(FileTooLargeError):
+        check_download_size(11, 10)
+
+
+def test_least_recently_used_pdf_is_evicted(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=25)
+    put(cache, "a", b"x" * 10)
+    put(cache, "b", b"x" * 10)
+    cache.open_pdf("a").close()
+    put(cache, "c", b"x" * 10)
+
+    assert cache.open_pdf("b") is None
+    with cache.open_pdf("a") as pdf_file:
+        assert pdf_file.read() == b"x" * 10
+    assert not os.path.exists(tmp_path / "b.pdf")
+
+
+def test_pinned_pdf_is_not_evicted(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=15)
+    put(cache, "a", b"x" * 10)
+    path = cache.pin_pdf("a")
+    put(cache, "b", b"x" * 10)
+
+    # The newer entry goes instead, as the pinned one is still being sent
+    assert os.path.exists(path)
+    assert cache.open_pdf("b") is None
+    cache.unpin("a")
+    assert os.path.exists(path)
+
+
+def test_unpin_evicts_once_the_cache_is_over_its_limit(tmp_path):
+    cache = PdfCache(str(tmp_path), max_bytes=15)
+    put(cache, "a", b"x" * 10)
+    put(cache, "b", b"x" * 4)
+    cache.pin_pdf("a")
+    b_path = cache.pin_pdf("b")
+    cache.put_text("a", "y" * 10)
+
+    assert os.path.exists(b_path)
+    cache.unpin("b")
+    assert not os.path.exists(b_path)
+    assert cache.get_text("a") == "y" * 10
+
+
+def test_existing_files_are_picked_up_again(tmp_path):
+    put(PdfCache(str(tmp_path)), "a", b"pdf")
+    (tmp_path / "a.txt").write_text("text")
+
+    cache = PdfCache(str(tmp_path))
+    assert cache.get_text("a") == "text"
+    assert cache.open_pdf("a").read() == b"pdf"
+
+
+def test_concurrent_downloads_of_a_key_share_one(tmp_path):
+    cache = PdfCache(str(tmp_path))
+    claimed = threading.Event()
+    results = []
+
+    def second_caller():
+        claimed.wait(5)
+        with cache.single_download("a") as cached:
+            results.append(cached.read() if cached else None)
+
+    thread = threading.Thread(target=second_caller)
+    thread.start()
+    with cache.single_download("a") as cached:
+        assert cached is None
+        claimed.set()
+        time.sleep(0.05)
+        assert not results
+        put(cache, "a", b"downloaded once")
+    thread.join(5)
+
+    assert results == [b"downloaded once"]
+
+
+def test_stuck_download_is_not_waited_for_forever(tmp_path):
+    cache = PdfCache(str(tmp_path))
+    with cache.single_download("a") as first:
+        assert first is None
+        with cache.single_download("a", timeout=0.01) as second:
+            assert second is None
+
+
+def test_failed_download_lets_the_next_caller_try(tmp_path):
+    cache = PdfCache(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with cache.single_download("a"):
+            raise RuntimeError("Drive failed")
+
+    with cache.single_download("a", timeout=0.01) as cached:
+        assert cached is None
+
+
+def test_cache_document(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_cache, "stream_download", fake_stream_download({"doc": b"%PDF-1.4 content"}))
+    cache = PdfCache(str(tmp_path))
+
+    with cache_document(None, "doc", "key", None, cache) as pdf_file:
+        assert pdf_file.read() == b"%PDF-1.4 content"
+    with cache.open_pdf("key") as pdf_file:
+        assert pdf_file.read() == b"%PDF-1.4 content"
+    assert not leftovers(cache)
+
+
+def test_cache_document_enforces_the_limit_on_what_arrives(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_cache, "stream_download", fake_stream_download({"doc": b"x" * 20}))
+    cache = PdfCache(str(tmp_path))
+
+    # The declared size is wrong, so only the bytes arriving show the file is too large
+    with pytest.raises(FileTooLargeError):
+        cache_document(None, "doc", "key", 5, cache, max_bytes=10)
+    assert cache.open_pdf("key") is None
+    assert not leftovers(cache)
+
+
+def test_cancelled_download_stops_and_cleans_up(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_cache, "stream_download", fake_stream_download({"doc": b"x" * 20}))
+    cache = PdfCache(str(tmp_path))
+    cancelled = threading.Event()
+    cancelled.set()
+
+    with pytest.raises(DownloadCancelled):
+        cache_document(None, "doc", "key", None, cache, cancelled=cancelled)
+    assert cache.open_pdf("key") is None
+    assert not leftovers(cache)
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+
+import prefetch
+from pdf_cache import DownloadCancelled, PdfCache
+from prefetch import QueuePrefetcher, queue_document_ids
+
+
+class FakeWarmer:
+    """Stand-in for warm_document that records downloads, optionally holding them until cancelled"""
+
+    def __init__(self, hold=(), fail=()):
+        self.hold = set(hold)
+        self.fail = set(fail)
+        self.warmed = []
+        self.stopped = []
+        self.started = {document_id: threading.Event() for document_id in self.hold}
+
+    def __call__(self, service, document_id, cache, cancelled=None):
+        if document_id in self.fail:
+            raise RuntimeError("Drive failed")
+        if document_id in self.hold:
+            self.started[document_id].set()
+            # Like a download checking the event between chunks
+            if cancelled.wait(5):
+                self.stopped.append(document_id)
+                raise DownloadCancelled(f"Prefetch of {document_id} was cancelled")
+        self.warmed.append(document_id)
+        return document_id
+
+
+def prefetcher(tmp_path, monkeypatch, warmer, depth=5, concurrency=1):
+    monkeypatch.setattr(prefetch, "warm_document", warmer)
+    return QueuePrefetcher(PdfCache(str(tmp_path)), depth=depth, concurrency=concurrency)
+
+
+async def finish(prefetcher, folder_id="folder"):
+    task = prefetcher._tasks[folder_id][0]
+    await asyncio.wait_for(task, 5)
+
+
+def test_queue_entries_are_ids_or_documents():
+    assert queue_document_ids(["a", {"id": "b", "name": "b.pdf"}, {"name": "no id"}, "", None]) == ["a", "b"]
+
+
+def test_only_the_next_documents_are_warmed_in_queue_order(tmp_path, monkeypatch):
+    warmer = FakeWarmer()
+    queue_prefetcher = prefetcher(tmp_path, monkeypatch, warmer, depth=3)
+
+    async def warm():
+        queue_prefetcher.schedule("folder", ["a", "b", "c", "d"], lambda: None)
+        await finish(queue_prefetcher)
+
+    asyncio.run(warm())
+    assert warmer.warmed == ["a", "b", "c"]
+    assert not queue_prefetcher._tasks
+
+
+def test_new_queue_stops_downloads_for_the_old_one(tmp_path, monkeypatch):
+    warmer = FakeWarmer(hold=["a"])
+    queue_prefetcher = prefetcher(tmp_path, monkeypatch, warmer)
+
+    async def reorder():
+        queue_prefetcher.schedule("folder", ["a", "b"], lambda: None)
+        old_task = queue_prefetcher._tasks["folder"][0]
+        await asyncio.to_thread(warmer.started["a"].wait, 5)
+
+        queue_prefetcher.schedule("folder", ["c"], lambda: None)
+        await asyncio.gather(old_task, return_exceptions=True)
+        assert old_task.cancelled()
+        await finish(queue_prefetcher)
+
+    asyncio.run(reorder())
+    # The running download stopped at its next chunk, and the old queue's next document never started
+    assert warmer.stopped == ["a"]
+    assert warmer.warmed == ["c"]
+
+
+def test_cancel_stops_a_running_download(tmp_path, monkeypatch):
+    warmer = FakeWarmer(hold=["a"])
+    queue_prefetcher = prefetcher(tmp_path, monkeypatch, warmer)
+
+    async def cancel():
+        queue_prefetcher.schedule("folder", ["a"], lambda: None)
+        await asyncio.to_thread(warmer.started["a"].wait, 5)
+        queue_prefetcher.cancel("folder")
+        assert not queue_prefetcher._tasks
+        # Let the download thread see the event
+        for _ in range(100):
+            if warmer.stopped:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(cancel())
+    assert warmer.stopped == ["a"]
+    assert not warmer.warmed
+
+
+def test_failed_prefetch_does_not_stop_the_rest(tmp_path, monkeypatch):
+    warmer = FakeWarmer(fail=["a"])
+    queue_prefetcher = prefetcher(tmp_path, monkeypatch, warmer)
+
+    async def warm():
+        queue_prefetcher.schedule("folder", ["a", "b"], lambda: None)
+        await finish(queue_prefetcher)
+
+    asyncio.run(warm())
+    assert warmer.warmed == ["b"]
+
+
+def test_folders_are_prefetched_independently(tmp_path, monkeypatch):
+    warmer = FakeWarmer(hold=["a"])
+    queue_prefetcher = prefetcher(tmp_path, monkeypatch, warmer, concurrency=2)
+
+    async def warm():
+        queue_prefetcher.schedule("first", ["a"], lambda: None)
+        await asyncio.to_thread(warmer.started["a"].wait, 5)
+        queue_prefetcher.schedule("second", ["b"], lambda: None)
+        await finish(queue_prefetcher, "second")
+        assert "first" in queue_prefetcher._tasks
+        queue_prefetcher.cancel("first")
+
+    asyncio.run(warm())
+    assert warmer.warmed == ["b"]
+
+
+def test_empty_queue_schedules_nothing(tmp_path, monkeypatch):
+    queue_prefetcher = prefetcher(tmp_path, monkeypatch, FakeWarmer())
+
+    async def schedule():
+        queue_prefetcher.schedule("folder", [], lambda: None)
+
+    asyncio.run(schedule())
+    assert not queue_prefetcher._tasks
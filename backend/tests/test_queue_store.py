@@ -0,0 +1,129 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from queue_store import (
+    MIN_POSITION_GAP,
+    POSITION_STEP,
+    QueueFolder,
+    QueueItem,
+    QueueNotImported,
+    import_queue,
+    is_queue_imported,
+    list_queue,
+    move_item,
+    pop_item,
+    push_item,
+    remove_item,
+    replace_queue,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[QueueFolder.__table__, QueueItem.__table__])
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def queue_ids(db, folder_id="folder"):
+    return [item.document_id for item in list_queue(db, folder_id)]
+
+
+def test_replace_queue_spaces_positions_and_drops_duplicates(db):
+    replace_queue(db, "folder", ["a", {"id": "b", "name": "b.pdf"}, "a", "c"])
+
+    items = list_queue(db, "folder")
+    assert [item.document_id for item in items] == ["a", "b", "c"]
+    assert [item.position for item in items] == [POSITION_STEP, 2 * POSITION_STEP, 3 * POSITION_STEP]
+    assert items[1].to_dict()["name"] == "b.pdf"
+
+
+def test_push_item_appends_once(db):
+    replace_queue(db, "folder", ["a", "b"])
+
+    assert push_item(db, "folder", {"id": "c"}).position == 3 * POSITION_STEP
+    assert push_item(db, "folder", {"id": "a"}) is None
+    assert queue_ids(db) == ["a", "b", "c"]
+
+
+def test_move_item_takes_the_midpoint_between_neighbours(db):
+    replace_queue(db, "folder", ["a", "b", "c"])
+
+    moved = move_item(db, "folder", "c", after_id="a")
+    assert moved.position == 1.5 * POSITION_STEP
+    assert queue_ids(db) == ["a", "c", "b"]
+
+    moved = move_item(db, "folder", "b", before_id="a")
+    assert moved.position == 0
+    assert queue_ids(db) == ["b", "a", "c"]
+
+
+def test_move_item_to_the_end(db):
+    replace_queue(db, "folder", ["a", "b", "c"])
+
+    assert move_item(db, "folder", "a", after_id="c").position == 4 * POSITION_STEP
+    assert queue_ids(db) == ["b", "c", "a"]
+
+
+def test_move_item_renumbers_once_the_gap_is_used_up(db):
+    replace_queue(db, "folder", ["a", "b", "c"])
+    db.get(QueueItem, ("folder", "b")).position = POSITION_STEP + MIN_POSITION_GAP / 2
+    db.commit()
+
+    move_item(db, "folder", "c", after_id="a")
+
+    items = list_queue(db, "folder")
+    assert [item.document_id for item in items] == ["a", "c", "b"]
+    assert [item.position for item in items] == [POSITION_STEP, 1.5 * POSITION_STEP, 2 * POSITION_STEP]
+
+
+def test_repeated_moves_keep_the_order(db):
+    replace_queue(db, "folder", ["a", "b", "c"])
+
+    # Each move halves the gap after "a", which eventually forces a renumbering
+    for _ in range(60):
+        move_item(db, "folder", "c", after_id="a")
+        move_item(db, "folder", "b", after_id="a")
+        move_item(db, "folder", "c", after_id="a")
+    assert queue_ids(db) == ["a", "c", "b"]
+    positions = [item.position for item in list_queue(db, "folder")]
+    assert all(later - earlier > MIN_POSITION_GAP for earlier, later in zip(positions, positions[1:]))
+
+
+def test_move_item_needs_both_items(db):
+    replace_queue(db, "folder", ["a", "b"])
+
+    assert move_item(db, "folder", "a", after_id="missing") is None
+    assert move_item(db, "folder", "missing", after_id="a") is None
+    assert move_item(db, "folder", "a", after_id="a") is None
+    assert queue_ids(db) == ["a", "b"]
+
+
+def test_import_queue_marks_the_folder_once(db):
+    assert not is_queue_imported(db, "folder")
+
+    assert import_queue(db, "folder", ["a", "b"])
+    assert is_queue_imported(db, "folder")
+    assert not import_queue(db, "folder", ["c"])
+    assert queue_ids(db) == ["a", "b"]
+
+
+def test_item_changes_do_not_mark_a_folder_imported(db):
+    with pytest.raises(QueueNotImported):
+        push_item(db, "folder", {"id": "a"})
+    assert not remove_item(db, "folder", "a")
+    assert pop_item(db, "folder") is None
+
+    assert not is_queue_imported(db, "folder")
+    assert queue_ids(db) == []
+    # queue.txt can still be imported afterwards
+    assert import_queue(db, "folder", ["b"])
+    assert queue_ids(db) == ["b"]
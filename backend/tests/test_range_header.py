@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from fastapi import HTTPException
+
+from main import parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=500-", (500, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    (" bytes=0-0 ", (0, 0)),
+])
+def test_single_ranges(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=-", "items=0-10", "bytes=0-1,5-6", "bytes=a-b"])
+def test_unsupported_ranges_send_the_whole_file(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=10-5"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range_header(header, 1000)
+    assert error.value.status_code == 416
+    assert error.value.headers["Content-Range"] == "bytes */1000"
@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+import zipfile
+
+from report import REPORT_COLUMNS, iter_report
+from streaming import StreamBuffer
+
+VOTES = {
+    "d1": {"Ann": 4, "Bob": 2, "Grading bot": 5},
+    "d2": {"Ann": 0},
+}
+COMMENTS = {
+    "d1": {"Ann": "Strong, \"quoted\"\nand multi-line", "Grading bot": "Good fit"},
+    "d2": {"Ann": "Only a comment"},
+}
+
+
+class FakeDriveService:
+    """Just enough of the Drive files().list() API to page through a folder"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def files(self):
+        return self
+
+    def list(self, **kwargs):
+        self.requests.append(kwargs)
+        index = int(kwargs.get("pageToken") or 0)
+        page = {"files": self.pages[index]}
+        if index + 1 < len(self.pages):
+            page["nextPageToken"] = str(index + 1)
+        return FakeRequest(page)
+
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+def folder_service():
+    return FakeDriveService([
+        [{"id": "d1", "name": "Jane Doe.pdf", "webViewLink": "https://drive/d1"}],
+        [{"id": "d2", "name": "John Roe.pdf"}, {"id": "d3", "name": "New.pdf"}],
+    ])
+
+
+def test_stream_buffer_drains_what_was_written():
+    buffer = StreamBuffer()
+    assert buffer.write(b"abc") == 3
+    buffer.write(bytearray(b"de"))
+    assert buffer.tell() == 5
+    assert buffer.drain() == b"abcde"
+    assert buffer.drain() == b""
+    assert buffer.tell() == 5
+
+
+def test_csv_report_pages_through_the_folder():
+    service = folder_service()
+    data = b"".join(iter_report(service, "folder", VOTES, COMMENTS, "csv")).decode("utf-8")
+
+    rows = list(csv.DictReader(io.StringIO(data)))
+    assert list(rows[0]) == REPORT_COLUMNS
+    assert [row["document_id"] for row in rows] == ["d1", "d2", "d3"]
+    assert rows[0]["average_rating"] == "3.0"
+    assert rows[0]["ai_rating"] == "5"
+    assert rows[0]["comments"] == "Ann: Strong, \"quoted\"\nand multi-line"
+    assert rows[1]["vote_count"] == "0" and rows[1]["average_rating"] == ""
+    assert [request.get("pageToken") for request in service.requests] == [None, "1"]
+
+
+def test_jsonl_report_keeps_votes_per_voter():
+    data = b"".join(iter_report(folder_service(), "folder", VOTES, COMMENTS, "jsonl")).decode("utf-8")
+
+    rows = [json.loads(line) for line in data.splitlines()]
+    assert rows[0]["votes"] == {"Ann": 4, "Bob": 2}
+    assert rows[0]["ai_comment"] == "Good fit"
+    assert rows[2]["votes"] == {} and rows[2]["ai_rating"] is None
+
+
+def test_xlsx_report_is_a_valid_workbook():
+    chunks = list(iter_report(folder_service(), "folder", VOTES, COMMENTS, "xlsx"))
+    assert len(chunks) > 1
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as workbook:
+        assert workbook.testzip() is None
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert sheet.count("<row>") == 4
+    assert "Jane Doe.pdf" in sheet
+    assert "&quot;quoted&quot;" in sheet or '"quoted"' in sheet
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Star, FileText, Download, Users, BarChart3, MessageSquare, Save, RefreshCw, Shield, Sparkles, Copy, Mail, X, Edit3, Trash2, Check, Bot, Zap, Plus, List, GripVertical } from 'lucide-react';
 
 const DriveVotingApp = () => {
@@ -29,6 +29,8 @@ const DriveVotingApp = () => {
   
   // Queue management state
   const [queue, setQueue] = useState([]);
+  // Section ETags of the folder on screen, so reloading it skips sections that did not change
+  const bootstrapEtags = useRef({ folderId: null, etags: {} });
 
   // Handle escape key to close modals
   useEffect(() => {
@@ -178,6 +180,9 @@ const DriveVotingApp = () => {
         const data = await response.json();
         setVotes(data.votes || {});
         setComments(data.comments || {});
+      } else if (response.status === 503) {
+        // Keep the scores already on screen until Drive recovers
+        setError('Google Drive is temporarily unavailable. Showing the last loaded scores.');
       }
     } catch (err) {
       console.log('No existing scores found, starting fresh');
@@ -206,25 +211,8 @@ const DriveVotingApp = () => {
     }
   };
 
-  // Load queue from backend API
-  const loadQueueFromDrive = async (folderId) => {
-    if (!userId) return;
-    
-    try {
-      const apiUrl = import.meta.env.VITE_API_BASE_URL || '/api';
-      const response = await fetch(`${apiUrl}/queue/${folderId}?user_id=${encodeURIComponent(userId)}`);
-      
-      if (response.ok) {
-        const data = await response.json();
-        setQueue(data.queue || []);
-      }
-    } catch (err) {
-      console.log('No existing queue found, starting fresh');
-    }
-  };
-
   // Save queue to backend API
-  const saveQueueToDrive = async () => {
+  const saveQueueToDrive = async (queueToSave = queue) => {
     if (!folderId || !userId) return;
     
     try {
@@ -235,7 +223,7 @@ const DriveVotingApp = () => {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
-          queue
+          queue: queueToSave
         })
       });
       
@@ -270,14 +258,12 @@ const DriveVotingApp = () => {
     // Auto-save queue
     try {
       const apiUrl = import.meta.env.VITE_API_BASE_URL || '/api';
-      await fetch(`${apiUrl}/queue/${folderId}?user_id=${encodeURIComponent(userId)}`, {
+      await fetch(`${apiUrl}/queue/${folderId}/push?user_id=${encodeURIComponent(userId)}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({
-          queue: newQueue
-        })
+        body: JSON.stringify(newQueue[newQueue.length - 1])
       });
       
       setError('✅ Added to queue!');
@@ -291,16 +277,46 @@ const DriveVotingApp = () => {
   const removeFromQueue = async (docId) => {
     const newQueue = queue.filter(item => item.id !== docId);
     setQueue(newQueue);
-    await saveQueueToDrive();
+    
+    try {
+      const apiUrl = import.meta.env.VITE_API_BASE_URL || '/api';
+      await fetch(`${apiUrl}/queue/${folderId}/items/${encodeURIComponent(docId)}?user_id=${encodeURIComponent(userId)}`, {
+        method: 'DELETE'
+      });
+    } catch (err) {
+      console.error('Failed to remove from queue:', err.message);
+    }
   };
 
   // Reorder queue items
   const reorderQueue = async (fromIndex, toIndex) => {
+    if (fromIndex === toIndex) return;
+    
     const newQueue = [...queue];
     const [removed] = newQueue.splice(fromIndex, 1);
     newQueue.splice(toIndex, 0, removed);
     setQueue(newQueue);
-    await saveQueueToDrive();
+    
+    // Send only the move, anchored on the item now next to it
+    const anchor = toIndex > 0
+      ? { after_id: newQueue[toIndex - 1].id }
+      : { before_id: newQueue[1].id };
+    
+    try {
+      const apiUrl = import.meta.env.VITE_API_BASE_URL || '/api';
+      await fetch(`${apiUrl}/queue/${folderId}/move?user_id=${encodeURIComponent(userId)}`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+          document_id: removed.id,
+          ...anchor
+        })
+      });
+    } catch (err) {
+      console.error('Failed to reorder queue:', err.message);
+    }
   };
 
   // Save scores via backend API
@@ -365,7 +381,7 @@ const DriveVotingApp = () => {
     }
   };
 
-  // Load documents from backend API
+  // Load documents, scores, queue and profile for a folder in a single request
   const loadDocuments = async (folderId) => {
     if (!userId) {
       setError('Please authenticate first');
@@ -377,15 +393,38 @@ const DriveVotingApp = () => {
       setError('');
       
       const apiUrl = import.meta.env.VITE_API_BASE_URL || '/api';
-      const response = await fetch(`${apiUrl}/documents/${folderId}?user_id=${encodeURIComponent(userId)}`);
+      const knownEtags = bootstrapEtags.current.folderId === folderId ? Object.values(bootstrapEtags.current.etags) : [];
+      const response = await fetch(`${apiUrl}/folders/${folderId}/bootstrap?user_id=${encodeURIComponent(userId)}`, {
+        headers: knownEtags.length > 0 ? { 'If-None-Match': knownEtags.join(', ') } : {}
+      });
+      
+      if (response.status === 304) {
+        // Nothing changed since the last load, what is on screen is current
+        return;
+      }
       
       if (response.ok) {
-        const documents = await response.json();
-        setDocuments(documents);
+        const data = await response.json();
+        bootstrapEtags.current = { folderId, etags: data.etags };
         
-        // Load existing scores and queue
-        await loadScoresFromDrive(folderId);
-        await loadQueueFromDrive(folderId);
+        // Unchanged sections come back as null
+        if (data.profile) {
+          setUserName(data.profile.name);
+          setUserEmail(data.profile.email);
+          setUserPicture(data.profile.picture);
+        }
+        if (data.documents) {
+          setDocuments(data.documents);
+        }
+        if (data.scores) {
+          setVotes(data.scores.votes || {});
+          setComments(data.scores.comments || {});
+        }
+        if (data.queue) {
+          setQueue(data.queue);
+        }
+      } else if (response.status === 503) {
+        setError('Google Drive is temporarily unavailable. Please try loading the folder again shortly.');
       } else {
         const errorData = await response.json();
         setError('Failed to load documents: ' + (errorData.detail || 'Unknown error'));
@@ -528,7 +567,7 @@ const DriveVotingApp = () => {
       
       const endpoint = letterType === 'acceptance' ? '/generate-acceptance' : '/generate-rejection';
       
-      const response = await fetch(`${apiUrl}${endpoint}`, {
+      const response = await fetch(`${apiUrl}${endpoint}?user_id=${encodeURIComponent(userId)}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -1191,7 +1230,7 @@ const DriveVotingApp = () => {
                     <button
                       onClick={() => {
                         setQueue([]);
-                        saveQueueToDrive();
+                        saveQueueToDrive([]);
                       }}
                       className="w-full bg-red-600 text-white py-2 px-4 rounded-lg hover:bg-red-700 transition-colors text-sm"
                     >
@@ -1419,7 +1458,7 @@ const DriveVotingApp = () => {
                 {/* PDF Viewer */}
                 <div className="flex-1 p-4 bg-gray-100">
                   <iframe
-                    src={`${selectedDoc.webViewLink.replace('/view', '/preview')}`}
+                    src={`${import.meta.env.VITE_API_BASE_URL || '/api'}/documents/${selectedDoc.id}/content?user_id=${encodeURIComponent(userId)}`}
                     className="w-full h-full border rounded"
                     title={selectedDoc.name}
                   />